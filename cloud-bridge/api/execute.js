@@ -17,7 +17,7 @@ async function handler(req, res) {
         return res.status(405).json({ error: 'Method not allowed' });
     }
 
-    const { userId, apiKey, command, accessId } = req.body;
+    const { userId, apiKey, command, accessId, requestId, action } = req.body;
 
     // Validate MCP API key
     if (apiKey !== MCP_API_KEY) {
@@ -28,6 +28,17 @@ async function handler(req, res) {
         return res.status(400).json({ error: 'Missing required fields: command, accessId' });
     }
 
+    // Optional client-chosen id: a command resent to another deployment (failover,
+    // hedged request, outbox retry) maps to the same command_id and is queued once
+    if (requestId !== undefined && !/^[A-Za-z0-9_-]{8,64}$/.test(requestId)) {
+        return res.status(400).json({ error: 'Invalid requestId' });
+    }
+
+    // Optional structured action parsed from a device command ({ device, property, value, unit })
+    if (action != null && (typeof action !== 'object' || Array.isArray(action))) {
+        return res.status(400).json({ error: 'Invalid action' });
+    }
+
     // Lookup user from access_id
     const { data: mcpConfig, error: configError } = await supabase
         .from('mcp_configs')
@@ -47,7 +58,9 @@ async function handler(req, res) {
     console.log(`[Execute] Access ID ${accessId} belongs to user ${actualUserId}`);
 
     // Generate command ID
-    const commandId = `cmd_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
+    const commandId = requestId
+        ? `cmd_${requestId}`
+        : `cmd_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`;
 
     console.log(`[Execute] Queueing command for user ${actualUserId}:`, commandId);
 
@@ -76,11 +89,24 @@ async function handler(req, res) {
                 user_id: actualUserId,  // Use the looked-up user ID
                 access_id: accessId,    // Store the access ID for tracking
                 command,
+                // only set when there is one, so text commands still insert before supabase-command-action.sql
+                ...(action ? { action } : {}),
                 status: 'pending',
                 created_at: new Date().toISOString(),
             },
         ]);
 
+    if (insertError && requestId && insertError.code === '23505') {
+        // Unique violation on command_id - this requestId was already queued
+        console.log(`[Execute] Command ${commandId} already queued (resent requestId)`);
+        return res.json({
+            success: true,
+            commandId,
+            message: 'Command already queued.',
+            status: 'pending'
+        });
+    }
+
     if (insertError) {
         console.error('[Execute] Error inserting command:', insertError);
         return res.status(500).json({ error: 'Failed to queue command', details: insertError.message });
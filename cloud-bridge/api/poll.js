@@ -56,6 +56,8 @@ async function handler(req, res) {
         hasCommand: true,
         commandId: command.command_id,
         command: command.command,
+        // Structured action for simple device commands; the text stays the fallback
+        ...(command.action ? { action: command.action } : {}),
         timestamp: command.created_at,
     });
 }
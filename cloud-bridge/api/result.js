@@ -24,10 +24,10 @@ async function handler(req, res) {
     console.log(`[Result] Received result for command ${commandId} (Status: ${status})`);
 
     try {
-        // 1. Fetch command to get user_id
+        // 1. Fetch command to get user_id (and access_id, which scopes the result stream)
         const { data: commandData, error: fetchError } = await supabase
             .from('commands')
-            .select('user_id')
+            .select('user_id, access_id')
             .eq('command_id', commandId)
             .single();
 
@@ -58,6 +58,7 @@ async function handler(req, res) {
                 {
                     command_id: commandId,
                     user_id: userId,        // REQUIRED by schema
+                    access_id: commandData.access_id,
                     result: result,
                     success: status !== 'failed', // derive success boolean
                     completed_at: new Date().toISOString(), // Matches schema (created_at doesn't exist)
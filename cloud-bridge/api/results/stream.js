@@ -0,0 +1,131 @@
+import { randomUUID } from 'crypto';
+import { createClient } from '../../lib/supabase.js';
+
+const MCP_API_KEY = process.env.MCP_API_KEY;
+const HEARTBEAT_MS = 15000;
+// End the stream before Vercel's maxDuration (60s) does; the MCP server
+// reconnects with Last-Event-ID and the gap is replayed from the results table
+const STREAM_MS = 50000;
+const REPLAY_LIMIT = 1000;
+
+// One result as a server-sent event; its id (completion time in ms) is what Last-Event-ID replays from
+function resultEvent(row) {
+    const body = JSON.stringify({
+        commandId: row.command_id,
+        accessId: row.access_id,
+        status: row.success ? 'completed' : 'failed',
+        result: row.result,
+        success: row.success,
+        completedAt: row.completed_at,
+    });
+    return `id: ${Date.parse(row.completed_at)}\nevent: result\ndata: ${body}\n\n`;
+}
+
+// Pushes the results of one accessId's commands to the MCP servers, so a tool call
+// waiting for its command's answer needs no polling: one connection per accessId
+// carries all of them, and no other accessId's
+export default async function handler(req, res) {
+    res.setHeader('Access-Control-Allow-Origin', '*');
+    res.setHeader('Access-Control-Allow-Methods', 'GET, OPTIONS');
+    res.setHeader('Access-Control-Allow-Headers', 'Authorization, Last-Event-ID');
+
+    if (req.method === 'OPTIONS') {
+        return res.status(200).end();
+    }
+
+    if (req.method !== 'GET') {
+        return res.status(405).json({ error: 'Method not allowed' });
+    }
+
+    if (req.headers.authorization !== `Bearer ${MCP_API_KEY}`) {
+        return res.status(401).json({ error: 'Invalid API key' });
+    }
+
+    const { accessId } = req.query;
+    if (!accessId) {
+        return res.status(400).json({ error: 'Access ID required' });
+    }
+
+    const supabase = createClient();
+    const { data: mcpConfig, error: configError } = await supabase
+        .from('mcp_configs')
+        .select('user_id')
+        .eq('access_id', accessId)
+        .eq('enabled', true)
+        .limit(1)
+        .maybeSingle();
+
+    if (configError || !mcpConfig) {
+        console.error('[Results] No user found for access_id:', accessId, configError);
+        return res.status(403).json({ error: 'Access ID not registered' });
+    }
+
+    const since = Number(req.headers['last-event-id'] || req.query.since || 0);
+    let closed = false;
+
+    const send = (chunk) => {
+        if (!closed) {
+            res.write(chunk);
+        }
+    };
+
+    // Subscribe before replaying, so nothing completed in between is missed
+    // (a result sent twice is harmless: the MCP server resolves each command once)
+    const channel = supabase
+        .channel(`results-${randomUUID()}`)
+        .on('postgres_changes', {
+            event: '*', schema: 'public', table: 'results', filter: `access_id=eq.${accessId}`,
+        }, (payload) => {
+            if (payload.new && payload.new.command_id && payload.new.access_id === accessId) {
+                send(resultEvent(payload.new));
+            }
+        });
+
+    const status = await new Promise((resolve) => channel.subscribe(resolve));
+    if (status !== 'SUBSCRIBED') {
+        console.error('[Results] Realtime subscription failed:', status);
+        await supabase.removeChannel(channel);
+        return res.status(503).json({ error: 'Result stream unavailable', details: status });
+    }
+
+    res.writeHead(200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache, no-transform',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no',
+    });
+    send('retry: 1000\n\n');
+
+    const close = async () => {
+        if (closed) {
+            return;
+        }
+        closed = true;
+        clearInterval(heartbeat);
+        clearTimeout(deadline);
+        await supabase.removeChannel(channel);
+        res.end();
+    };
+    const heartbeat = setInterval(() => send(': keepalive\n\n'), HEARTBEAT_MS);
+    const deadline = setTimeout(close, STREAM_MS);
+    req.on('close', close);
+
+    if (since > 0) {
+        const { data: missed, error } = await supabase
+            .from('results')
+            .select('command_id, access_id, result, success, completed_at')
+            .eq('access_id', accessId)
+            .gte('completed_at', new Date(since).toISOString())
+            .order('completed_at', { ascending: true })
+            .limit(REPLAY_LIMIT);
+
+        if (error) {
+            console.error('[Results] Replay failed:', error);
+        }
+        for (const row of missed || []) {
+            send(resultEvent(row));
+        }
+    }
+
+    console.log(`[Results] Stream open for ${accessId} (replayed from ${since || 'now'})`);
+}
@@ -0,0 +1,7 @@
+-- Structured device actions: control_device sends simple commands ("turn on
+-- the kitchen lights") with the action parsed from them, so the extension
+-- can run them without interpreting the text
+
+-- The action is stored with its command and handed back by /api/poll;
+-- NULL for commands that are text only
+ALTER TABLE commands ADD COLUMN IF NOT EXISTS action JSONB;
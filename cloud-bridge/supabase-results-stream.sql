@@ -0,0 +1,14 @@
+-- Result stream (/api/results/stream): the MCP servers wait for command
+-- results over one server-sent event stream per accessId instead of polling
+
+-- Realtime must publish changes to the results table
+ALTER PUBLICATION supabase_realtime ADD TABLE results;
+
+-- Each result carries its command's access_id, so a stream can be limited
+-- to one accessId's results (realtime filters and replay both use it)
+ALTER TABLE results ADD COLUMN IF NOT EXISTS access_id TEXT;
+UPDATE results r SET access_id = c.access_id
+FROM commands c WHERE c.command_id = r.command_id AND r.access_id IS NULL;
+
+-- Reconnecting streams replay one accessId's results completed since their Last-Event-ID
+CREATE INDEX IF NOT EXISTS idx_results_access_completed ON results(access_id, completed_at);
@@ -0,0 +1,98 @@
+"""
+Benchmark - a command burst with and without admission control
+
+Usage:
+    python bench_admission.py [burst] [latency_ms]
+
+The stub bridge is throttled to STUB_CONCURRENCY=10 inserts of latency_ms
+each (default 500ms), like a Vercel deployment near its limit. `burst`
+commands (default 400) arrive at once: 80% from one noisy accessId, the
+rest spread over four quiet ones. Without limits every command waits its
+turn in the connection pool and the tail runs into BRIDGE_TIMEOUT; with
+admission control the noisy accessId is cut to its token bucket and the
+overflow is refused quickly with a retry-after hint. Reports bridge
+concurrency, outcomes and how long callers waited for each kind of answer.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+os.environ.setdefault('CLOUD_BRIDGE_URL', "http://127.0.0.1:8899")
+os.environ.setdefault('BRIDGE_WARMUP_INTERVAL', '0')
+
+import admission
+import bridge_client
+import stub_bridge
+
+BURST = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+LATENCY_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 500
+QUIET = ['quiet-1', 'quiet-2', 'quiet-3', 'quiet-4']
+
+SETUPS = {
+    'no limits': admission.AdmissionControl(limit=0, rate=0),
+    'admission control': admission.AdmissionControl(),
+}
+
+
+def access_id(n):
+    return QUIET[n % len(QUIET)] if n % 5 == 0 else 'noisy'
+
+
+async def send(n, outcomes, waits, quiet_ok):
+    started = time.perf_counter()
+    try:
+        response = await bridge_client.post_execute(
+            {"userId": "tuya_ai", "apiKey": "bench", "accessId": access_id(n), "command": f"cmd {n}"})
+        outcome = 'ok' if response.status_code == 200 else f"http_{response.status_code}"
+    except admission.Overloaded as e:
+        outcome = e.reason
+    except Exception as e:
+        outcome = type(e).__name__
+    outcomes[outcome] += 1
+    waits.setdefault(outcome, []).append(time.perf_counter() - started)
+    if outcome == 'ok' and access_id(n) != 'noisy':
+        quiet_ok[0] += 1
+
+
+async def run(label, control):
+    bridge_client.ADMISSION = control
+    stub_bridge.STATS.update(peak_open=0, commands=0)
+    await bridge_client.start()
+    outcomes, waits, quiet_ok = Counter(), {}, [0]
+    started = time.perf_counter()
+    await asyncio.gather(*(send(n, outcomes, waits, quiet_ok) for n in range(BURST)))
+    elapsed = time.perf_counter() - started
+    await bridge_client.stop()
+
+    quiet_total = sum(1 for n in range(BURST) if access_id(n) != 'noisy')
+    print(f"\n{label}  ({elapsed:.1f}s until every caller had an answer)")
+    print(f"  bridge      peak {stub_bridge.STATS['peak_open']} open requests, "
+          f"{stub_bridge.STATS['commands']} commands arrived")
+    print(f"  quiet ids   {quiet_ok[0]} / {quiet_total} commands queued")
+    for outcome, count in outcomes.most_common():
+        samples = sorted(waits[outcome])
+        print(f"  {outcome:<14}{count:5d}   answer after p50 {statistics.median(samples) * 1000:8.1f}ms   "
+              f"max {samples[-1] * 1000:8.1f}ms")
+
+
+async def main():
+    stub_bridge.configure(latency_ms=LATENCY_MS, jitter_ms=0, concurrency=10)
+    print(f"{BURST} commands at once; bridge does 10 inserts at a time, {LATENCY_MS:g}ms each; "
+          f"BRIDGE_TIMEOUT {bridge_client.BRIDGE_TIMEOUT:g}s")
+    control = SETUPS['admission control']
+    print(f"admission: {control.limit} in flight, queue {control.queue_size} / {control.queue_timeout:g}s, "
+          f"{control.rate:g}/s per accessId (burst {control.burst})")
+    for label, setup in SETUPS.items():
+        await run(label, setup)
+
+
+if __name__ == "__main__":
+    stub_bridge.serve_in_thread()
+    asyncio.run(main())
@@ -0,0 +1,229 @@
+"""
+Benchmark - waiting for command results: one pushed stream vs polling
+
+Usage:
+    python bench_await_results.py [commands] [access_ids]
+
+The local bridge (local-bridge/bridge_server.py) runs in its own process;
+simulated extensions poll it, take EXECUTE_MS per command and post a
+result. `commands` tool calls (default 200, from `access_ids` extensions,
+default 10) are all in flight at once, in two ways:
+
+    stream   tools.forward_command(wait=True): a future per commandId,
+             resolved from its accessId's /api/results/stream subscription
+    polling  the queued reply, then GET /api/result every 500ms until the
+             result is there - what the bridge's waitForResult does
+
+Reports how long a call learns of its result after the extension posted
+it, and how many bridge requests the waiting cost. Then checks that each
+call got its own command's result, that a stream carries no other
+accessId's results, that a stream reconnect replays the results stored
+while it was down, that a call with no answer returns the queued
+reply at its deadline, and that a result coming after that deadline is
+sent to the caller's MCP session stream (GET /mcp).
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+PORT = 8922
+URL = f"http://127.0.0.1:{PORT}"
+TMP = tempfile.mkdtemp()
+os.environ['CLOUD_BRIDGE_URLS'] = URL
+os.environ['MCP_API_KEY'] = 'bench'
+os.environ['OUTBOX_DB'] = os.path.join(TMP, 'outbox.db')
+os.environ['REQUESTS_RING'] = os.path.join(TMP, 'requests.ring')
+os.environ['BRIDGE_WARMUP_INTERVAL'] = '0'
+os.environ['BRIDGE_MAX_IN_FLIGHT'] = '0'  # measure the waiting, not admission control
+os.environ['BRIDGE_RATE_PER_ACCESS_ID'] = '0'
+os.environ['MCP_AWAIT_TIMEOUT'] = '30'
+
+import httpx
+
+import bridge_client
+import codec
+import result_stream
+import streamable_http
+import tools
+from result_stream import RESULTS
+
+COMMANDS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+ACCESS_IDS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+EXECUTE_MS = 100
+POLL_INTERVAL = 0.5  # waitForResult's checkInterval
+
+POSTED = {}  # command text -> when the extension posted its result
+DELIVERED = []  # (stream accessId, event accessId) of every result pushed
+
+
+def record(dispatch=RESULTS._dispatch):
+    def recorded(access_id, event_id, data):
+        DELIVERED.append((access_id, codec.loads(data).get('accessId')))
+        dispatch(access_id, event_id, data)
+    RESULTS._dispatch = recorded
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def p(samples, pct):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1000
+
+
+def start_bridge():
+    env = {**os.environ, 'LOCAL_BRIDGE_DB': os.path.join(TMP, 'bridge.db'), 'LOCAL_BRIDGE_PORT': str(PORT),
+           'LOCAL_BRIDGE_AUTO_REGISTER': 'true'}
+    proc = subprocess.Popen([sys.executable, 'bridge_server.py'], cwd=os.path.join(HERE, '..', 'local-bridge'),
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{URL}/api/ping", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("local bridge did not start")
+
+
+async def extension(client, access_id, stop):
+    """Poll for commands, 'run' each for EXECUTE_MS, post the result"""
+    while not stop.is_set():
+        command = (await client.get("/api/poll", params={"accessId": access_id})).json()
+        if not command.get('hasCommand'):
+            await asyncio.sleep(0.02)
+            continue
+        await asyncio.sleep(EXECUTE_MS / 1000)
+        await client.post("/api/result", json={"commandId": command['commandId'], "accessId": access_id,
+                                                "result": f"done: {command['command']}", "status": "completed"})
+        POSTED[command['command']] = time.perf_counter()
+
+
+async def call(access_id, command, wait):
+    tools.bridge_access_id.set(access_id)
+    return await tools.forward_command('execute_browser_command', command, wait=wait)
+
+
+async def call_and_poll(client, access_id, command, counter):
+    """Queued reply, then GET /api/result every POLL_INTERVAL until the result is stored"""
+    reply = await call(access_id, command, wait=False)
+    command_id = result_stream.command_id_for(reply.rsplit('(ID:', 1)[1].rstrip(')'))
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        counter[0] += 1
+        found = await client.get("/api/result", params={"commandId": command_id})
+        if found.status_code == 200 and found.json().get('result') is not None:
+            return f"OK: {command} (ID:{command_id}) -> {found.json()['result']}"
+
+
+async def run(label, client, make_call):
+    access_ids = [f"ext{n}" for n in range(ACCESS_IDS)]
+    commands = [(access_ids[n % ACCESS_IDS], f"{label} {n}") for n in range(COMMANDS)]
+    returned = {}
+
+    async def one(access_id, command):
+        result = await make_call(access_id, command)
+        returned[command] = (time.perf_counter(), result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(a, c) for a, c in commands))
+    elapsed = time.perf_counter() - started
+    delays = [returned[c][0] - POSTED[c] for _, c in commands]
+    own = all(returned[c][1].endswith(f"-> done: {c}") for _, c in commands)
+    return elapsed, delays, own
+
+
+async def main():
+    proc = start_bridge()
+    stop = asyncio.Event()
+    async with httpx.AsyncClient(base_url=URL, timeout=30) as client:
+        extensions = [asyncio.create_task(extension(client, f"ext{n}", stop)) for n in range(ACCESS_IDS)]
+        await bridge_client.start(warm=False)
+        record()
+        tools.OUTBOX.ensure_draining()
+        await call('ext0', 'warm up', wait=True)
+
+        print(f"{COMMANDS} calls in flight at once from {ACCESS_IDS} extensions, {EXECUTE_MS}ms per command\n")
+        elapsed, delays, own_stream = await run('stream', client, lambda a, c: call(a, c, wait=True))
+        connects = RESULTS.stats['connects']
+        print(f"  {'stream':<8} result -> caller p50 {p(delays, 50):6.1f}ms  p99 {p(delays, 99):6.1f}ms   "
+              f"{elapsed:5.1f}s   {connects} stream connections, 0 result polls")
+
+        polls = [0]
+        elapsed, delays_polling, own_polling = await run(
+            'polling', client, lambda a, c: call_and_poll(client, a, c, polls))
+        print(f"  {'polling':<8} result -> caller p50 {p(delays_polling, 50):6.1f}ms  "
+              f"p99 {p(delays_polling, 99):6.1f}ms   {elapsed:5.1f}s   {polls[0]} result polls "
+              f"({polls[0] / COMMANDS:.1f} per command)\n")
+
+        check("every waiting call gets its own command's result", own_stream and own_polling)
+        check(f"{COMMANDS} waiting calls share one stream connection per accessId", connects == ACCESS_IDS)
+        check(f"each stream carries only its own accessId's results ({len(DELIVERED)} events)",
+              DELIVERED and all(stream == event for stream, event in DELIVERED))
+        async with client.stream('GET', '/api/results/stream', headers={"Authorization": "Bearer bench"}) as r:
+            check("a stream without an accessId is refused", r.status_code == 400)
+        check("the stream delivers results faster than 500ms polling",
+              p(delays, 50) < p(delays_polling, 50))
+
+        # Stream down while results are stored: the reconnect replays them
+        await RESULTS.stop()
+        futures = {}
+        for n in range(5):
+            command_id = result_stream.command_id_for(f"replay{n:04d}xx")
+            futures[command_id] = RESULTS.expect(command_id, 'replay')  # opens its stream...
+        await RESULTS.stop()  # ...which stays down while the results arrive
+        for command_id in futures:
+            await client.post("/api/execute", json={"apiKey": "bench", "accessId": "replay", "command": command_id,
+                                                    "requestId": command_id[4:]})
+            await client.post("/api/result", json={"commandId": command_id, "accessId": "replay",
+                                                    "result": "replayed", "status": "completed"})
+        RESULTS.ensure_running('replay')
+        events = await asyncio.gather(*(RESULTS.wait(c, f, 5) for c, f in futures.items()))
+        check("results stored while the stream was down are replayed on reconnect",
+              all(event and event['result'] == 'replayed' for event in events))
+
+        tools.MCP_AWAIT_TIMEOUT = 1.0
+        started = time.perf_counter()
+        reply = await call('nobody-polls', 'no extension here', wait=True)
+        check(f"a call with no answer returns the queued reply after {time.perf_counter() - started:.1f}s",
+              reply.startswith('OK') and 'still running' in reply)
+
+        # The caller has a GET /mcp stream open: the late result is sent there
+        session = streamable_http.Session('late')
+        stream = session.listen(lambda: asyncio.sleep(0, False))
+        first_event = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)  # the stream is open once listen() has started
+        streamable_http.bind_session(session)
+        reply = await call('late-ext', 'slow command', wait=True)
+        command_id = result_stream.command_id_for(reply.split('(ID:', 1)[1].split(')', 1)[0])
+        await client.post("/api/result", json={"commandId": command_id, "accessId": "late-ext",
+                                                "result": "done late", "status": "completed"})
+        event = codec.loads((await asyncio.wait_for(first_event, 10)).split(b'data: ', 1)[1])
+        await stream.aclose()
+        check(f"a result after the deadline is sent to the session's GET stream ({event['method']})",
+              'sent to this session' in reply and event['method'] == 'notifications/message'
+              and event['params']['data'] == {"commandId": command_id, "command": 'slow command',
+                                              "success": True, "result": 'done late'})
+
+        stop.set()
+        await asyncio.gather(*extensions, return_exceptions=True)
+        await tools.OUTBOX.stop()
+        await RESULTS.stop()
+        await bridge_client.stop()
+    proc.terminate()
+    proc.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
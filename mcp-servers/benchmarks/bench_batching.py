@@ -0,0 +1,120 @@
+"""
+Benchmark - micro-batching of /api/execute calls on vs off
+
+Usage:
+    python bench_batching.py [callers] [seconds]
+
+The stub bridge is throttled to a few concurrent "Supabase inserts"
+(STUB_CONCURRENCY) of STUB_LATENCY_MS each, like a busy Vercel deployment.
+A single caller and then `callers` concurrent forwarders send commands
+back-to-back; we report throughput and per-command p50/p99 for several
+batch windows.
+
+Then checks that a 200 batch reply that cannot be read (not JSON, no
+list, items that are not objects, too few items) answers every caller
+with a 502 instead of leaving it waiting, and that a send that raises
+fails every caller's call.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+os.environ.setdefault('CLOUD_BRIDGE_URL', "http://127.0.0.1:8899")
+os.environ.setdefault('BRIDGE_WARMUP_INTERVAL', '0')
+# Measure the bridge path itself, not admission control (bench_admission.py)
+os.environ.setdefault('BRIDGE_MAX_IN_FLIGHT', '0')
+os.environ.setdefault('BRIDGE_RATE_PER_ACCESS_ID', '0')
+
+import httpx
+
+import bridge_client
+import stub_bridge
+
+WINDOWS_MS = [0, 2, 5, 20]
+
+async def run(window_ms, callers, seconds):
+    bridge_client.BRIDGE_BATCH_WINDOW_MS = window_ms
+    await bridge_client.start()
+    samples = []
+    errors = 0
+    deadline = time.perf_counter() + seconds
+
+    async def caller(n):
+        nonlocal errors
+        i = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await bridge_client.post_execute(
+                {"userId": "tuya_ai", "apiKey": "bench", "accessId": "bench", "command": f"cmd {n}.{i}"})
+            samples.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200 or not response.json().get('commandId'):
+                errors += 1
+            i += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller(n) for n in range(callers)))
+    elapsed = time.perf_counter() - started
+    await bridge_client.stop()
+
+    samples.sort()
+    label = f"window {window_ms:g}ms" if window_ms else "batching off"
+    print(f"{label:<14} {len(samples) / elapsed:8.0f} cmd/s   "
+          f"p50 {statistics.median(samples):7.1f}ms   "
+          f"p99 {samples[int(len(samples) * 0.99) - 1]:7.1f}ms   errors {errors}")
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+async def batch_of_three(reply):
+    """Status codes (or exception names) three batched callers get when the bridge answers `reply`"""
+    async def post(endpoint, body):
+        if isinstance(reply, Exception):
+            raise reply
+        return httpx.Response(200, content=reply)
+
+    timed_post, bridge_client._timed_post = bridge_client._timed_post, post
+    batcher = bridge_client.ExecuteBatcher(window_ms=1, max_size=3)
+    try:
+        results = await asyncio.wait_for(asyncio.gather(
+            *(batcher.submit({"command": f"cmd {i}"}) for i in range(3)), return_exceptions=True), 2)
+    finally:
+        bridge_client._timed_post = timed_post
+    return [type(r).__name__ if isinstance(r, Exception) else r.status_code for r in results]
+
+def malformed_replies():
+    print("\nmalformed batch replies")
+    for label, reply in (("not JSON", b"<html>502 Bad Gateway</html>"),
+                         ("results not a list", b'{"results": {"status": 200}}'),
+                         ("a JSON list", b'[1, 2, 3]')):
+        got = asyncio.run(batch_of_three(reply))
+        check(f"{label}: every caller gets a 502 ({got})", got == [502, 502, 502])
+    got = asyncio.run(batch_of_three(b'{"results": [{"status": 200, "body": {"commandId": "c1"}}, "oops"]}'))
+    check(f"a bad or missing item fails only its caller ({got})", got == [200, 502, 502])
+    got = asyncio.run(batch_of_three(RuntimeError("boom")))
+    check(f"a send that raises fails every caller ({got})", got == ['RuntimeError'] * 3)
+
+def main():
+    callers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3
+    stub_bridge.configure(latency_ms=float(os.getenv('STUB_LATENCY_MS', '20')),
+                          concurrency=int(os.getenv('STUB_CONCURRENCY', '4')))
+    stub_bridge.serve_in_thread(port=8899)
+
+    print(f"stub: {stub_bridge.STUB}, {seconds:g}s per run")
+    # Light load shows the latency cost of the window, burst load the gain
+    for load in (1, callers):
+        print(f"\n{load} caller(s)")
+        for window_ms in WINDOWS_MS:
+            asyncio.run(run(window_ms, load, seconds))
+    malformed_replies()
+
+if __name__ == "__main__":
+    main()
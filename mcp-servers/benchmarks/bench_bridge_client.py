@@ -0,0 +1,68 @@
+"""
+Benchmark - per-call client vs shared pooled bridge_client
+
+Usage:
+    python bench_bridge_client.py [calls]
+
+Starts the stub bridge on 127.0.0.1:8899 and times /api/execute calls
+made the old way (new httpx.AsyncClient per call) and through the
+shared, pre-warmed pool.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+STUB_URL = "http://127.0.0.1:8899"
+os.environ.setdefault('CLOUD_BRIDGE_URL', STUB_URL)
+os.environ.setdefault('BRIDGE_MAX_IN_FLIGHT', '0')
+os.environ.setdefault('BRIDGE_RATE_PER_ACCESS_ID', '0')
+
+import httpx
+import bridge_client
+import stub_bridge
+
+PAYLOAD = {"userId": "tuya_ai", "apiKey": "bench", "accessId": "bench", "command": "turn on lights"}
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<22} mean {statistics.mean(samples):7.3f}ms   "
+          f"p50 {statistics.median(samples):7.3f}ms   p99 {p99:7.3f}ms")
+    return statistics.mean(samples)
+
+async def per_call_client(calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        async with httpx.AsyncClient() as client:
+            await client.post(f"{STUB_URL}/api/execute", json=PAYLOAD, timeout=15.0)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+async def pooled_client(calls):
+    await bridge_client.start()
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        await bridge_client.post_execute(PAYLOAD)
+        samples.append((time.perf_counter() - started) * 1000)
+    await bridge_client.stop()
+    return samples
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    stub_bridge.serve_in_thread(port=8899)
+
+    print(f"{calls} sequential /api/execute calls against {STUB_URL}")
+    before = summarize("new client per call", asyncio.run(per_call_client(calls)))
+    after = summarize("shared pooled client", asyncio.run(pooled_client(calls)))
+    print(f"per-call saving: {before - after:.3f}ms ({(1 - after / before) * 100:.0f}%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark - stdlib json vs msgspec vs orjson on the /mcp hot path
+
+Usage:
+    python bench_codec.py [iterations]
+
+One "request" is what the server does for a tools/call: decode the
+JSON-RPC body, convert params + arguments into typed envelopes, decode
+the Cloud Bridge reply into ExecuteResult, encode the response and the
+request-ring record. Reports CPU time per request for each codec that is
+installed (time.process_time, so the number is what the Space pays).
+"""
+
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+import codec
+from codec import CommandArguments, ExecuteResult, ToolCallParams
+
+REQUEST = (b'{"jsonrpc":"2.0","id":42,"method":"tools/call","params":{"name":"control_device",'
+           b'"arguments":{"command":"turn on the living room lights and set brightness to 80%"},'
+           b'"_meta":{"progressToken":"p-42"}}}')
+BRIDGE_REPLY = (b'{"success":true,"commandId":"cmd_1734880000000_ab12cd","message":"Command queued",'
+                b'"status":"pending"}')
+
+
+def one_request():
+    message = codec.loads(REQUEST)
+    call = codec.convert(message['params'], ToolCallParams)
+    command = codec.convert(call.arguments, CommandArguments).command
+    result = codec.decode(BRIDGE_REPLY, ExecuteResult)
+    text = f"OK: {command} (ID:{result.commandId})"
+    body = (b'{"jsonrpc":"2.0","id":42,"result":{"content":[{"type":"text","text":'
+            + codec.dumps(text) + b'}]}}')
+    record = codec.dumps({'timestamp': '2025-12-22T10:00:00', 'tool': call.name,
+                          'args': str(call.arguments)[:100], 'result': text[:100]})
+    return len(body) + len(record)
+
+
+def measure(name, iterations):
+    if codec.use(name) != name:
+        print(f"{name:<8} not installed - skipped")
+        return None
+    for _ in range(1000):
+        one_request()
+    started = time.process_time()
+    for _ in range(iterations):
+        one_request()
+    per_request = (time.process_time() - started) / iterations * 1e6
+    print(f"{name:<8} {per_request:7.2f}us CPU per request")
+    return per_request
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"{iterations} tools/call round trips per codec")
+    results = {name: measure(name, iterations) for name in ('stdlib', 'msgspec', 'orjson')}
+    baseline = results['stdlib']
+    for name in ('msgspec', 'orjson'):
+        if results[name]:
+            print(f"{name} saves {(1 - results[name] / baseline) * 100:4.1f}% CPU vs stdlib")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark - local intent parsing of device commands
+
+Usage:
+    python bench_device_intents.py [rounds]
+
+Runs intents.parse over CORPUS - device phrases as a voice assistant
+hands them over, each labelled with the action it should give, or None
+where it should go to the LLM as text (schedules, several devices,
+pronouns, relative changes, questions). Reports the match rate over the
+whole corpus and over the simple forms, wrong parses, and parse latency
+per phrase over `rounds` passes (default 200). Then checks what
+control_device sends: the text plus an "action" for a recognized phrase,
+the text only otherwise - and that the local bridge hands the action back
+to the extension on /api/poll.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'device-controller'))
+sys.path.insert(0, os.path.join(HERE, '..', 'local-bridge'))
+TMP = tempfile.mkdtemp()
+os.environ['REQUESTS_RING'] = os.path.join(TMP, 'requests.ring')
+
+import bridge_server
+import intents
+import tools
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+ON, OFF = True, False
+CORPUS = [
+    # on / off
+    ("turn on the lights", ('lights', 'power', ON, '')),
+    ("Turn off the lights.", ('lights', 'power', OFF, '')),
+    ("turn on lights", ('lights', 'power', ON, '')),
+    ("turn the kitchen light on", ('kitchen light', 'power', ON, '')),
+    ("switch off the fan", ('fan', 'power', OFF, '')),
+    ("switch the bedroom fan off", ('bedroom fan', 'power', OFF, '')),
+    ("please turn on the TV", ('tv', 'power', ON, '')),
+    ("can you turn off the living room lamp please", ('living room lamp', 'power', OFF, '')),
+    ("could you switch on my coffee maker", ('coffee maker', 'power', ON, '')),
+    ("shut off the heater", ('heater', 'power', OFF, '')),
+    ("power on the air purifier", ('air purifier', 'power', ON, '')),
+    ("power off the tv", ('tv', 'power', OFF, '')),
+    ("lights off", ('lights', 'power', OFF, '')),
+    ("hallway light on", ('hallway light', 'power', ON, '')),
+    ("turn on the power strip", ('power strip', 'power', ON, '')),
+    ("turn off all the lights", ('all the lights', 'power', OFF, '')),
+    ("Hey, turn on the porch light!", ('porch light', 'power', ON, '')),
+    ("turn on the lights in the kitchen", ('lights in the kitchen', 'power', ON, '')),
+    ("switch on the ac", ('ac', 'power', ON, '')),
+    ("turn the garage door opener off", ('garage door opener', 'power', OFF, '')),
+    ("ok turn off the washing machine", ('washing machine', 'power', OFF, '')),
+    ("turn on socket 2", ('socket 2', 'power', ON, '')),
+    # temperature
+    ("set the AC to 22 degrees", ('ac', 'temperature', 22, 'C')),
+    ("set the ac to 22", ('ac', 'temperature', 22, 'C')),
+    ("set thermostat temperature to 70F", ('thermostat', 'temperature', 70, 'F')),
+    ("set the temperature of the bedroom ac to 24", ('bedroom ac', 'temperature', 24, 'C')),
+    ("set living room AC temperature to 21.5", ('living room ac', 'temperature', 21.5, 'C')),
+    ("change the thermostat to 68 degrees fahrenheit", ('thermostat', 'temperature', 68, 'F')),
+    ("set the heater to 20°C", ('heater', 'temperature', 20, 'C')),
+    ("adjust the air conditioner to 25 degrees celsius", ('air conditioner', 'temperature', 25, 'C')),
+    ("set the heater to 80", ('heater', 'temperature', 80, 'F')),
+    ("put the ac at 23 degrees", ('ac', 'temperature', 23, 'C')),
+    ("set the office thermostat to 72 degrees", ('office thermostat', 'temperature', 72, 'F')),
+    ("could you set the temperature on the ac to 19 please", ('ac', 'temperature', 19, 'C')),
+    ("turn the heater to 21 degrees", ('heater', 'temperature', 21, 'C')),
+    # brightness
+    ("set the lights to 50%", ('lights', 'brightness', 50, '%')),
+    ("dim the bedroom lamp to 30%", ('bedroom lamp', 'brightness', 30, '%')),
+    ("set brightness of the desk lamp to 40 percent", ('desk lamp', 'brightness', 40, '%')),
+    ("set the kitchen lights brightness to 80", ('kitchen lights', 'brightness', 80, '%')),
+    ("dim the lights to 10", ('lights', 'brightness', 10, '%')),
+    ("brighten the living room light to 100%", ('living room light', 'brightness', 100, '%')),
+    ("set the lamp to 60", ('lamp', 'brightness', 60, '%')),
+    ("change the brightness of the hall bulbs to 25%", ('hall bulbs', 'brightness', 25, '%')),
+    ("turn the led strip to 45 percent", ('led strip', 'brightness', 45, '%')),
+    ("set the porch light to 0%", ('porch light', 'brightness', 0, '%')),
+    # left to the LLM
+    ("turn it off", None),
+    ("turn that on", None),
+    ("turn on the lights at 7pm", None),
+    ("turn off the tv in 10 minutes", None),
+    ("turn on the fan for an hour", None),
+    ("turn on the lights and set the ac to 22", None),
+    ("turn off the lights then lock the door", None),
+    ("are the lights on", None),
+    ("the lights are off", None),
+    ("don't turn the lights off", None),
+    ("leave the fan on", None),
+    ("set the fan to 3", None),
+    ("set the ac to 150 degrees", None),
+    ("set the lights to 150%", None),
+    ("set the lamp brightness to 22 degrees", None),
+    ("make it warmer", None),
+    ("turn up the brightness", None),
+    ("dim the lights a bit", None),
+    ("increase the temperature by 2 degrees", None),
+    ("what's the temperature in the bedroom", None),
+    ("set the ac to cool mode", None),
+    ("open the curtains", None),
+    ("lock the front door", None),
+    ("start the robot vacuum", None),
+    ("set a scene for movie night", None),
+    ("turn on", None),
+    ("power on", None),
+    ("turn off everything", None),
+    # ends in on / off, or reads like a level, without being a device command
+    ("hold on", None),
+    ("carry on", None),
+    ("log off", None),
+    ("sign off", None),
+    ("back off", None),
+    ("the show must go on", None),
+    ("turn up the heat to 25", None),
+    ("turn down the ac to 20", None),
+    ("brighten the room to 10", None),
+    ("set the fan to 50%", None),
+]
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def p(samples, pct):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1e6
+
+
+def as_tuple(action):
+    return None if action is None else (action.device, action.property, action.value, action.unit)
+
+
+async def sent_payload(command):
+    """What control_device hands to forward_command"""
+    seen = {}
+
+    async def record(tool_name, text, extra=None, wait=None):
+        seen.update(extra or {}, command=text)
+        return "OK"
+
+    forward, tools.forward_command = tools.forward_command, record
+    try:
+        await tools.control_device_impl(command)
+    finally:
+        tools.forward_command = forward
+    return seen
+
+
+async def polled(payload):
+    """What the extension gets from /api/poll for a command sent with this payload"""
+    bridge = bridge_server.LocalBridge(os.path.join(TMP, 'bridge.db'), auto_register=True)
+    await bridge.start()
+    try:
+        status, _ = await bridge.execute({**payload, "accessId": "intents"})
+        return await bridge.poll("intents") if status == 200 else {}
+    finally:
+        await bridge.stop()
+
+
+def main():
+    simple = [(phrase, expected) for phrase, expected in CORPUS if expected is not None]
+    results = {phrase: as_tuple(intents.parse(phrase)) for phrase, _ in CORPUS}
+    matched = sum(1 for phrase, _ in CORPUS if results[phrase] is not None)
+    simple_matched = sum(1 for phrase, _ in simple if results[phrase] is not None)
+    wrong = [(phrase, expected, results[phrase]) for phrase, expected in CORPUS if results[phrase] != expected]
+
+    timings = []
+    for _ in range(ROUNDS):
+        for phrase, _ in CORPUS:
+            started = time.perf_counter()
+            intents.parse(phrase)
+            timings.append(time.perf_counter() - started)
+
+    print(f"{len(CORPUS)} phrases ({len(simple)} simple forms), {ROUNDS} rounds\n")
+    print(f"  match rate      {matched / len(CORPUS):5.0%} of all phrases, "
+          f"{simple_matched / len(simple):5.0%} of the simple forms")
+    print(f"  wrong parses    {len(wrong)}")
+    print(f"  parse latency   p50 {p(timings, 50):5.1f}us  p99 {p(timings, 99):5.1f}us  "
+          f"({len(timings) / sum(timings):,.0f} phrases/s)\n")
+    for phrase, expected, got in wrong:
+        print(f"    {phrase!r}: expected {expected}, got {got}")
+
+    check("every phrase parses to its label: the action, or None for the LLM", not wrong)
+    check("parsing a phrase takes under 100us at p99", p(timings, 99) < 100)
+
+    payload = asyncio.run(sent_payload("Turn on the kitchen lights"))
+    check("a recognized phrase is sent with its text and action",
+          payload.get('command') == "Turn on the kitchen lights" and payload.get('type') == 'device_control'
+          and payload.get('action') == {"device": "kitchen lights", "property": "power", "value": True, "unit": ""})
+    polled_command = asyncio.run(polled(payload))
+    check("the bridge hands the action to the extension with the command",
+          polled_command.get('command') == payload['command'] and polled_command.get('action') == payload['action'])
+    payload = asyncio.run(sent_payload("turn it off"))
+    check("anything else is sent as text only", payload.get('command') == "turn it off" and 'action' not in payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark - one Cloud Bridge URL vs a health-scored pool of deployments
+
+Usage:
+    python bench_failover.py [commands] [concurrency]
+
+Three stub bridges run side by side on one shared "database": A (the
+primary, 10ms), B and C (60ms). Each scenario sends 50 commands while all
+are healthy, then injects a fault into A and sends `commands` more
+(default 150, `concurrency` at a time, default 10):
+
+    slow      A takes 1.5s per insert, like a cold start
+    erroring  A answers every insert with a 500
+    flaky     A fails 30% of inserts
+    down      A refuses connections
+    hangs     A never answers; BRIDGE_TIMEOUT is 2s here
+
+and compares three setups: CLOUD_BRIDGE_URL alone, the pool, and the pool
+with a hedged second request after A's p95. Reports what callers saw
+after the fault (failed commands, p50 / p99 / max) and how many requests
+failed over or were hedged, then checks that the pool never loses a
+command and that no command is queued twice.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+PORTS = {'A': 8911, 'B': 8912, 'C': 8913}
+URLS = [f"http://127.0.0.1:{port}" for port in PORTS.values()]
+os.environ['CLOUD_BRIDGE_URLS'] = ','.join(URLS)
+os.environ['BRIDGE_TIMEOUT'] = '2'
+os.environ.setdefault('BRIDGE_WARMUP_INTERVAL', '0')
+os.environ['BRIDGE_MAX_IN_FLIGHT'] = '0'  # measure routing, not admission control
+os.environ['BRIDGE_RATE_PER_ACCESS_ID'] = '0'
+
+import bridge_client
+import bridge_pool
+import metrics
+import stub_bridge
+
+COMMANDS = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+WARM_COMMANDS = 50
+
+HEALTHY = {'A': dict(latency_ms=10, jitter_ms=2), 'B': dict(latency_ms=60, jitter_ms=10),
+           'C': dict(latency_ms=60, jitter_ms=10)}
+FAULTS = {
+    'slow': dict(latency_ms=1500, jitter_ms=0),
+    'erroring': dict(error_rate=1.0),
+    'flaky': dict(error_rate=0.3),
+    'down': None,
+    'hangs': dict(latency_ms=60000, jitter_ms=0),  # last: its stuck requests would hold up a shutdown
+}
+SETUPS = {
+    'single URL': dict(urls=URLS[:1]),
+    'pool': dict(urls=URLS),
+    'pool + hedge p95': dict(urls=URLS, hedge_percentile=95),
+}
+
+DEADLINE = bridge_client.POOL.deadline
+STUBS = {name: stub_bridge.Stub(**settings) for name, settings in HEALTHY.items()}
+SERVERS = {}
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def p(samples, pct):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1000
+
+
+def start_stubs():
+    for name, stub in STUBS.items():
+        stub.configure(**{'error_rate': 0, **HEALTHY[name]})
+        if name not in SERVERS:
+            SERVERS[name] = stub_bridge.serve_in_thread(port=PORTS[name], stub=stub)
+
+
+def stop_stub(name):
+    SERVERS.pop(name).should_exit = True
+    while True:  # until the port refuses connections
+        try:
+            socket.create_connection(('127.0.0.1', PORTS[name]), timeout=0.1).close()
+        except OSError:
+            return
+        time.sleep(0.05)
+
+
+async def send_all(count, tag):
+    waits, failed = [], 0
+    queue = iter(range(count))
+
+    async def worker():
+        nonlocal failed
+        for n in queue:
+            started = time.perf_counter()
+            try:
+                response = await bridge_client.post_execute(
+                    {"userId": "tuya_ai", "apiKey": "bench", "accessId": "bench", "command": f"{tag} {n}"})
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            waits.append(time.perf_counter() - started)
+            failed += not ok
+
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    return waits, failed
+
+
+async def run(scenario, label, setup):
+    start_stubs()
+    bridge_client.POOL = bridge_pool.BridgePool(deadline=DEADLINE, **setup)
+    await bridge_client.warm_up()
+    await send_all(WARM_COMMANDS, f"{scenario}/{label} warm")
+
+    if FAULTS[scenario] is None:
+        stop_stub('A')
+    else:
+        STUBS['A'].configure(**FAULTS[scenario])
+    failovers = metrics.BRIDGE_FAILOVERS._values.get((), 0)
+    hedges = bridge_client.POOL.hedges
+    waits, failed = await send_all(COMMANDS, f"{scenario}/{label}")
+    failovers = metrics.BRIDGE_FAILOVERS._values.get((), 0) - failovers
+    hedges = bridge_client.POOL.hedges - hedges
+    print(f"  {label:<17} {failed:4d} failed   p50 {p(waits, 50):7.1f}ms  p99 {p(waits, 99):7.1f}ms  "
+          f"max {max(waits) * 1000:7.1f}ms   {failovers:3d} failovers  {hedges:3d} hedges")
+    return failed, waits
+
+
+async def main():
+    print(f"A {HEALTHY['A']['latency_ms']:g}ms, B and C {HEALTHY['B']['latency_ms']:g}ms; "
+          f"{WARM_COMMANDS} warm-up commands, then {COMMANDS} after the fault, {CONCURRENCY} at a time")
+    await bridge_client.start(warm=False)
+    results = {}
+    for scenario in FAULTS:
+        print(f"\n{scenario}")
+        for label, setup in SETUPS.items():
+            results[scenario, label] = await run(scenario, label, setup)
+    await bridge_client.stop()
+
+    ok = sum(COMMANDS + WARM_COMMANDS - failed for failed, _ in results.values())
+    duplicates = sum(stub.stats['duplicates'] for stub in STUBS.values())
+    print(f"\n{len(stub_bridge.RECEIVED)} commands queued, {ok} acknowledged, "
+          f"{duplicates} resends recognised by requestId\n")
+    check("the pool loses no command in any scenario",
+          all(failed == 0 for (_, label), (failed, _) in results.items() if label != 'single URL'))
+    check("every acknowledged command is queued exactly once",
+          len(stub_bridge.RECEIVED) == len(set(stub_bridge.RECEIVED)) >= ok)
+    slow = results['slow', 'pool + hedge p95'][1]
+    check(f"while A is slow, hedging keeps every call under 1s (max {max(slow) * 1000:.0f}ms)", max(slow) < 1.0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,261 @@
+"""
+Benchmark - the self-hosted local bridge (SQLite) under command load
+
+Usage:
+    python bench_local_bridge.py [commands] [access_ids]
+
+1. Throughput: `commands` (default 2000) executes from `access_ids`
+   (default 20) extensions, one caller per accessId, against
+   bridge_server.py in its own process in four setups - group commit
+   on / off and the accessId cache on / off. Then every extension
+   drains its queue through /api/poll and posts a result for each
+   command. Reports execute p50 / p99, commands per second,
+   commits per write and poll + result throughput. stub_bridge.py, which
+   stores nothing, runs first as the floor set by HTTP alone.
+2. Correctness: per accessId FIFO, exactly-once delivery, stored results,
+   requestId dedupe under concurrent resends, an admin DELETE taking
+   effect on the next execute, a row written to mcp_configs by another
+   process being noticed within ACCESS_CACHE_CHECK, and pending commands
+   surviving a restart.
+3. Failed writes: a group commit that raises (not an sqlite error) fails
+   its writes without stopping the writer, and a poll whose status update
+   fails leaves its command queued for the next poll.
+"""
+
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'local-bridge'))
+
+import httpx
+import uvicorn
+
+import bridge_server
+
+COMMANDS = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+ACCESS_IDS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+PORT = 8921
+URL = f"http://127.0.0.1:{PORT}"
+TMP = tempfile.mkdtemp()
+SERVER_DIR = os.path.join(HERE, '..', 'local-bridge')
+
+SETUPS = {
+    'batch 2ms + cache': dict(LOCAL_BRIDGE_BATCH_MS='2', ACCESS_CACHE_CHECK='1'),
+    'batch 2ms, no cache': dict(LOCAL_BRIDGE_BATCH_MS='2', ACCESS_CACHE_CHECK='0'),
+    'commit per write + cache': dict(LOCAL_BRIDGE_BATCH_MS='0', ACCESS_CACHE_CHECK='1'),
+    'commit per write, no cache': dict(LOCAL_BRIDGE_BATCH_MS='0', ACCESS_CACHE_CHECK='0'),
+}
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def p(samples, pct):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1000
+
+
+def serve(bridge):
+    """Run a LocalBridge in a daemon thread and wait until it accepts requests"""
+    server = uvicorn.Server(uvicorn.Config(bridge_server.create_app(bridge), host="127.0.0.1", port=PORT,
+                                           log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def shutdown(server, thread):
+    server.should_exit = True
+    thread.join()
+
+
+def spawn(script, cwd, settings):
+    """A bridge in its own process, so the callers here don't share its GIL"""
+    env = {**os.environ, **settings, 'LOCAL_BRIDGE_PORT': str(PORT), 'STUB_PORT': str(PORT)}
+    env.pop('MCP_API_KEY', None)
+    proc = subprocess.Popen([sys.executable, script], cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{URL}/api/ping", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit(f"{script} did not start")
+
+
+async def send(client, access_id, count, tag):
+    waits = []
+    for n in range(count):
+        started = time.perf_counter()
+        response = await client.post("/api/execute", json={
+            "userId": "tuya_ai", "apiKey": "bench", "accessId": access_id, "command": f"{tag} {n}"})
+        waits.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return waits
+
+
+async def drain(client, access_id):
+    """Poll until empty, posting a result for each command; returns the commands in delivery order"""
+    seen = []
+    while True:
+        command = (await client.get("/api/poll", params={"accessId": access_id})).json()
+        if not command['hasCommand']:
+            return seen
+        seen.append((command['commandId'], command['command']))
+        await client.post("/api/result", json={"commandId": command['commandId'], "accessId": access_id,
+                                                "result": f"done: {command['command']}", "status": "completed"})
+
+
+async def baseline():
+    proc = spawn('stub_bridge.py', HERE, {'STUB_LATENCY_MS': '0', 'STUB_ERROR_RATE': '0'})
+    per_id = COMMANDS // ACCESS_IDS
+    async with httpx.AsyncClient(base_url=URL, timeout=30,
+                                 limits=httpx.Limits(max_connections=ACCESS_IDS)) as client:
+        await send(client, 'warm', 5, 'warm')
+        started = time.perf_counter()
+        waits = sum(await asyncio.gather(*(send(client, f"ext{n}", per_id, 'stub') for n in range(ACCESS_IDS))), [])
+        elapsed = time.perf_counter() - started
+    print(f"  {'stub, stores nothing':<27} p50 {p(waits, 50):6.2f}ms  p99 {p(waits, 99):6.2f}ms  "
+          f"{len(waits) / elapsed:6.0f} cmd/s")
+    proc.terminate()
+    proc.wait()
+
+
+async def throughput(label, settings):
+    path = os.path.join(TMP, f"{uuid.uuid4().hex}.db")
+    proc = spawn('bridge_server.py', SERVER_DIR,
+                 {**settings, 'LOCAL_BRIDGE_DB': path, 'LOCAL_BRIDGE_AUTO_REGISTER': 'true'})
+    access_ids = [f"ext{n}" for n in range(ACCESS_IDS)]
+    per_id = COMMANDS // ACCESS_IDS
+    async with httpx.AsyncClient(base_url=URL, timeout=30,
+                                 limits=httpx.Limits(max_connections=ACCESS_IDS)) as client:
+        await send(client, 'warm', 5, 'warm')  # registers, opens connections
+        await drain(client, 'warm')
+        writer = (await client.get("/health")).json()['writer']
+
+        started = time.perf_counter()
+        waits = sum(await asyncio.gather(*(send(client, a, per_id, a) for a in access_ids)), [])
+        elapsed = time.perf_counter() - started
+        health = (await client.get("/health")).json()
+        commits = health['writer']['commits'] - writer['commits']
+        writes = health['writer']['writes'] - writer['writes']
+
+        started = time.perf_counter()
+        delivered = await asyncio.gather(*(drain(client, a) for a in access_ids))
+        drained = time.perf_counter() - started
+        results = (await client.get("/health")).json()['results']
+
+    print(f"  {label:<27} p50 {p(waits, 50):6.2f}ms  p99 {p(waits, 99):6.2f}ms  {len(waits) / elapsed:6.0f} cmd/s  "
+          f"{writes / max(commits, 1):5.1f} writes/commit   poll+result {len(waits) / drained:6.0f} cmd/s")
+    proc.terminate()
+    proc.wait()
+    in_order = all([command for _, command in seen] == [f"{a} {n}" for n in range(per_id)]
+                   for a, seen in zip(access_ids, delivered))
+    ids = [command_id for seen in delivered for command_id, _ in seen]
+    with sqlite3.connect(path) as db:
+        stored = db.execute("SELECT COUNT(*) FROM results WHERE success = 1").fetchone()[0]
+    return in_order, len(ids) == len(set(ids)) == per_id * ACCESS_IDS, stored == results == len(ids) + 5
+
+
+async def correctness():
+    path = os.path.join(TMP, 'correctness.db')
+    bridge = bridge_server.LocalBridge(path, cache_check=0.5, auto_register=False)
+    server, thread = serve(bridge)
+    async with httpx.AsyncClient(base_url=URL, timeout=10) as client:
+        execute = lambda access_id, **body: client.post("/api/execute", json={
+            "userId": "tuya_ai", "apiKey": "bench", "accessId": access_id, "command": "turn on the lamp", **body})
+
+        check("an unknown accessId gets 404", (await execute('ext-a')).status_code == 404)
+        await client.post("/api/mcp/config", json={"accessId": "ext-a", "userId": "alice"})
+        check("a registered accessId is accepted", (await execute('ext-a')).status_code == 200)
+
+        request_id = uuid.uuid4().hex
+        answers = await asyncio.gather(*(execute('ext-a', requestId=request_id) for _ in range(5)))
+        answers.append(await execute('ext-a', requestId=request_id))
+        command_ids = {answer.json()['commandId'] for answer in answers}
+        rows = bridge.db.execute("SELECT COUNT(*) FROM commands WHERE command_id = ?",
+                                 (f"cmd_{request_id}",)).fetchone()[0]
+        check("six sends of one requestId queue one command", len(command_ids) == 1 and rows == 1)
+
+        await client.delete("/api/mcp/config", params={"accessId": "ext-a"})
+        check("an admin DELETE is enforced on the next execute", (await execute('ext-a')).status_code == 404)
+
+        check("ext-b is unknown before another process registers it", (await execute('ext-b')).status_code == 404)
+        with sqlite3.connect(path) as other:
+            other.execute("INSERT INTO mcp_configs (config_id, user_id, access_id, created_at) VALUES (?, ?, ?, ?)",
+                          ('cfg_external', 'bob', 'ext-b', time.time()))
+        started = time.perf_counter()
+        while (await execute('ext-b')).status_code != 200 and time.perf_counter() - started < 5:
+            await asyncio.sleep(0.05)
+        noticed = time.perf_counter() - started
+        check(f"an external mcp_configs write is noticed in {noticed * 1000:.0f}ms (cache check 500ms)",
+              noticed < 1.0)
+    shutdown(server, thread)
+
+    bridge = bridge_server.LocalBridge(path, cache_check=0.5)
+    server, thread = serve(bridge)
+    async with httpx.AsyncClient(base_url=URL, timeout=10) as client:
+        pending = bridge.backlog()
+        first = (await client.get("/api/poll", params={"accessId": "ext-a"})).json()
+    shutdown(server, thread)
+    check(f"{pending} pending commands survive a restart, oldest first",
+          pending == 3 and first['hasCommand'] and first['commandId'] != f"cmd_{request_id}")
+
+
+async def failed_writes():
+    bridge = bridge_server.LocalBridge(os.path.join(TMP, 'failed.db'), auto_register=True)
+    await bridge.start()
+    try:
+        status, queued = await bridge.execute({"userId": "tuya_ai", "apiKey": "bench", "accessId": "ext-f",
+                                               "command": "turn on the lamp"})
+        commit = bridge.writer._commit
+
+        def broken(batch):
+            raise RuntimeError("disk went away")
+
+        bridge.writer._commit = broken
+        try:
+            await asyncio.wait_for(bridge.poll("ext-f"), 5)
+            failed = False
+        except RuntimeError:
+            failed = True
+        bridge.writer._commit = commit
+        check("a commit that raises fails its writes", status == 200 and failed)
+        check("the writer keeps running after it", not bridge.writer._task.done())
+        retried = await asyncio.wait_for(bridge.poll("ext-f"), 5)
+        check("the command whose status update failed is handed out on the next poll",
+              retried.get('commandId') == queued['commandId'])
+    finally:
+        await bridge.stop()
+
+
+async def main():
+    print(f"{COMMANDS} commands from {ACCESS_IDS} accessIds, one caller each\n")
+    await baseline()
+    checks = [await throughput(label, settings) for label, settings in SETUPS.items()]
+    print()
+    check("every accessId gets its commands in the order sent", all(ordered for ordered, _, _ in checks))
+    check("every command is delivered exactly once", all(once for _, once, _ in checks))
+    check("every result is stored", all(stored for _, _, stored in checks))
+    await correctness()
+    await failed_writes()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,69 @@
+"""
+Benchmark - dashboard log refresh: readlines() vs incremental LogTail
+
+Usage:
+    python bench_log_tail.py [megabytes]
+
+Builds a log file of the given size (a few days of uptime), then times
+one dashboard refresh with the old readlines()[-30:] and with LogTail:
+the first read (seek back from EOF), an idle refresh, and a refresh
+after a few new lines. Finishes with a rotation to check nothing is lost.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+from log_tail import LogTail
+
+LINE = '{"ts":"2025-12-22T10:00:00.000","level":"INFO","component":"TUYA","msg":"KEEPALIVE PING... %d"}\n'
+
+def timed(label, fn, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    per_call = (time.perf_counter() - started) / repeat * 1000
+    print(f"{label:<28} {per_call:9.3f}ms")
+    return result
+
+def readlines_tail(path):
+    with open(path, 'r') as f:
+        return f.readlines()[-30:]
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    path = os.path.join(tempfile.mkdtemp(), 'tuya_client.log')
+    with open(path, 'w') as f:
+        written = i = 0
+        while written < megabytes * 1024 * 1024:
+            line = LINE % i
+            f.write(line)
+            written += len(line)
+            i += 1
+    print(f"{megabytes:g}MB log, {i} lines")
+
+    old = timed("readlines()[-30:]", lambda: readlines_tail(path), repeat=3)
+    tail = LogTail(path, 30)
+    new = timed("LogTail first read", tail.read, repeat=1)
+    assert [line.rstrip('\n') for line in old] == new, "tails differ"
+    timed("LogTail idle refresh", tail.read, repeat=1000)
+
+    def append_and_read():
+        with open(path, 'a') as f:
+            f.write(LINE % -1)
+        return tail.read()
+    timed("LogTail refresh +1 line", append_and_read, repeat=1000)
+
+    os.rename(path, path + '.1')
+    with open(path, 'w') as f:
+        f.write(LINE % -2)
+    lines = tail.read()
+    ok = lines[-1] == (LINE % -2).rstrip('\n') and lines[-2] == (LINE % -1).rstrip('\n')
+    print(f"rotation keeps old tail + new lines -> {'OK' if ok else 'MISMATCH'}")
+
+if __name__ == "__main__":
+    main()
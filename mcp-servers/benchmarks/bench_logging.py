@@ -0,0 +1,107 @@
+"""
+Benchmark - event-loop stall from logging: FileHandler vs queue pipeline
+
+Usage:
+    python bench_logging.py [seconds] [callers]
+
+`callers` simulated tool calls run concurrently, each logging the same
+three lines a real tools/call writes, with a short await between calls.
+A probe task wakes every 5ms and records how late it was - that lateness
+is the time the loop spent blocked. Each setup runs against a normal
+/tmp file and a "slow disk" that takes 1ms per write, like a busy shared
+Space volume.
+"""
+
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+import log_pipeline
+
+PROBE_INTERVAL = 0.005
+
+def slow(handler, delay):
+    emit = handler.emit
+
+    def slow_emit(record):
+        time.sleep(delay)
+        emit(record)
+
+    handler.emit = slow_emit
+    return handler
+
+def sync_logger(name, path, delay):
+    """The old setup: FileHandler called straight from the event loop"""
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(asctime)s - [MCP-SERVER] - %(message)s'))
+    logger.addHandler(slow(handler, delay) if delay else handler)
+    return logger, lambda: None
+
+def pipeline_logger(name, path, delay):
+    logger = logging.getLogger(f"bench.{name}")
+    logger.propagate = False
+    listener = log_pipeline.setup(logger, path, 'MCP-SERVER', console=False)
+    if delay:
+        for handler in listener.handlers:
+            slow(handler, delay)
+    return logger, log_pipeline.shutdown
+
+async def probe(lags, stop):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(loop.time() - expected, 0) * 1000)
+
+async def run(logger, seconds, callers):
+    lags = []
+    stop = asyncio.Event()
+    calls = 0
+    deadline = time.perf_counter() + seconds
+
+    async def caller(n):
+        nonlocal calls
+        i = 0
+        while time.perf_counter() < deadline:
+            logger.info("MCP REQUEST: tools/call")
+            logger.info(f"TOOL: control_device('turn on lights {n}.{i}')")
+            await asyncio.sleep(0.002)
+            logger.info(f"SUCCESS: ID cmd_{n}_{i}")
+            calls += 1
+            i += 1
+
+    probe_task = asyncio.create_task(probe(lags, stop))
+    await asyncio.gather(*(caller(n) for n in range(callers)))
+    stop.set()
+    await probe_task
+    return lags, calls
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    callers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    tmp = tempfile.mkdtemp()
+    print(f"{callers} concurrent callers, {seconds:g}s per run, LOG_SAMPLE={log_pipeline.LOG_SAMPLE!r}")
+
+    for disk, delay in (("tmp file", 0), ("slow disk 1ms", 0.001)):
+        for name, build in (("FileHandler", sync_logger), ("queue pipeline", pipeline_logger)):
+            key = f"{name}-{delay}".replace(' ', '_')
+            logger, finish = build(key, os.path.join(tmp, f"{key}.log"), delay)
+            lags, calls = asyncio.run(run(logger, seconds, callers))
+            finish()
+            lags.sort()
+            print(f"{disk:<14} {name:<15} {calls / seconds:8.0f} calls/s   loop lag "
+                  f"p50 {statistics.median(lags):6.2f}ms  p99 {lags[int(len(lags) * 0.99) - 1]:7.2f}ms  "
+                  f"max {lags[-1]:7.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Benchmark - tool calls through the SQLite outbox vs straight to the bridge
+
+Usage:
+    python bench_outbox.py [latency_ms] [outage_seconds]
+
+1. Call path: 100 commands from 10 accessIds, 10 per second, through
+   tools.forward_command against a stub bridge with latency_ms (default
+   300) per insert, first forwarding synchronously, then through the
+   outbox. Reports what the Tuya caller waits and, for the outbox, how
+   far delivery lags behind. (One accessId's commands are delivered one
+   at a time, so its lag grows if it sends faster than the bridge
+   answers.)
+2. Outage: the stub fails every insert for outage_seconds (default 5)
+   while 200 commands for 4 accessIds arrive. Commands from the direct
+   path are lost; the outbox keeps them, then delivers every one, in
+   order per accessId, once the bridge is back.
+3. Restart: the drainer is stopped with commands pending, and a new
+   Outbox on the same file (a restarted process) delivers them.
+4. Rejections: a command the bridge would refuse is answered with an
+   error, without being stored; one it does refuse (404) is answered at
+   once, and its lookup (GET /outbox/<id>) carries the bridge's error.
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+TMP = tempfile.mkdtemp()
+os.environ.setdefault('CLOUD_BRIDGE_URL', "http://127.0.0.1:8899")
+os.environ.setdefault('BRIDGE_WARMUP_INTERVAL', '0')
+os.environ.setdefault('BRIDGE_RATE_PER_ACCESS_ID', '0')
+os.environ.setdefault('MCP_API_KEY', 'bench')  # measure the outbox, not the token buckets
+os.environ['OUTBOX_DB'] = os.path.join(TMP, 'outbox.db')
+os.environ['OUTBOX_RETRY_CAP'] = '2'
+os.environ['REQUESTS_RING'] = os.path.join(TMP, 'requests.ring')
+
+import httpx
+
+import bridge_client
+import outbox
+import stub_bridge
+import tools
+
+LATENCY_MS = float(sys.argv[1]) if len(sys.argv) > 1 else 300
+OUTAGE = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+ACCESS_IDS = ['a', 'b', 'c', 'd']
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def p(samples, pct):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1000
+
+
+async def wait_drained(box, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while (await box.backlog())[0] and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+
+
+def lags(box):
+    rows = box.db.execute("SELECT finished - created FROM outbox WHERE status = 'delivered'").fetchall()
+    return [row[0] for row in rows]
+
+
+async def call_path():
+    print(f"\n1. call path, bridge insert {LATENCY_MS:g}ms")
+    for label, enabled in (('direct', False), ('outbox', True)):
+        tools.OUTBOX_ENABLED = enabled
+        outbox.OUTBOX.db.execute('DELETE FROM outbox')
+        waits = []
+        for i in range(100):
+            tools.bridge_access_id.set(f"user-{i % 10}")
+            started = time.perf_counter()
+            result = await tools.forward_command('control_device', f"lights {i}")
+            waits.append(time.perf_counter() - started)
+            assert result.startswith('OK'), result
+            await asyncio.sleep(0.1)
+        print(f"  {label:<10} caller waits p50 {p(waits, 50):8.2f}ms  p99 {p(waits, 99):8.2f}ms")
+        if enabled:
+            await wait_drained(outbox.OUTBOX)
+            delivered = lags(outbox.OUTBOX)
+            print(f"  {'':<10} delivery lag p50 {p(delivered, 50):8.1f}ms  p99 {p(delivered, 99):8.1f}ms  "
+                  f"({len(delivered)} delivered)")
+            check("the outbox answers before the bridge does", p(waits, 99) < LATENCY_MS / 2)
+
+
+async def outage():
+    print(f"\n2. bridge down for {OUTAGE:g}s, 200 commands for {len(ACCESS_IDS)} accessIds")
+    stub_bridge.configure(latency_ms=20, error_rate=1.0)
+    for enabled in (False, True):
+        tools.OUTBOX_ENABLED = enabled
+        outbox.OUTBOX.db.execute('DELETE FROM outbox')
+        stub_bridge.RECEIVED.clear()
+        accepted = 0
+        started = time.perf_counter()
+        for i in range(200):
+            tools.bridge_access_id.set(ACCESS_IDS[i % len(ACCESS_IDS)])
+            result = await tools.forward_command('control_device', f"cmd {i:03d}")
+            accepted += result.startswith('OK')
+            await asyncio.sleep(OUTAGE / 200)
+        stub_bridge.configure(latency_ms=20, error_rate=0)
+        recovered = time.perf_counter()
+        label = 'outbox' if enabled else 'direct'
+        if not enabled:
+            print(f"  direct   {accepted} / 200 accepted, {len(stub_bridge.RECEIVED)} reached the bridge")
+            stub_bridge.configure(latency_ms=20, error_rate=1.0)
+            continue
+        await wait_drained(outbox.OUTBOX)
+        drained = time.perf_counter() - recovered
+        received = list(stub_bridge.RECEIVED)
+        in_order = all([c for a, c in received if a == access_id] == sorted(c for a, c in received if a == access_id)
+                       for access_id in ACCESS_IDS)
+        print(f"  {label:<8} {accepted} / 200 accepted at once, {len(received)} delivered "
+              f"{drained:.1f}s after the bridge came back ({outbox.OUTBOX.stats['retries']} retries)")
+        print(f"  {'':<8} delivery lag max {max(lags(outbox.OUTBOX)):.1f}s")
+        check("every command survives the outage", len(received) == 200 and len(set(received)) == 200)
+        check("delivery order kept per accessId", in_order)
+
+
+async def restart():
+    print("\n3. restart with commands pending")
+    tools.OUTBOX_ENABLED = True
+    outbox.OUTBOX.db.execute('DELETE FROM outbox')
+    stub_bridge.RECEIVED.clear()
+    stub_bridge.configure(latency_ms=20, error_rate=1.0)
+    for i in range(20):
+        await tools.forward_command('control_device', f"before restart {i}")
+    await outbox.OUTBOX.stop()  # the process "dies" with 20 commands pending
+    stub_bridge.configure(latency_ms=20, error_rate=0)
+
+    restarted = outbox.Outbox(os.environ['OUTBOX_DB'])
+    check("pending commands are still on disk", (await restarted.backlog())[0] == 20)
+    restarted.ensure_draining()
+    await wait_drained(restarted)
+    check("a new process delivers them", len(stub_bridge.RECEIVED) == 20)
+    await restarted.stop()
+
+
+async def rejections():
+    print("\n4. rejected commands")
+    tools.OUTBOX_ENABLED = True
+    outbox.OUTBOX.db.execute('DELETE FROM outbox')
+    stub_bridge.configure(latency_ms=20, error_rate=0)
+    queued = outbox.OUTBOX.stats['queued']
+    result = await tools.forward_command('control_device', '')
+    check(f"an empty command is refused before it is stored ({result})",
+          result.startswith('ERROR') and (await outbox.OUTBOX.backlog())[0] == 0
+          and outbox.OUTBOX.stats['queued'] == queued)
+
+    async def unregistered(payload):
+        return httpx.Response(404, json={"error": "Access ID not registered."},
+                              request=httpx.Request('POST', 'http://bridge/api/execute'))
+
+    post_execute, bridge_client.post_execute = bridge_client.post_execute, unregistered
+    try:
+        tools.bridge_access_id.set('nobody')
+        started = time.perf_counter()
+        result = await tools.forward_command('control_device', 'lights on')
+        waited = (time.perf_counter() - started) * 1000
+        local_id = result.rsplit('ID:', 1)[-1].rstrip(')')
+        await wait_drained(outbox.OUTBOX)
+        state = await outbox.OUTBOX.lookup(local_id)
+    finally:
+        bridge_client.post_execute = post_execute
+    check(f"a command the bridge rejects is answered at once ({waited:.1f}ms, {result})",
+          result.startswith('OK') and waited < 100)
+    check(f"its lookup carries the bridge's error ({state['status']}: {state['error']})",
+          state['status'] == outbox.FAILED and 'HTTP 404' in state['error'] and 'not registered' in state['error'])
+
+
+async def main():
+    stub_bridge.configure(latency_ms=LATENCY_MS, jitter_ms=0)
+    await bridge_client.start()
+    await call_path()
+    await outage()
+    await restart()
+    await rejections()
+    await outbox.OUTBOX.stop()
+    await bridge_client.stop()
+
+
+if __name__ == "__main__":
+    stub_bridge.serve_in_thread()
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Benchmark - JSON file rewrite vs memory-mapped request ring
+
+Usage:
+    python bench_request_log.py [seconds] [workers]
+
+Paces appends at 1k req/s for each implementation and reports the
+per-append cost and how much of the 1ms budget it eats. Then runs
+`workers` processes appending to one ring concurrently and checks that
+a reader sees every sequence number exactly once with no torn records.
+"""
+
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+from request_log import RequestRing, RequestRingReader
+
+RATE = 1000
+
+def legacy_log_request(path, tool_name, args, result):
+    """The old log_request: read all, append, truncate, rewrite"""
+    requests = []
+    try:
+        with open(path, 'r') as f:
+            requests = json.load(f)
+    except Exception:
+        pass
+    requests.append({
+        'timestamp': datetime.now().isoformat(),
+        'tool': tool_name,
+        'args': str(args)[:100],
+        'result': str(result)[:100]
+    })
+    with open(path, 'w') as f:
+        json.dump(requests[-50:], f)
+
+def paced(name, append, seconds):
+    samples = []
+    interval = 1 / RATE
+    next_at = time.perf_counter()
+    deadline = next_at + seconds
+    while next_at < deadline:
+        now = time.perf_counter()
+        if now < next_at:
+            time.sleep(next_at - now)
+        started = time.perf_counter()
+        append()
+        samples.append((time.perf_counter() - started) * 1e6)
+        next_at += interval
+    samples.sort()
+    mean = statistics.mean(samples)
+    print(f"{name:<18} {len(samples):6d} appends   mean {mean:8.1f}us   "
+          f"p99 {samples[int(len(samples) * 0.99) - 1]:8.1f}us   "
+          f"budget used {mean / (interval * 1e6) * 100:5.1f}%")
+
+def _writer(path, count):
+    ring = RequestRing(path)
+    for i in range(count):
+        ring.append({'tool': 'bench', 'args': f'{os.getpid()}:{i}', 'result': 'x' * 80})
+
+def check_workers(workers, per_worker=2000):
+    path = os.path.join(tempfile.mkdtemp(), 'ring')
+    RequestRing(path, slot_count=workers * per_worker)
+    procs = [multiprocessing.Process(target=_writer, args=(path, per_worker)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    reader = RequestRingReader(path)
+    records = reader.read_new()
+    unique = {r['args'] for r in records}
+    ok = reader.seq == len(records) == len(unique) == workers * per_worker
+    print(f"{workers} writer processes x {per_worker}: seq={reader.seq} "
+          f"read={len(records)} unique={len(unique)} -> {'OK' if ok else 'MISMATCH'}")
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    tmp = tempfile.mkdtemp()
+
+    json_path = os.path.join(tmp, 'mcp_requests.json')
+    ring = RequestRing(os.path.join(tmp, 'mcp_requests.ring'))
+    record = lambda: {'timestamp': datetime.now().isoformat(), 'tool': 'control_device',
+                      'args': "{'command': 'turn on lights'}", 'result': 'OK: turn on lights (ID:cmd_1)'}
+
+    print(f"Appending at {RATE} req/s for {seconds:g}s")
+    paced("json rewrite", lambda: legacy_log_request(json_path, 'control_device',
+                                                     {'command': 'turn on lights'}, 'OK'), seconds)
+    paced("mmap ring", lambda: ring.append(record()), seconds)
+    check_workers(workers)
+
+if __name__ == "__main__":
+    main()
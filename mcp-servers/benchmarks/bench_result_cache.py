@@ -0,0 +1,194 @@
+"""
+Benchmark - repeated read-only browser queries, with and without the result cache
+
+Usage:
+    python bench_result_cache.py [calls] [access_ids]
+
+The local bridge (local-bridge/bridge_server.py) runs in its own process;
+simulated extensions poll it and spend AGENT_MS on every command (the
+agent run) before posting a result. `calls` voice requests (default 200,
+from `access_ids` users, default 5, each waiting for its answer before the
+next) are mostly status queries in a few phrasings, with an occasional
+command that changes state. They run through
+tools.execute_browser_command_impl twice: no rules, then RULES.
+
+Reports latency p50 / p99, hit rate and agent runs. Then checks that a
+hit carries its age, that a hit costs no bridge request, that an answer
+is refetched once its ttl is over, that a write and invalidate() drop
+answers, that the LRU bound holds, and that failures and queued replies
+are never cached.
+"""
+
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+PORT = 8923
+URL = f"http://127.0.0.1:{PORT}"
+TMP = tempfile.mkdtemp()
+os.environ['CLOUD_BRIDGE_URLS'] = URL
+os.environ['MCP_API_KEY'] = 'bench'
+os.environ['OUTBOX_DB'] = os.path.join(TMP, 'outbox.db')
+os.environ['REQUESTS_RING'] = os.path.join(TMP, 'requests.ring')
+os.environ['BRIDGE_WARMUP_INTERVAL'] = '0'
+os.environ['MCP_AWAIT_TIMEOUT'] = '30'
+
+import httpx
+
+import bridge_client
+import tools
+from result_cache import ResultCache, Rule
+from result_stream import RESULTS
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+ACCESS_IDS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+AGENT_MS = 300
+
+RULES = [Rule(pattern=r"^(check|read) (my )?(email|inbox)", ttl=120), Rule(pattern=r"rankify rank", ttl=600)]
+QUERIES = ["check my email", "Check my email!", "read my inbox", "what's my Rankify rank?",
+           "what is my rankify rank", "check email"]
+WRITES = ["mark all emails as read", "open rankify and claim the daily bonus"]
+
+RUNS = {'agent': 0, 'executes': 0}  # commands the extensions ran, /api/execute calls seen by the bridge
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def p(samples, pct):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * pct / 100), len(samples) - 1)] * 1000
+
+
+def start_bridge():
+    env = {**os.environ, 'LOCAL_BRIDGE_DB': os.path.join(TMP, 'bridge.db'), 'LOCAL_BRIDGE_PORT': str(PORT),
+           'LOCAL_BRIDGE_AUTO_REGISTER': 'true'}
+    proc = subprocess.Popen([sys.executable, 'bridge_server.py'], cwd=os.path.join(HERE, '..', 'local-bridge'),
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{URL}/api/ping", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    sys.exit("local bridge did not start")
+
+
+async def extension(client, access_id, stop):
+    """Poll for commands, run the 'agent' for AGENT_MS, post the result"""
+    while not stop.is_set():
+        command = (await client.get("/api/poll", params={"accessId": access_id})).json()
+        if not command.get('hasCommand'):
+            await asyncio.sleep(0.02)
+            continue
+        await asyncio.sleep(AGENT_MS / 1000)
+        RUNS['agent'] += 1
+        failed = 'broken' in command['command']
+        await client.post("/api/result", json={
+            "commandId": command['commandId'], "accessId": access_id, "status": "failed" if failed else "completed",
+            "result": f"run {RUNS['agent']}: {command['command']}"})
+
+
+async def call(access_id, command, wait=None):
+    tools.bridge_access_id.set(access_id)
+    return await tools.execute_browser_command_impl(command, wait=wait)
+
+
+async def counted_post(payload, _post=bridge_client.post_execute):
+    RUNS['executes'] += 1
+    return await _post(payload)
+
+
+async def user(access_id, count, seed, latencies):
+    rng = random.Random(seed)
+    for _ in range(count):
+        command = rng.choice(WRITES) if rng.random() < 0.05 else rng.choice(QUERIES)
+        started = time.perf_counter()
+        answer = await call(access_id, command, wait=True)
+        latencies.append(time.perf_counter() - started)
+        assert answer.startswith('OK') and '->' in answer, answer
+
+
+async def run(label, rules):
+    tools.RESULT_CACHE = cache = ResultCache(rules=rules)
+    runs = RUNS['agent']
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(user(f"ext{n}", CALLS // ACCESS_IDS, n, latencies) for n in range(ACCESS_IDS)))
+    elapsed = time.perf_counter() - started
+    runs = RUNS['agent'] - runs
+    hits = cache.stats['hits']
+    print(f"  {label:<10} p50 {p(latencies, 50):7.2f}ms  p99 {p(latencies, 99):7.2f}ms  {elapsed:5.1f}s  "
+          f"{hits / len(latencies):4.0%} hits  {runs} agent runs for {len(latencies)} calls")
+    return latencies, runs
+
+
+async def main():
+    proc = start_bridge()
+    stop = asyncio.Event()
+    bridge_client.post_execute = counted_post  # tools calls it through the module
+    async with httpx.AsyncClient(base_url=URL, timeout=30) as client:
+        names = [f"ext{n}" for n in range(ACCESS_IDS)] + ['check']
+        extensions = [asyncio.create_task(extension(client, name, stop)) for name in names]
+        await bridge_client.start(warm=False)
+        tools.OUTBOX.ensure_draining()
+        await call('check', 'warm up', wait=True)
+
+        print(f"{CALLS} voice calls from {ACCESS_IDS} users, {AGENT_MS}ms per agent run, ~5% state changes\n")
+        uncached, runs_uncached = await run('no cache', [])
+        cached, runs_cached = await run('cache', RULES)
+        print()
+        check("cached runs are faster at the median", p(cached, 50) < p(uncached, 50) / 10)
+        check(f"the cache saves agent runs ({runs_uncached} -> {runs_cached})", runs_cached < runs_uncached / 2)
+
+        tools.RESULT_CACHE = cache = ResultCache(rules=[Rule(pattern=r"^check", ttl=1.0)], max_entries=3)
+        first = await call('check', 'check my email')
+        executes = RUNS['executes']
+        started = time.perf_counter()
+        again = await call('check', '  Check my EMAIL ')
+        hit_ms = (time.perf_counter() - started) * 1000
+        check(f"a repeat is answered in {hit_ms:.2f}ms with its age", again == f"{first} [cached 0s ago]")
+        check("a hit sends nothing to the bridge", RUNS['executes'] == executes)
+        await asyncio.sleep(1.1)
+        check("an answer older than its ttl is fetched again", '[cached' not in await call('check', 'check my email'))
+
+        await call('check', 'archive the newsletter')
+        check("a command matching no rule drops its accessId's answers", len(cache) == 0)
+        await call('check', 'check my email')
+        await call('check', 'check rankify')
+        check("invalidate() drops the answers matching a pattern",
+              cache.invalidate(pattern='rankify') == 1 and len(cache) == 1)
+        for n in range(5):
+            await call('check', f'check item {n}')
+        check("the cache holds at most max_entries answers", len(cache) == 3)
+
+        cache.invalidate()
+        await call('check', 'check the broken page')
+        check("a failed answer is not cached", len(cache) == 0)
+        tools.MCP_AWAIT_TIMEOUT = 0.5
+        reply = await call('nobody-polls', 'check my email')
+        check("a queued reply without an answer is not cached", 'still running' in reply and len(cache) == 0)
+
+        stop.set()
+        await asyncio.gather(*extensions, return_exceptions=True)
+        await tools.OUTBOX.stop()
+        await RESULTS.stop()
+        await bridge_client.stop()
+    proc.terminate()
+    proc.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
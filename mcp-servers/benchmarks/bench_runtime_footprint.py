@@ -0,0 +1,93 @@
+"""
+Benchmark - two single-tool Spaces vs one multi-tool runtime
+
+Usage:
+    python bench_runtime_footprint.py
+
+"separate" starts what two Spaces run today: an mcp_server.py per tool
+set plus a tuya_client.py each. "combined" starts one mcp_server.py with
+MCP_TOOLSETS=browser,device and the Tuya client embedded. We report the
+time until every server answers /health and the summed resident memory.
+The Streamlit dashboards are left out; combined needs one instead of two.
+Without tuya-mcp-sdk installed the Tuya clients idle in their retry loop.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPACE = os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation')
+
+import stub_bridge
+
+def rss_kb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def spawn(script, port, **env):
+    tmp = tempfile.mkdtemp()
+    full_env = {
+        **os.environ,
+        'CLOUD_BRIDGE_URL': "http://127.0.0.1:8899",
+        'MCP_PORT': str(port),
+        'MCP_SERVER_URL': f"http://localhost:{port}/mcp",
+        'REQUESTS_RING': os.path.join(tmp, 'requests.ring'),
+        **env
+    }
+    return subprocess.Popen([sys.executable, script], cwd=SPACE, env=full_env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_healthy(ports, timeout=30):
+    deadline = time.time() + timeout
+    pending = set(ports)
+    while pending and time.time() < deadline:
+        for port in list(pending):
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=0.5).status_code == 200:
+                    pending.discard(port)
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.02)
+    return not pending
+
+def measure(name, layout):
+    started = time.perf_counter()
+    procs = [spawn(script, port, **env) for script, port, env in layout]
+    ports = sorted({port for script, port, env in layout if script == 'mcp_server.py'})
+    healthy = wait_healthy(ports)
+    startup = time.perf_counter() - started
+    time.sleep(1)
+    rss = sum(rss_kb(p.pid) for p in procs if p.poll() is None)
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        p.wait()
+    status = "" if healthy else "  (server not healthy!)"
+    print(f"{name:<10} {len(procs)} processes   startup {startup * 1000:7.0f}ms   RSS {rss / 1024:7.1f}MB{status}")
+    return rss, startup
+
+def main():
+    stub_bridge.serve_in_thread(port=8899)
+    separate = [
+        ('mcp_server.py', 8861, {'MCP_TOOLSETS': 'browser', 'MCP_EMBED_TUYA': 'false'}),
+        ('tuya_client.py', 8861, {'MCP_TOOLSETS': 'browser'}),
+        ('mcp_server.py', 8862, {'MCP_TOOLSETS': 'device', 'MCP_EMBED_TUYA': 'false'}),
+        ('tuya_client.py', 8862, {'MCP_TOOLSETS': 'device'}),
+    ]
+    combined = [
+        ('mcp_server.py', 8863, {'MCP_TOOLSETS': 'browser,device', 'MCP_EMBED_TUYA': 'true'}),
+    ]
+    rss_a, start_a = measure("separate", separate)
+    rss_b, start_b = measure("combined", combined)
+    print(f"combined uses {rss_b / rss_a * 100:.0f}% of the memory, starts in {start_b / start_a * 100:.0f}% of the time")
+
+if __name__ == "__main__":
+    main()
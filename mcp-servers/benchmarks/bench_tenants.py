@@ -0,0 +1,179 @@
+"""
+Benchmark - many Tuya tenants in one event loop
+
+Usage:
+    python bench_tenants.py [tenants] [seconds]
+
+Builds TUYA_TENANTS with N tenants (alternating browser / device tool
+sets), starts the Space's mcp_server.py on 127.0.0.1:8872 against the
+stub bridge, and runs a TuyaLink per tenant against fake_gateway.py with
+a 1s heartbeat. Checks routing first - each /mcp/<tenant> advertises its
+own tools and queues commands under its own accessId - then reports the
+time to connect everyone, memory per tenant and event-loop lag while
+every heartbeat runs.
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', 'browser-automation'))
+
+TENANT_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+TMP = tempfile.mkdtemp()
+
+os.environ['TUYA_TENANTS'] = json.dumps([
+    {"name": f"t{i}", "endpoint": "tcp://127.0.0.1:8871", "access_id": f"id-{i}", "access_secret": "secret",
+     "toolsets": "browser" if i % 2 == 0 else "device", "bridge_access_id": f"user-t{i}"}
+    for i in range(TENANT_COUNT)
+])
+os.environ['TUYA_STATUS_SHM'] = os.path.join(TMP, 'tuya_status.shm')
+os.environ['REQUESTS_RING'] = os.path.join(TMP, 'requests.ring')
+os.environ['OUTBOX_DB'] = os.path.join(TMP, 'outbox.db')
+os.environ['MCP_API_KEY'] = 'bench'
+os.environ['CLOUD_BRIDGE_URL'] = "http://127.0.0.1:8899"
+os.environ['MCP_EMBED_TUYA'] = 'false'
+os.environ['TUYA_HEARTBEAT_INTERVAL'] = '1'
+os.environ['TUYA_HEARTBEAT_TIMEOUT'] = '1'
+os.environ['TUYA_CONNECT_SPREAD'] = '1'
+
+import httpx
+import uvicorn
+import mcp_server
+import stub_bridge
+import tenants
+import tuya_client
+from fake_gateway import FakeGateway, FakeSdkClient
+
+MCP_URL = "http://127.0.0.1:8872/mcp"
+
+
+class FakeLink(tuya_client.TuyaLink):
+    """A real TuyaLink whose session talks to the fake gateway instead of the SDK"""
+
+    __slots__ = ()
+
+    async def connect_and_listen(self):
+        client = FakeSdkClient()
+        probe = tuya_client.sdk_probe(client)
+        await self.run_session(client.connect, client.start_listening, probe, client.close)
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def rpc(client, path, method, params=None):
+    response = client.post(MCP_URL + path, json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}})
+    return response.status_code, response.json()
+
+
+def check_routing():
+    with httpx.Client(timeout=10) as client:
+        _, listed = rpc(client, '/t0', 'tools/list')
+        names = {tool['name'] for tool in listed['result']['tools']}
+        check("/mcp/t0 lists the browser tool set", names == {'execute_browser_command', 'health_check'})
+        _, listed = rpc(client, '/t1', 'tools/list')
+        names = {tool['name'] for tool in listed['result']['tools']}
+        check("/mcp/t1 lists the device tool set", names == {'control_device', 'health_check'})
+
+        _, called = rpc(client, '/t0', 'tools/call', {"name": "control_device", "arguments": {"command": "x"}})
+        check("a tenant cannot call another tool set's tools", 'error' in called)
+        rpc(client, '/t0', 'tools/call', {"name": "execute_browser_command", "arguments": {"command": "open a"}})
+        rpc(client, '/t1', 'tools/call', {"name": "control_device", "arguments": {"command": "lights on"}})
+        time.sleep(0.5)  # the outbox delivers in the background
+        access_ids = client.get("http://127.0.0.1:8899/stub/stats").json()['access_ids']
+        check("commands reach the bridge under each tenant's accessId",
+              access_ids.get('user-t0') == 1 and access_ids.get('user-t1') == 1)
+
+        status, _ = rpc(client, '/nope', 'tools/list')
+        check("unknown tenant -> 404", status == 404)
+
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+async def run_links(seconds):
+    gateway = FakeGateway()
+    await gateway.start()
+    loop = asyncio.get_running_loop()
+    tracemalloc.start()
+    rss_before = rss_kb()
+    heap_before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+
+    configured = tenants.load()
+    links = [FakeLink(tenant) for tenant in configured.values()]
+    tasks = [asyncio.create_task(link.supervised(tuya_client.CONNECT_SPREAD * i / len(links)))
+             for i, link in enumerate(links)]
+    while sum(link.status.state['connected'] for link in links) < len(links):
+        await asyncio.sleep(0.05)
+    connected_after = time.perf_counter() - started
+
+    # Steady state: every link heartbeats once a second
+    lags = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        expected = loop.time() + 0.05
+        await asyncio.sleep(0.05)
+        lags.append(max(loop.time() - expected, 0) * 1000)
+
+    heap_after = tracemalloc.take_snapshot()
+    rss_after = rss_kb()
+    tracemalloc.stop()
+    per_file = {}
+    for stat in heap_after.compare_to(heap_before, 'filename'):
+        per_file[os.path.basename(stat.traceback[0].filename)] = stat.size_diff
+    ours = sum(per_file.get(name, 0) for name in ('tuya_client.py', 'reconnect.py', 'link_status.py', 'tenants.py'))
+    total = sum(per_file.values())
+    beats = sum(1 for link in links if link.status.state['rtt_ms'] is not None)
+    drops = sum(link.status.state['reconnects'] for link in links)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await gateway.stop()
+    return connected_after, lags, ours, total, rss_after - rss_before, beats, drops
+
+
+def main():
+    stub_bridge.serve_in_thread()
+    server = uvicorn.Server(uvicorn.Config(mcp_server.app, host="127.0.0.1", port=8872, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    check_routing()
+
+    print(f"\n{TENANT_COUNT} tenants, 1s heartbeat, connects spread over {tuya_client.CONNECT_SPREAD:g}s")
+    connected_after, lags, ours, total, rss, beats, drops = asyncio.run(run_links(SECONDS))
+    lags.sort()
+    print(f"all connected after      {connected_after:8.2f}s")
+    print(f"heartbeats answered      {beats:8d} / {TENANT_COUNT} links, {drops} drops")
+    print(f"link objects (heap)      {ours / TENANT_COUNT / 1024:8.2f} KB per tenant  "
+          f"(TuyaLink, status segment, backoff, circuit)")
+    print(f"all Python heap          {total / TENANT_COUNT / 1024:8.2f} KB per tenant  "
+          f"(+ tasks and both ends of the fake socket)")
+    print(f"process RSS              {rss / TENANT_COUNT:8.2f} KB per tenant")
+    print(f"loop lag over {SECONDS:g}s      p50 {statistics.median(lags):6.2f}ms  "
+          f"p99 {lags[int(len(lags) * 0.99) - 1]:6.2f}ms  max {lags[-1]:6.2f}ms")
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
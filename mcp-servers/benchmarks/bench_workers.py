@@ -0,0 +1,67 @@
+"""
+Benchmark - mcp_server.py throughput by uvicorn worker count
+
+Usage:
+    python bench_workers.py [workers...] [--duration 10] [--concurrency 64]
+
+Runs load_test.py against the hf-browser server once per worker count
+(default 1 2 4 8, via MCP_WORKERS), with the client load split over as
+many processes as there are workers, and prints RPS, p99 and server CPU
+/ RSS (summed over the workers) side by side. Each run gets its own
+SharedState database and metrics directory. Throughput can only scale up
+to the number of CPUs - the count is printed with the table - and the
+stub bridge and clients share those CPUs too.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(workers, args, tmp):
+    output = os.path.join(tmp, f"workers-{workers}.json")
+    command = [
+        sys.executable, 'load_test.py', '--server', 'hf-browser',
+        '--concurrency', str(args.concurrency), '--duration', str(args.duration),
+        '--latency-ms', str(args.latency_ms), '--client-processes', str(min(workers, args.max_clients)),
+        '--server-env', f"MCP_WORKERS={workers}",
+        '--server-env', f"MCP_SHARED_DB={os.path.join(tmp, f'shared-{workers}.db')}",
+        '--server-env', f"METRICS_DIR={os.path.join(tmp, f'metrics-{workers}')}",
+        '--output', output,
+    ]
+    subprocess.run(command, cwd=HERE, check=True, stdout=subprocess.DEVNULL)
+    with open(output) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('workers', nargs='*', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency-ms', type=float, default=5, help="stub bridge latency (default 5)")
+    parser.add_argument('--max-clients', type=int, default=4, help="most client processes (default 4)")
+    args = parser.parse_args()
+    tmp = tempfile.mkdtemp(prefix='mcp-workers-')
+
+    print(f"{os.cpu_count()} CPU(s), concurrency {args.concurrency}, {args.duration:g}s per run\n")
+    print(f"{'workers':>7}  {'rps':>9}  {'p50 ms':>8}  {'p99 ms':>8}  {'errors':>6}  "
+          f"{'server CPU':>10}  {'RSS MB':>7}  {'scaling':>7}")
+    baseline = None
+    for workers in args.workers:
+        result = run(workers, args, tmp)
+        overall, server = result['overall'], result['server']
+        baseline = baseline or overall['rps']
+        errors = sum(overall['errors'].values())
+        print(f"{workers:>7}  {overall['rps']:>9.1f}  {overall['p50_ms']:>8.2f}  {overall['p99_ms']:>8.2f}  "
+              f"{errors:>6}  {server['cpu_percent']:>9.0f}%  {server['rss_mb_peak']:>7.1f}  "
+              f"{overall['rps'] / baseline:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
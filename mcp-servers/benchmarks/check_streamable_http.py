@@ -0,0 +1,105 @@
+"""
+Check - Streamable HTTP transport on the hand-rolled /mcp endpoint
+
+Usage:
+    python check_streamable_http.py [browser-automation|device-controller]
+
+Runs the Space's mcp_server.py on 127.0.0.1:8860 against the stub bridge
+and drives it with a small local SSE client: session reuse, a streamed
+tools/call with progress notifications, a GET stream receiving a
+server-initiated message, and session termination.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPACE = sys.argv[1] if len(sys.argv) > 1 else 'browser-automation'
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', SPACE))
+
+os.environ.setdefault('CLOUD_BRIDGE_URL', "http://127.0.0.1:8899")
+os.environ.setdefault('REQUESTS_RING', '/tmp/check_streamable_http.ring')
+os.environ.setdefault('OUTBOX_DB', '/tmp/check_streamable_http.outbox.db')
+os.environ.setdefault('MCP_API_KEY', 'check')
+os.environ.setdefault('TUYA_STATUS_SHM', '/tmp/check_streamable_http.shm')
+os.environ.setdefault('MCP_TOOLSETS', 'browser' if SPACE == 'browser-automation' else 'device')
+
+import httpx
+import uvicorn
+import stub_bridge
+import mcp_server
+
+MCP_URL = "http://127.0.0.1:8860/mcp"
+TOOL = 'execute_browser_command' if SPACE == 'browser-automation' else 'control_device'
+SSE_ACCEPT = {"Accept": "application/json, text/event-stream"}
+
+async def sse_messages(response):
+    """Minimal SSE client: yields the JSON payload of each 'message' event"""
+    data = []
+    async for line in response.aiter_lines():
+        if line.startswith('data:'):
+            data.append(line[5:].strip())
+        elif line == '' and data:
+            yield json.loads('\n'.join(data))
+            data = []
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+async def main():
+    async with httpx.AsyncClient(timeout=10) as client:
+        init = await client.post(MCP_URL, json={"jsonrpc": "2.0", "id": 1, "method": "initialize"})
+        session_id = init.headers.get('mcp-session-id')
+        check("initialize returns Mcp-Session-Id", bool(session_id))
+        headers = {"Mcp-Session-Id": session_id}
+
+        listed = await client.post(MCP_URL, headers=headers, json={"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        check("session is reused for tools/list", listed.headers.get('mcp-session-id') == session_id)
+
+        call = {"jsonrpc": "2.0", "id": 3, "method": "tools/call",
+                "params": {"name": TOOL, "arguments": {"command": "turn on lights"}, "_meta": {"progressToken": "p1"}}}
+        events = []
+        async with client.stream("POST", MCP_URL, headers={**headers, **SSE_ACCEPT}, json=call) as response:
+            check("tools/call answers with text/event-stream",
+                  response.headers['content-type'].startswith('text/event-stream'))
+            async for message in sse_messages(response):
+                events.append(message)
+        progress = [e for e in events if e.get('method') == 'notifications/progress']
+        check("progress notifications streamed before the result",
+              len(progress) >= 2 and events[-1].get('id') == 3 and 'result' in events[-1])
+
+        received = asyncio.get_running_loop().create_future()
+
+        async def listen():
+            async with client.stream("GET", MCP_URL, headers={**headers, "Accept": "text/event-stream"}) as response:
+                async for message in sse_messages(response):
+                    received.set_result(message)
+                    return
+
+        listener = asyncio.create_task(listen())
+        for _ in range(50):
+            if mcp_server.sessions.get(session_id).send({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"}):
+                break
+            await asyncio.sleep(0.05)
+        message = await asyncio.wait_for(received, 5)
+        check("GET stream receives server-initiated messages", message['method'] == 'notifications/tools/list_changed')
+        await listener
+
+        closed = await client.delete(MCP_URL, headers=headers)
+        after = await client.post(MCP_URL, headers=headers, json={"jsonrpc": "2.0", "id": 4, "method": "tools/list"})
+        check("DELETE ends the session (then 404)", closed.status_code == 204 and after.status_code == 404)
+
+if __name__ == "__main__":
+    stub_bridge.serve_in_thread(port=8899)
+    server = uvicorn.Server(uvicorn.Config(mcp_server.app, host="127.0.0.1", port=8860, log_level="error"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    asyncio.run(main())
+    server.should_exit = True
@@ -0,0 +1,169 @@
+"""
+Check - Tuya heartbeat, half-open detection and jittered reconnects
+
+Usage:
+    python check_tuya_heartbeat.py [browser-automation|device-controller]
+
+Runs a TuyaLink's reconnect loop against fake_gateway.py (a TCP line
+protocol: PING n -> PONG n) instead of the Tuya cloud. The gateway
+can silently drop every packet while keeping the socket open - a
+half-open link - or refuse connections altogether. Checks that missed
+heartbeats (pings through the session) force a reconnect, that the circuit opens and half-opens,
+that mcp_server exports RTT / time-to-reconnect metrics, that a client
+without ping() falls back to an HTTP request to the gateway, and that
+retry delays are jittered instead of lockstep 2**n.
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPACE = sys.argv[1] if len(sys.argv) > 1 else 'browser-automation'
+sys.path.insert(0, os.path.join(HERE, '..', 'hugging-face-space', SPACE))
+
+os.environ.setdefault('CLOUD_BRIDGE_URL', "http://127.0.0.1:8899")
+os.environ.setdefault('REQUESTS_RING', '/tmp/check_tuya_heartbeat.ring')
+os.environ['TUYA_STATUS_SHM'] = '/tmp/check_tuya_heartbeat.shm'
+os.environ['TUYA_HEARTBEAT_INTERVAL'] = '0.2'
+os.environ['TUYA_HEARTBEAT_TIMEOUT'] = '0.2'
+os.environ['TUYA_HEARTBEAT_MAX_MISSES'] = '2'
+os.environ['TUYA_BACKOFF_BASE'] = '0.05'
+os.environ['TUYA_BACKOFF_CAP'] = '0.5'
+os.environ['TUYA_CIRCUIT_THRESHOLD'] = '3'
+
+import metrics
+import mcp_server
+import reconnect
+import tenants
+import tuya_client
+from fake_gateway import HOST, PORT, FakeGateway, FakeSdkClient
+
+link = None
+
+
+async def session():
+    client = FakeSdkClient()
+    probe = tuya_client.sdk_probe(client)
+    await link.run_session(client.connect, client.start_listening, probe, client.close)
+
+
+def check(label, ok):
+    print(f"{'PASS' if ok else 'FAIL'}  {label}")
+    if not ok:
+        sys.exit(1)
+
+
+def sample(exported, prefix):
+    """Value of the first exported series starting with `prefix`"""
+    for line in exported.splitlines():
+        if line.startswith(prefix) and line[len(prefix)] in ' {,}':
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+async def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate(link.status.state):
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+
+async def main():
+    global link
+    gateway = FakeGateway()
+    await gateway.start()
+    link = tuya_client.TuyaLink(tenants.Tenant())
+    circuits = []
+    link.status.subscribe(lambda state: circuits.append(state['circuit']))
+    watcher = asyncio.create_task(mcp_server.watch_tuya_link())
+    client = asyncio.create_task(link.run(session))
+
+    check("connects and records heartbeat RTT",
+          await wait_for(lambda s: s['connected'] and s['rtt_ms'] is not None, 2))
+    print(f"      rtt {link.status.state['rtt_ms']}ms")
+
+    # Half-open: the socket stays up but nothing comes back
+    gateway.drop = True
+    dropped = time.monotonic()
+    check("dropped packets are detected as a half-open link",
+          await wait_for(lambda s: not s['connected'] and 'heartbeats missed' in (s['last_error'] or ''), 3))
+    detected = time.monotonic() - dropped
+    budget = tuya_client.HEARTBEAT_MAX_MISSES * (tuya_client.HEARTBEAT_INTERVAL + tuya_client.HEARTBEAT_TIMEOUT)
+    print(f"      detected after {detected:.2f}s (budget {budget:.2f}s), "
+          f"{link.status.state['heartbeat_misses']} beats missed")
+    check("detection within interval + timeout per allowed miss", detected <= budget + 0.3)
+
+    gateway.drop = False
+    check("reconnects and records time-to-reconnect",
+          await wait_for(lambda s: s['connected'] and s['connects'] == 1 and s['last_reconnect_seconds'], 3))
+    print(f"      reconnected after {link.status.state['last_reconnect_seconds']:.2f}s, "
+          f"{gateway.connections} gateway connections")
+
+    # Gateway down: failures in a row open the circuit, retries half-open it
+    await gateway.stop()
+    check("circuit opens after repeated failures",
+          await wait_for(lambda s: s['circuit'] == 'open', 5))
+    check("open circuit is retried in half_open", await wait_for(lambda s: 'half_open' in circuits, 3))
+    await gateway.start()
+    check("circuit closes once the gateway is back",
+          await wait_for(lambda s: s['connected'] and s['circuit'] == 'closed', 3))
+
+    await asyncio.sleep(0.2)
+    exported = metrics.render().decode()
+    check("metrics export heartbeat RTT", sample(exported, 'tuya_heartbeat_rtt_seconds_count') >= 1)
+    check("metrics export time-to-reconnect", sample(exported, 'tuya_reconnect_duration_seconds_count') == 2)
+    check("metrics export missed heartbeats", sample(exported, 'tuya_heartbeat_misses_total') >= 2)
+    check("metrics export the circuit state", sample(exported, 'tuya_circuit_state{tenant="default",state="closed"') == 1)
+
+    await check_http_fallback()
+
+    for task in (client, watcher):
+        task.cancel()
+    await asyncio.gather(client, watcher, return_exceptions=True)
+    await gateway.stop()
+
+
+async def check_http_fallback():
+    """A client without ping(): the probe is a request to the gateway endpoint"""
+    async def answer(reader, writer):
+        await reader.readuntil(b'\r\n\r\n')
+        writer.write(b'HTTP/1.1 404 Not Found\r\ncontent-length: 0\r\n\r\n')
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(answer, HOST, 0)
+    port = server.sockets[0].getsockname()[1]
+    probe = tuya_client.sdk_probe(object(), f"http://{HOST}:{port}")
+    await probe()  # any answer counts
+    server.close()
+    await server.wait_closed()
+    try:
+        await probe()
+        refused = False
+    except ConnectionError:
+        refused = True
+    check("a client without ping() probes the gateway over HTTP (a refused connection is a miss)",
+          refused and tuya_client.sdk_probe(object()) is None)
+
+
+def check_jitter(spaces=50, attempts=6):
+    """First retry delays of `spaces` Spaces that lost the link at the same moment"""
+    lockstep = {tuple(min(2 ** min(n, 6), 60) for n in range(1, attempts + 1)) for _ in range(spaces)}
+    schedules = []
+    for seed in range(spaces):
+        backoff = reconnect.DecorrelatedBackoff(1, 60, random.Random(seed))
+        schedules.append(tuple(backoff.next() for _ in range(attempts)))
+    print(f"      {spaces} Spaces: 2**n gives {len(lockstep)} distinct schedule, "
+          f"jitter gives {len({round(s[0], 3) for s in schedules})} distinct first delays")
+    check("retry delays are jittered across Spaces", len({round(s[0], 3) for s in schedules}) > spaces * 0.9)
+    check("retry delays stay within base..cap", all(1 <= d <= 60 for s in schedules for d in s))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    check_jitter()
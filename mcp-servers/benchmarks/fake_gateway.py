@@ -0,0 +1,81 @@
+"""
+Fake Tuya Gateway - Local stand-in for the Tuya cloud connection
+Used by the Tuya client checks and benchmarks
+
+A TCP line protocol: the client sends "PING n", the gateway answers
+"PONG n". drop=True swallows every packet but keeps the sockets open (a
+half-open link); stop() refuses new connections and resets open ones.
+FakeSdkClient has just the MCPSdkClient surface tuya_client uses.
+"""
+
+import asyncio
+
+HOST = '127.0.0.1'
+PORT = 8871
+
+
+class FakeGateway:
+    """PING n -> PONG n; drop=True swallows everything but keeps sockets open"""
+
+    def __init__(self, port=PORT):
+        self.port = port
+        self.drop = False
+        self.server = None
+        self.writers = set()
+        self.connections = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, HOST, self.port, backlog=1024)
+
+    async def stop(self):
+        """Refuse new connections and reset the open ones"""
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.writers):
+            writer.close()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.writers.add(writer)
+        try:
+            while line := await reader.readline():
+                if line.startswith(b'PING') and not self.drop:
+                    writer.write(b'PONG' + line[4:])
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+
+class FakeSdkClient:
+    """Just enough of the SDK client: connect, start_listening, ping, close"""
+
+    def __init__(self, port=PORT):
+        self.port = port
+        self.reader = self.writer = None
+        self.pongs = {}
+        self.count = 0
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(HOST, self.port)
+
+    async def start_listening(self):
+        while line := await self.reader.readline():
+            _, _, n = line.decode().strip().partition(' ')
+            waiter = self.pongs.pop(n, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+    async def ping(self):
+        """websockets-style: send the ping, return a future for the pong"""
+        self.count += 1
+        waiter = self.pongs[str(self.count)] = asyncio.get_running_loop().create_future()
+        self.writer.write(f"PING {self.count}\n".encode())
+        await self.writer.drain()
+        return waiter
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
@@ -0,0 +1,517 @@
+"""
+Load test - End-to-end MCP traffic against a real server process
+
+Usage:
+    python load_test.py [--server hf-browser] [--concurrency 20 | --rate 200]
+                        [--duration 10] [--client-processes 4] [--latency-ms 20 --jitter-ms 5 --error-rate 0.01]
+                        [--output results/run.json] [--compare results/baseline.json]
+
+Starts the stub Cloud Bridge and one MCP server in their own processes:
+    hf-browser / hf-device / hf-combined   hugging-face-space mcp_server.py
+    offline-browser / offline-device       offline FastMCP server.py (needs fastmcp)
+
+then drives a weighted mix of initialize / tools/list / tools/call either
+closed-loop (--concurrency workers back-to-back) or open-loop (--rate
+requests per second, latency counted from the scheduled send time so a
+slow server can't hide its queueing). Reports RPS, p50/p95/p99 per
+method, errors by kind and the server's CPU and RSS (summed over its
+worker processes), and writes it all to a JSON file tagged with the git
+commit so runs can be compared. --client-processes splits the load over
+several client processes when one cannot keep a multi-worker server busy.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+STUB_PORT = 8899
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+SERVERS = {
+    'hf-browser': {'dir': 'hugging-face-space/browser-automation', 'script': 'mcp_server.py', 'port': 8870,
+                   'env': {'MCP_TOOLSETS': 'browser'}, 'tools': ['execute_browser_command']},
+    'hf-device': {'dir': 'hugging-face-space/device-controller', 'script': 'mcp_server.py', 'port': 8870,
+                  'env': {'MCP_TOOLSETS': 'device'}, 'tools': ['control_device']},
+    'hf-combined': {'dir': 'hugging-face-space/browser-automation', 'script': 'mcp_server.py', 'port': 8870,
+                    'env': {'MCP_TOOLSETS': 'browser,device'},
+                    'tools': ['execute_browser_command', 'control_device']},
+    # FastMCP servers listen on a fixed port and speak SSE only
+    'offline-browser': {'dir': 'offline/browser-automation', 'script': 'server.py', 'port': 8767,
+                        'env': {}, 'tools': ['execute_browser_command'], 'sse': True},
+    'offline-device': {'dir': 'offline/device-controller', 'script': 'server.py', 'port': 8768,
+                       'env': {}, 'tools': ['control_device_command'], 'sse': True},
+}
+
+COMMANDS = ["turn on the living room lights", "set bedroom fan to speed 2", "open google",
+            "check my email", "search for weather in Karachi", "turn off all plugs"]
+
+
+# ----------------------------------------------------------------------------
+# Processes
+# ----------------------------------------------------------------------------
+
+def git_commit():
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                             capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--', '.'], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return sha or 'unknown', dirty
+    except OSError:
+        return 'unknown', False
+
+def start_stub(args, tmp):
+    env = {**os.environ, 'STUB_PORT': str(STUB_PORT), 'STUB_LATENCY_MS': str(args.latency_ms),
+           'STUB_JITTER_MS': str(args.jitter_ms), 'STUB_ERROR_RATE': str(args.error_rate),
+           'STUB_CONCURRENCY': str(args.stub_concurrency)}
+    log = open(os.path.join(tmp, 'stub.log'), 'wb')
+    return subprocess.Popen([sys.executable, 'stub_bridge.py'], cwd=HERE, env=env, stdout=log, stderr=log)
+
+def start_server(spec, tmp, extra_env):
+    port = spec['port']
+    env = {
+        **os.environ,
+        'CLOUD_BRIDGE_URL': f"http://127.0.0.1:{STUB_PORT}",
+        'MCP_API_KEY': 'load-test',
+        'MCP_ACCESS_ID': 'load-test',
+        'TUYA_ACCESS_ID': 'load-test',
+        'MCP_PORT': str(port),
+        'MCP_EMBED_TUYA': 'false',
+        # every call shares one accessId; admission limits are measured by bench_admission.py
+        'BRIDGE_MAX_IN_FLIGHT': '0',
+        'BRIDGE_RATE_PER_ACCESS_ID': '0',
+        'REQUESTS_RING': os.path.join(tmp, 'requests.ring'),
+        'OUTBOX_DB': os.path.join(tmp, 'outbox.db'),
+        'TUYA_STATUS_SHM': os.path.join(tmp, 'tuya_status.shm'),
+        **spec['env'],
+        **extra_env,
+    }
+    log_path = os.path.join(tmp, 'server.log')
+    log = open(log_path, 'wb')
+    proc = subprocess.Popen([sys.executable, spec['script']], cwd=os.path.join(ROOT, spec['dir']),
+                            env=env, stdout=log, stderr=log)
+    return proc, log_path
+
+def wait_ready(url, timeout=30, **kwargs):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.request(url=url, timeout=0.5, **kwargs).status_code < 500:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    return False
+
+def process_tree(pid):
+    """pid and all its descendants (uvicorn workers are children of the server process)"""
+    pids = [pid]
+    for parent in pids:
+        try:
+            for task in os.listdir(f"/proc/{parent}/task"):
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+def proc_sample(pid):
+    """(cpu seconds, rss MB) for a process and its children from /proc"""
+    cpu = rss = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) / 1024
+        except OSError:
+            continue  # exited between listing and reading
+    return cpu, rss
+
+
+# ----------------------------------------------------------------------------
+# MCP client
+# ----------------------------------------------------------------------------
+
+class McpClient:
+    def __init__(self, http, url, tools, sse):
+        self.http = http
+        self.url = url
+        self.tools = tools
+        self.headers = {"Accept": "application/json, text/event-stream" if sse else "application/json"}
+        self._ids = itertools.count(1)
+        self._calls = itertools.count(1)
+
+    async def rpc(self, method, params=None, session_id=None):
+        """One request; returns (session id, JSON-RPC response)"""
+        message = {"jsonrpc": "2.0", "id": next(self._ids), "method": method}
+        if params is not None:
+            message["params"] = params
+        headers = dict(self.headers)
+        if session_id:
+            headers['Mcp-Session-Id'] = session_id
+        response = await self.http.post(self.url, json=message, headers=headers)
+        if response.status_code != 200:
+            raise HttpError(response.status_code)
+        if response.headers.get('content-type', '').startswith('text/event-stream'):
+            body = None
+            for line in response.text.splitlines():
+                if line.startswith('data:'):
+                    data = json.loads(line[5:])
+                    if data.get('id') == message['id']:
+                        body = data
+        else:
+            body = response.json()
+        return response.headers.get('mcp-session-id', session_id), body
+
+    async def open_session(self):
+        params = {"protocolVersion": "2025-06-18", "capabilities": {},
+                  "clientInfo": {"name": "load-test", "version": "1.0"}}
+        session_id, _ = await self.rpc('initialize', params)
+        headers = dict(self.headers)
+        if session_id:
+            headers['Mcp-Session-Id'] = session_id
+        await self.http.post(self.url, headers=headers,
+                             json={"jsonrpc": "2.0", "method": "notifications/initialized"})
+        return session_id
+
+    def call_params(self, unique):
+        n = next(self._calls)
+        command = random.choice(COMMANDS)
+        if unique:
+            # Distinct commands so the dedup cache doesn't answer for the bridge
+            command = f"{command} #{n}"
+        return {"name": self.tools[n % len(self.tools)], "arguments": {"command": command}}
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class Recorder:
+    def __init__(self):
+        self.recording = False
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, method, latency_ms, error=None):
+        if not self.recording:
+            return
+        self.samples.setdefault(method, []).append(latency_ms)
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+
+async def send(client, recorder, method, session_id, unique, scheduled=None):
+    started = scheduled if scheduled is not None else time.perf_counter()
+    error = None
+    try:
+        if method == 'initialize':
+            await client.open_session()
+        elif method == 'tools/call':
+            _, body = await client.rpc(method, client.call_params(unique), session_id)
+            if body is None or 'error' in body:
+                error = 'rpc_error'
+            else:
+                content = body['result'].get('content') or [{}]
+                text = content[0].get('text', '')
+                if body['result'].get('isError') or text.startswith(('ERROR', '❌')):
+                    error = 'tool_error'
+        else:
+            _, body = await client.rpc(method, None, session_id)
+            if body is None or 'error' in body:
+                error = 'rpc_error'
+    except HttpError as e:
+        error = f"http_{e.status}"
+    except (httpx.HTTPError, ValueError, KeyError) as e:
+        error = type(e).__name__
+    recorder.add(method, (time.perf_counter() - started) * 1000, error)
+
+
+def pick_method(mix):
+    return random.choices(list(mix), weights=list(mix.values()))[0]
+
+
+async def closed_loop(client, recorder, args, mix, sessions, stop_at):
+    async def worker(session_id):
+        while time.perf_counter() < stop_at:
+            await send(client, recorder, pick_method(mix), session_id, not args.repeat_commands)
+
+    await asyncio.gather(*(worker(s) for s in sessions))
+
+
+async def open_loop(client, recorder, args, mix, sessions, stop_at):
+    interval = 1 / args.rate
+    pending = set()
+    next_at = time.perf_counter()
+    for i in itertools.count():
+        if next_at >= stop_at:
+            break
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(client, recorder, pick_method(mix), sessions[i % len(sessions)],
+                                        not args.repeat_commands, scheduled=next_at))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        next_at += interval
+    if pending:
+        await asyncio.wait(pending)
+
+
+# ----------------------------------------------------------------------------
+# Report
+# ----------------------------------------------------------------------------
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return None
+    index = max(int(round(pct / 100 * len(sorted_samples))) - 1, 0)
+    return round(sorted_samples[index], 3)
+
+def summarize(samples, seconds):
+    samples = sorted(samples)
+    return {
+        'requests': len(samples),
+        'rps': round(len(samples) / seconds, 1),
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'max_ms': round(samples[-1], 3) if samples else None,
+    }
+
+def print_report(result):
+    meta = result['meta']
+    load = f"{meta['concurrency']} workers" if meta['mode'] == 'closed' else f"{meta['rate']} req/s"
+    print(f"\n{meta['server']} @ {meta['commit']}{' (dirty)' if meta['dirty'] else ''}  "
+          f"{load}, {meta['duration']:g}s, stub {meta['stub']}")
+    rows = [('overall', result['overall'])] + list(result['by_method'].items())
+    for name, row in rows:
+        print(f"  {name:<11} {row['requests']:7d} req  {row['rps']:8.1f} rps   "
+              f"p50 {row['p50_ms'] or 0:7.2f}ms  p95 {row['p95_ms'] or 0:7.2f}ms  p99 {row['p99_ms'] or 0:7.2f}ms")
+    errors = result['overall']['errors']
+    print(f"  errors      {sum(errors.values())} {errors if errors else ''}")
+    server = result['server']
+    print(f"  server      CPU {server['cpu_seconds']:.2f}s ({server['cpu_percent']:.0f}% of a core)   "
+          f"RSS peak {server['rss_mb_peak']:.1f}MB")
+    client = result['client']
+    if client['cpu_percent'] / client.get('processes', 1) > 90:
+        print(f"  client      CPU {client['cpu_percent']:.0f}% of a core - the load generator is the "
+              f"bottleneck ({client['cpus']} CPU(s)), numbers are a lower bound")
+    if result.get('bridge'):
+        bridge = result['bridge']
+        print(f"  bridge      {bridge['execute']} /api/execute, {bridge['batches']} batches, "
+              f"{bridge['commands']} commands")
+
+def print_compare(result, baseline):
+    print(f"\nvs {baseline['meta']['commit']} ({baseline['meta']['timestamp']})")
+    pairs = [('rps', result['overall']['rps'], baseline['overall']['rps'])]
+    for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+        pairs.append((key, result['overall'][key], baseline['overall'][key]))
+    pairs.append(('errors', sum(result['overall']['errors'].values()),
+                  sum(baseline['overall']['errors'].values())))
+    pairs.append(('cpu_percent', result['server']['cpu_percent'], baseline['server']['cpu_percent']))
+    pairs.append(('rss_mb_peak', result['server']['rss_mb_peak'], baseline['server']['rss_mb_peak']))
+    for key, new, old in pairs:
+        change = f"{(new - old) / old * 100:+6.1f}%" if old else "   n/a"
+        print(f"  {key:<12} {old:>10} -> {new:<10} {change}")
+
+
+# ----------------------------------------------------------------------------
+# Main
+# ----------------------------------------------------------------------------
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        method, _, weight = part.partition('=')
+        mix[method.strip()] = float(weight or 1)
+    unknown = set(mix) - {'initialize', 'tools/list', 'tools/call'}
+    if unknown:
+        raise SystemExit(f"unknown methods in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip(),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=sorted(SERVERS), default='hf-browser')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=int, default=20, help="closed-loop workers (default 20)")
+    load.add_argument('--rate', type=float, help="open-loop requests per second")
+    parser.add_argument('--duration', type=float, default=10, help="measured seconds (default 10)")
+    parser.add_argument('--warmup', type=float, default=2, help="unmeasured seconds first (default 2)")
+    parser.add_argument('--mix', default='initialize=1,tools/list=4,tools/call=15',
+                        help="method weights (default initialize=1,tools/list=4,tools/call=15)")
+    parser.add_argument('--latency-ms', type=float, default=20, help="stub insert latency (default 20)")
+    parser.add_argument('--jitter-ms', type=float, default=5, help="stub latency jitter, +/- (default 5)")
+    parser.add_argument('--error-rate', type=float, default=0, help="stub 500 fraction (default 0)")
+    parser.add_argument('--stub-concurrency', type=int, default=0, help="stub insert slots, 0 = unlimited")
+    parser.add_argument('--repeat-commands', action='store_true',
+                        help="reuse a few commands so the dedup cache can answer")
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help="extra env for the server, e.g. BRIDGE_BATCH_WINDOW_MS=2")
+    parser.add_argument('--client-processes', type=int, default=1,
+                        help="load-generating processes sharing --concurrency / --rate (default 1)")
+    parser.add_argument('--output', help="JSON result path (default results/<server>-<commit>.json)")
+    parser.add_argument('--compare', help="earlier JSON result to diff against")
+    return parser.parse_args()
+
+def client_share(args):
+    """This process's part of the load: --concurrency / --rate divided by --client-processes"""
+    share = argparse.Namespace(**vars(args))
+    share.concurrency = max(args.concurrency // args.client_processes, 1)
+    if args.rate is not None:
+        share.rate = args.rate / args.client_processes
+    return share
+
+def extra_client(args, spec, mix, record_at, stop_at, results):
+    """One more load generator (--client-processes); its samples go back through `results`"""
+    async def generate():
+        offset = time.perf_counter() - time.time()
+        async with httpx.AsyncClient(timeout=30, follow_redirects=True) as http:
+            client = McpClient(http, f"http://127.0.0.1:{spec['port']}/mcp", spec['tools'], spec.get('sse', False))
+            workers = args.concurrency if args.rate is None else min(max(int(args.rate // 10), 4), 64)
+            sessions = [await client.open_session() for _ in range(workers)]
+            recorder = Recorder()
+            run = closed_loop if args.rate is None else open_loop
+            runner = asyncio.create_task(run(client, recorder, args, mix, sessions, stop_at + offset))
+            await asyncio.sleep(max(record_at - time.time(), 0))
+            recorder.recording = True
+            cpu_start = time.process_time()
+            await asyncio.sleep(max(stop_at - time.time(), 0))
+            cpu = time.process_time() - cpu_start
+            recorder.recording = False
+            await runner
+            return recorder, cpu
+
+    recorder, cpu = asyncio.run(generate())
+    results.put((recorder.samples, recorder.errors, cpu))
+
+async def drive(args, spec, mix, proc):
+    url = f"http://127.0.0.1:{spec['port']}/mcp"
+    share = client_share(args)
+    limits = httpx.Limits(max_connections=max(share.concurrency, 64), max_keepalive_connections=64)
+    async with httpx.AsyncClient(timeout=30, limits=limits, follow_redirects=True) as http:
+        client = McpClient(http, url, spec['tools'], spec.get('sse', False))
+        workers = share.concurrency if share.rate is None else min(max(int(share.rate // 10), 4), 64)
+        sessions = [await client.open_session() for _ in range(workers)]
+        recorder = Recorder()
+        run = closed_loop if share.rate is None else open_loop
+
+        # Warm-up and measurement share one run; only the window in between is recorded
+        stop_at = time.perf_counter() + args.warmup + args.duration
+        wall_record_at = time.time() + args.warmup
+        extra = []
+        results = multiprocessing.get_context('spawn').Queue()
+        for _ in range(args.client_processes - 1):
+            extra.append(multiprocessing.get_context('spawn').Process(
+                target=extra_client, args=(share, spec, mix, wall_record_at, wall_record_at + args.duration, results)))
+            extra[-1].start()
+        runner = asyncio.create_task(run(client, recorder, share, mix, sessions, stop_at))
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        cpu_start, rss = proc_sample(proc.pid)
+        client_cpu_start = time.process_time()
+        started = time.perf_counter()
+        rss_peak = rss
+        while not runner.done() and time.perf_counter() < stop_at:
+            await asyncio.sleep(0.25)
+            _, rss = proc_sample(proc.pid)
+            rss_peak = max(rss_peak, rss)
+        cpu_end, rss_end = proc_sample(proc.pid)
+        measured = time.perf_counter() - started
+        client_cpu = time.process_time() - client_cpu_start
+        recorder.recording = False
+        await runner
+
+    for _ in extra:
+        samples, errors, cpu = await asyncio.to_thread(results.get)
+        for method, latencies in samples.items():
+            recorder.samples.setdefault(method, []).extend(latencies)
+        for error, count in errors.items():
+            recorder.errors[error] = recorder.errors.get(error, 0) + count
+        client_cpu += cpu
+    for process in extra:
+        process.join()
+    return recorder, measured, cpu_end - cpu_start, rss_peak, rss_end, client_cpu
+
+def main():
+    args = parse_args()
+    spec = SERVERS[args.server]
+    mix = parse_mix(args.mix)
+    extra_env = dict(item.split('=', 1) for item in args.server_env)
+    commit, dirty = git_commit()
+    tmp = tempfile.mkdtemp(prefix='mcp-load-')
+
+    stub = start_stub(args, tmp)
+    proc, log_path = start_server(spec, tmp, extra_env)
+    try:
+        if not wait_ready(f"http://127.0.0.1:{STUB_PORT}/api/ping", method='GET'):
+            raise SystemExit("stub bridge did not start")
+        if not wait_ready(f"http://127.0.0.1:{spec['port']}/mcp", method='POST',
+                          json={"jsonrpc": "2.0", "id": 0, "method": "ping"}) or proc.poll() is not None:
+            raise SystemExit(f"{args.server} did not start - see {log_path}")
+
+        recorder, measured, cpu, rss_peak, rss_end, client_cpu = asyncio.run(drive(args, spec, mix, proc))
+        bridge = httpx.get(f"http://127.0.0.1:{STUB_PORT}/stub/stats").json()
+    finally:
+        for p in (proc, stub):
+            p.terminate()
+        for p in (proc, stub):
+            p.wait()
+
+    everything = [s for samples in recorder.samples.values() for s in samples]
+    result = {
+        'meta': {
+            'commit': commit, 'dirty': dirty, 'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'server': args.server, 'mode': 'closed' if args.rate is None else 'open',
+            'concurrency': args.concurrency if args.rate is None else None, 'rate': args.rate,
+            'duration': round(measured, 3), 'mix': mix, 'repeat_commands': args.repeat_commands,
+            'server_env': extra_env, 'python': platform.python_version(),
+            'stub': {'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+                     'error_rate': args.error_rate, 'concurrency': args.stub_concurrency},
+        },
+        'overall': {**summarize(everything, measured), 'errors': recorder.errors},
+        'by_method': {method: summarize(samples, measured) for method, samples in recorder.samples.items()},
+        'server': {
+            'cpu_seconds': round(cpu, 3),
+            'cpu_percent': round(cpu / measured * 100, 1),
+            'rss_mb_peak': round(rss_peak, 1),
+            'rss_mb_end': round(rss_end, 1),
+        },
+        'client': {'cpu_percent': round(client_cpu / measured * 100, 1), 'cpus': os.cpu_count(),
+                   'processes': args.client_processes},
+        'bridge': {key: bridge[key] for key in ('execute', 'batches', 'commands', 'errors')},
+    }
+
+    print_report(result)
+    output = args.output or os.path.join(HERE, 'results', f"{args.server}-{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nwrote {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_compare(result, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Stub Cloud Bridge - Local stand-in for the Vercel /api/execute endpoint
+Used by the benchmarks so numbers don't depend on Vercel or Supabase
+
+Bulk-execute contract (not on the Vercel bridge yet):
+    POST /api/execute/batch  {"commands": [<same body as /api/execute>, ...]}
+    ->  {"results": [{"status": <http status>, "body": <execute response>}, ...]}
+One batch costs one simulated insert, like a single multi-row Supabase insert.
+
+Latency, jitter and a random failure rate are set with STUB_* env vars or
+configure(); GET /stub/stats reports how many calls actually arrived.
+
+Several deployments of one bridge can run side by side: Stub() holds one
+deployment's settings and counters, create_app(stub) serves it, and all
+of them share the "database" below - RECEIVED, ACCESS_IDS and the
+requestId -> commandId map that keeps a resent command from being queued
+twice.
+"""
+
+import asyncio
+import collections
+import itertools
+import os
+import random
+import threading
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+import uvicorn
+
+# Commands per accessId - shows which tenant a command was queued for
+ACCESS_IDS = collections.Counter()
+# (accessId, command) of every queued command, in order - benchmarks check delivery order
+RECEIVED = collections.deque(maxlen=100000)
+# requestId -> commandId, so a failed-over or hedged command is queued once
+REQUEST_IDS = {}
+
+_ids = itertools.count(1)
+
+
+class Stub:
+    """One simulated bridge deployment"""
+
+    def __init__(self, **settings):
+        self.settings = {
+            'latency_ms': float(os.getenv('STUB_LATENCY_MS', '0')),
+            # Each insert takes latency_ms +/- a uniform jitter_ms
+            'jitter_ms': float(os.getenv('STUB_JITTER_MS', '0')),
+            # Fraction of commands answered with a 500
+            'error_rate': float(os.getenv('STUB_ERROR_RATE', '0')),
+            # Simulated Vercel/Supabase concurrency - 0 means unlimited
+            'concurrency': int(os.getenv('STUB_CONCURRENCY', '0')),
+            **settings,
+        }
+        self.stats = {'execute': 0, 'batches': 0, 'commands': 0, 'errors': 0, 'duplicates': 0,
+                      'open': 0, 'peak_open': 0}
+        self._slots = None
+
+    def configure(self, **settings):
+        """Change stub behaviour at runtime (benchmarks call this between runs)"""
+        self.settings.update(settings)
+        self._slots = None
+
+    def insert_delay(self):
+        delay = self.settings['latency_ms']
+        if self.settings['jitter_ms']:
+            delay += random.uniform(-self.settings['jitter_ms'], self.settings['jitter_ms'])
+        return max(delay, 0) / 1000
+
+    async def simulate_insert(self):
+        # Requests open at once - what the real bridge would see as Vercel concurrency
+        self.stats['open'] += 1
+        self.stats['peak_open'] = max(self.stats['peak_open'], self.stats['open'])
+        try:
+            if self.settings['concurrency'] and self._slots is None:
+                self._slots = asyncio.Semaphore(self.settings['concurrency'])
+            if self._slots is not None:
+                async with self._slots:
+                    await asyncio.sleep(self.insert_delay())
+            elif self.settings['latency_ms'] or self.settings['jitter_ms']:
+                await asyncio.sleep(self.insert_delay())
+        finally:
+            self.stats['open'] -= 1
+
+    def queue_command(self, body):
+        self.stats['commands'] += 1
+        ACCESS_IDS[body.get('accessId')] += 1
+        if not body.get('command') or not body.get('accessId'):
+            return 400, {"error": "Missing required fields: command, accessId"}
+        if self.settings['error_rate'] and random.random() < self.settings['error_rate']:
+            self.stats['errors'] += 1
+            return 500, {"error": "Simulated bridge failure"}
+        request_id = body.get('requestId')
+        if request_id in REQUEST_IDS:
+            self.stats['duplicates'] += 1
+            command_id = REQUEST_IDS[request_id]
+        else:
+            command_id = f"cmd_{int(time.time() * 1000)}_{next(_ids)}"
+            if request_id:
+                REQUEST_IDS[request_id] = command_id
+            RECEIVED.append((body.get('accessId'), body.get('command')))
+        return 200, {
+            "success": True,
+            "commandId": command_id,
+            "message": "Command queued successfully. Extension will execute it.",
+            "status": "pending"
+        }
+
+
+def create_app(stub):
+    app = FastAPI()
+
+    @app.exception_handler(ClientDisconnect)
+    async def client_gone(request, exc):
+        # A hedged or timed-out caller hung up before sending its body
+        return JSONResponse({"error": "Client disconnected"}, status_code=499)
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"status": "ok", "service": "Stub Cloud Bridge"}
+
+    @app.get("/stub/stats")
+    async def stats():
+        return {**stub.stats, "access_ids": ACCESS_IDS, "settings": stub.settings}
+
+    @app.post("/api/execute")
+    async def execute(request: Request):
+        stub.stats['execute'] += 1
+        body = await request.json()
+        await stub.simulate_insert()
+        status, result = stub.queue_command(body)
+        return result if status == 200 else JSONResponse(result, status_code=status)
+
+    @app.post("/api/execute/batch")
+    async def execute_batch(request: Request):
+        stub.stats['batches'] += 1
+        body = await request.json()
+        await stub.simulate_insert()
+        results = []
+        for item in body.get('commands', []):
+            status, result = stub.queue_command(item)
+            results.append({"status": status, "body": result})
+        return {"results": results}
+
+    return app
+
+
+DEFAULT = Stub()
+STUB = DEFAULT.settings
+STATS = DEFAULT.stats
+configure = DEFAULT.configure
+app = create_app(DEFAULT)
+
+
+def serve_in_thread(host="127.0.0.1", port=8899, stub=None):
+    """Start a stub (the default one unless given) in a daemon thread and wait until it accepts requests"""
+    config = uvicorn.Config(app if stub is None else create_app(stub), host=host, port=port, log_level="error")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv('STUB_PORT', '8899')), log_level="error")
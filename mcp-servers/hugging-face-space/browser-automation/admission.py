@@ -0,0 +1,163 @@
+"""
+Admission - Bounded concurrency and per-accessId rate limits for /api/execute
+
+Without a limit a burst from the Tuya agent opens one Cloud Bridge request
+per command, each allowed BRIDGE_TIMEOUT seconds, until the bridge runs
+out of Vercel concurrency. Every command now takes a token from its
+accessId's bucket, then one of BRIDGE_MAX_IN_FLIGHT slots; while all
+slots are busy it waits in a short FIFO queue. A command that cannot get
+in (bucket empty, queue full, queue wait over) fails at once with
+Overloaded, which carries a retry-after hint.
+
+Limits are per process - per worker when MCP_WORKERS > 1.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import metrics
+
+# Concurrent /api/execute calls; 0 = unlimited
+BRIDGE_MAX_IN_FLIGHT = int(os.getenv('BRIDGE_MAX_IN_FLIGHT', '20'))
+# Commands that may wait for a slot, and for how long (seconds)
+BRIDGE_QUEUE_SIZE = int(os.getenv('BRIDGE_QUEUE_SIZE', '50'))
+BRIDGE_QUEUE_TIMEOUT = float(os.getenv('BRIDGE_QUEUE_TIMEOUT', '2'))
+# Per accessId: sustained commands per second and burst; 0 = unlimited
+BRIDGE_RATE_PER_ACCESS_ID = float(os.getenv('BRIDGE_RATE_PER_ACCESS_ID', '5'))
+BRIDGE_BURST_PER_ACCESS_ID = int(os.getenv('BRIDGE_BURST_PER_ACCESS_ID', '20'))
+
+MAX_BUCKETS = 10000
+
+
+class Overloaded(Exception):
+    """The command was refused before reaching the Cloud Bridge"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Overloaded ({reason}), retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """0 if a token was taken, else seconds until the next one"""
+        self.refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionControl:
+    def __init__(self, limit=BRIDGE_MAX_IN_FLIGHT, queue_size=BRIDGE_QUEUE_SIZE, queue_timeout=BRIDGE_QUEUE_TIMEOUT,
+                 rate=BRIDGE_RATE_PER_ACCESS_ID, burst=BRIDGE_BURST_PER_ACCESS_ID):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.active = 0
+        self.hold = 0.1  # EWMA of seconds a slot is held, for retry-after hints
+        self._waiters = deque()
+        self._buckets = {}
+
+    @asynccontextmanager
+    async def admit(self, access_id):
+        """Hold a slot for one bridge call, or raise Overloaded"""
+        self._take_token(access_id)
+        if self.limit <= 0:
+            yield
+            return
+        await self._acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.hold += 0.2 * (time.perf_counter() - started - self.hold)
+            self._release()
+
+    def retry_after(self):
+        """Rough time until everything queued now has had its turn"""
+        return max(self.hold * (len(self._waiters) + 1) / self.limit, 0.1)
+
+    def _reject(self, reason, retry_after):
+        metrics.ADMISSION_REJECTED.inc(reason)
+        raise Overloaded(reason, retry_after)
+
+    def _take_token(self, access_id):
+        if self.rate <= 0:
+            return
+        bucket = self._buckets.get(access_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune_buckets()
+            bucket = self._buckets[access_id] = TokenBucket(self.rate, self.burst)
+        wait = bucket.take()
+        if wait:
+            self._reject('rate_limited', wait)
+
+    def _prune_buckets(self):
+        """Full buckets carry no state - a new one would look the same"""
+        now = time.monotonic()
+        for access_id, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._buckets[access_id]
+
+    async def _acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._reject('queue_full', self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        metrics.ADMISSION_QUEUE_DEPTH.set(value=len(self._waiters))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject('queue_timeout', self.retry_after())
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # handed a slot just as we were cancelled - pass it on
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            metrics.ADMISSION_QUEUE_DEPTH.set(value=len(self._waiters))
+        metrics.ADMISSION_WAIT.observe(time.perf_counter() - started)
+
+    def _release(self):
+        # The slot passes straight to the oldest waiter, so active stays the same
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                metrics.ADMISSION_QUEUE_DEPTH.set(value=len(self._waiters))
+                return
+        self.active -= 1
+
+    def stats(self):
+        return {"in_flight": self.active, "queued": len(self._waiters), "limit": self.limit}
+
+
+ADMISSION = AdmissionControl()
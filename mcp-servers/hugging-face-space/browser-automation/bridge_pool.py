@@ -0,0 +1,264 @@
+"""
+Bridge Pool - Several Cloud Bridge deployments, routed by passive health
+
+CLOUD_BRIDGE_URLS lists the bridge deployments, comma separated, preferred
+first (default: CLOUD_BRIDGE_URL alone). Each request goes to the
+healthiest one, judged from the traffic it already carries:
+
+    - EWMA latency and EWMA error rate (5xx, 408, 429, timeouts, refused
+      connections) score every endpoint: latency / (1 - error rate). An
+      endpoint not heard from yet, or for STALE_AFTER seconds, scores 0,
+      so it gets one request to show how it is doing now
+    - BRIDGE_CIRCUIT_THRESHOLD failures in a row open an endpoint's
+      circuit; it gets no traffic for BRIDGE_CIRCUIT_COOLDOWN seconds,
+      then a single trial request (or warm-up ping) decides
+    - a failed request moves on to the next endpoint while time is left
+    - BRIDGE_HEDGE_PERCENTILE > 0: a request still unanswered after that
+      percentile of its endpoint's recent latencies is sent to the next
+      best endpoint too; the first good answer wins and the other is
+      cancelled. Each request earns BRIDGE_HEDGE_BUDGET of a hedge (at
+      most HEDGE_BURST saved up), so hedging cannot double the load
+
+Failover and hedging may send one command twice. Every command carries a
+requestId that the bridge stores it under, so it is queued once as long as
+the deployments share one Supabase project.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+import metrics
+
+CLOUD_BRIDGE_URL = os.getenv('CLOUD_BRIDGE_URL', 'https://tuya-cloud-bridge.vercel.app')
+CLOUD_BRIDGE_URLS = [url.strip().rstrip('/') for url in os.getenv('CLOUD_BRIDGE_URLS', CLOUD_BRIDGE_URL).split(',')
+                     if url.strip()]
+# Failures in a row that open an endpoint's circuit, and how long it stays open (seconds)
+BRIDGE_CIRCUIT_THRESHOLD = int(os.getenv('BRIDGE_CIRCUIT_THRESHOLD', '3'))
+BRIDGE_CIRCUIT_COOLDOWN = float(os.getenv('BRIDGE_CIRCUIT_COOLDOWN', '10'))
+# Hedge after this percentile of the endpoint's recent latencies, 0 = off
+BRIDGE_HEDGE_PERCENTILE = float(os.getenv('BRIDGE_HEDGE_PERCENTILE', '0'))
+# Never hedge sooner than this (ms), and hedge at most this fraction of requests
+BRIDGE_HEDGE_MIN_DELAY_MS = float(os.getenv('BRIDGE_HEDGE_MIN_DELAY_MS', '50'))
+BRIDGE_HEDGE_BUDGET = float(os.getenv('BRIDGE_HEDGE_BUDGET', '0.1'))
+
+ALPHA = 0.2  # EWMA weight of the newest sample
+WINDOW = 200  # recent latencies kept for the hedge percentile
+MIN_SAMPLES = 20  # fewer than this and the hedge waits COLD_HEDGE_DELAY
+COLD_HEDGE_DELAY = 1.0
+HEDGE_BURST = 10  # hedges that may be saved up while all is well
+STALE_AFTER = 30.0  # seconds without an answer before a score is tried again
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def failed(status_code):
+    """Answers that say the deployment is unwell, not that the request was wrong"""
+    return status_code >= 500 or status_code in (408, 429)
+
+
+class Endpoint:
+    __slots__ = ('url', 'index', 'latency', 'errors', 'recent', 'updated', 'state', 'failures', 'open_until',
+                 'trial')
+
+    def __init__(self, url, index):
+        self.url = url
+        self.index = index
+        self.latency = None  # EWMA seconds; None until the first answer
+        self.errors = 0.0  # EWMA error rate
+        self.recent = deque(maxlen=WINDOW)
+        self.updated = 0.0  # last request sent or answered (monotonic)
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False  # the half-open trial request is out
+
+    def available(self, now):
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return now >= self.open_until
+        return not self.trial
+
+    def score(self, now):
+        """Lower is better; ties go to the endpoint listed first"""
+        if self.latency is None or now - self.updated > STALE_AFTER:
+            return 0.0
+        return self.latency / max(1 - self.errors, 0.05)
+
+    def begin(self):
+        self.updated = time.monotonic()  # a stale score gets one probe, not every request at once
+        if self.state != CLOSED:
+            self.state = HALF_OPEN
+            self.trial = True
+
+    def success(self, elapsed):
+        self.latency = elapsed if self.latency is None else self.latency + ALPHA * (elapsed - self.latency)
+        self.errors -= ALPHA * self.errors
+        self.recent.append(elapsed)
+        self.updated = time.monotonic()
+        self.close()
+
+    def failure(self, elapsed):
+        # A timeout took `elapsed` too - slow failures count against the latency as well
+        self.latency = elapsed if self.latency is None else self.latency + ALPHA * (elapsed - self.latency)
+        self.errors += ALPHA * (1 - self.errors)
+        self.updated = time.monotonic()
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= BRIDGE_CIRCUIT_THRESHOLD:
+            self.state = OPEN
+            self.open_until = time.monotonic() + BRIDGE_CIRCUIT_COOLDOWN
+            self.trial = False
+        self.update_metrics()
+
+    def abandon(self, elapsed):
+        """Cancelled (a hedge won): it is at least this slow right now, but did not fail"""
+        self.latency = elapsed if self.latency is None else max(self.latency, elapsed)
+        if self.state == HALF_OPEN:
+            self.trial = False
+
+    def close(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.trial = False
+        self.update_metrics()
+
+    def ping(self, elapsed, ok):
+        """Warm-up result: drives the circuit and error rate; a ping is no insert, so not the latency"""
+        if not ok:
+            self.failure(elapsed)
+            return
+        self.errors -= ALPHA * self.errors
+        self.close()
+
+    def hedge_delay(self, percentile):
+        if len(self.recent) < MIN_SAMPLES:
+            return COLD_HEDGE_DELAY
+        ordered = sorted(self.recent)
+        return max(ordered[min(int(len(ordered) * percentile / 100), len(ordered) - 1)],
+                   BRIDGE_HEDGE_MIN_DELAY_MS / 1000)
+
+    def update_metrics(self):
+        metrics.BRIDGE_ENDPOINT_LATENCY.set(self.url, value=round(self.latency or 0.0, 4))
+        metrics.BRIDGE_ENDPOINT_ERRORS.set(self.url, value=round(self.errors, 4))
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            metrics.BRIDGE_ENDPOINT_CIRCUIT.set(self.url, state, value=1 if self.state == state else 0)
+
+    def stats(self):
+        return {"url": self.url, "state": self.state, "errorRate": round(self.errors, 3),
+                "latencyMs": round(self.latency * 1000, 1) if self.latency is not None else None}
+
+
+class BridgePool:
+    def __init__(self, urls=CLOUD_BRIDGE_URLS, hedge_percentile=BRIDGE_HEDGE_PERCENTILE,
+                 hedge_budget=BRIDGE_HEDGE_BUDGET, deadline=None):
+        self.endpoints = [Endpoint(url, index) for index, url in enumerate(urls)]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.deadline = deadline  # no failover once a request has taken this long (seconds)
+        self.requests = 0
+        self.hedges = 0
+        self._hedge_tokens = float(HEDGE_BURST)
+
+    @property
+    def primary(self):
+        return self.endpoints[0].url
+
+    def ranked(self):
+        """Usable endpoints, healthiest first"""
+        now = time.monotonic()
+        usable = [e for e in self.endpoints if e.available(now)]
+        if not usable:
+            # Every circuit is open: try the one that reopens first rather than fail unseen
+            usable = [min(self.endpoints, key=lambda e: e.open_until)]
+        return sorted(usable, key=lambda e: (e.score(now), e.index))
+
+    async def request(self, send, hedge=True):
+        """
+        await send(url) on the healthiest endpoint and return its httpx.Response,
+        failing over to the next one after an error or a 5xx and hedging when enabled
+        """
+        self.requests += 1
+        self._hedge_tokens = min(self._hedge_tokens + self.hedge_budget, HEDGE_BURST)
+        started = time.perf_counter()
+        tried = set()
+        response = error = None
+        while True:
+            candidates = [e for e in self.ranked() if e not in tried]
+            if not candidates:
+                break
+            if tried:
+                if self.deadline and time.perf_counter() - started > self.deadline:
+                    break
+                metrics.BRIDGE_FAILOVERS.inc()
+            endpoint = candidates[0]
+            backup = candidates[1] if hedge and len(candidates) > 1 and self._may_hedge() else None
+            tried.add(endpoint)
+            try:
+                if backup is None:
+                    response = await self._attempt(send, endpoint)
+                else:
+                    response = await self._hedged(send, endpoint, backup, tried)
+            except Exception as e:
+                error, response = e, None
+                continue
+            if not failed(response.status_code):
+                return response
+        if response is not None:
+            return response
+        raise error
+
+    def _may_hedge(self):
+        return self.hedge_percentile > 0 and self._hedge_tokens >= 1
+
+    async def _attempt(self, send, endpoint):
+        endpoint.begin()
+        started = time.perf_counter()
+        try:
+            response = await send(endpoint.url)
+        except asyncio.CancelledError:
+            endpoint.abandon(time.perf_counter() - started)
+            raise
+        except Exception:
+            endpoint.failure(time.perf_counter() - started)
+            raise
+        if failed(response.status_code):
+            endpoint.failure(time.perf_counter() - started)
+        else:
+            endpoint.success(time.perf_counter() - started)
+        return response
+
+    async def _hedged(self, send, endpoint, backup, tried):
+        started = time.perf_counter()
+        first = asyncio.create_task(self._attempt(send, endpoint))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=endpoint.hedge_delay(self.hedge_percentile))
+            if not done:
+                self.hedges += 1
+                self._hedge_tokens -= 1
+                tried.add(backup)
+                tasks.append(asyncio.create_task(self._attempt(send, backup)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and not failed(task.result().status_code):
+                        if len(tasks) > 1:
+                            metrics.BRIDGE_HEDGES.inc('primary' if task is first else 'hedge')
+                        if task is not first:
+                            # now, not when the cancel lands: the caller's next request is ranked before that
+                            endpoint.abandon(time.perf_counter() - started)
+                        return task.result()
+            if len(tasks) > 1:
+                metrics.BRIDGE_HEDGES.inc('none')
+            return first.result()  # both failed: the primary's answer or error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return {"endpoints": [e.stats() for e in self.endpoints], "requests": self.requests, "hedges": self.hedges}
@@ -0,0 +1,131 @@
+"""
+Dedup - Singleflight + short TTL cache in front of the forwarders
+
+The Tuya gateway and voice agent retry, so the same command often arrives
+several times within a second. Identical calls (same accessId, normalized
+command and tool) share the in-flight forward, and a finished result is
+served from a small LRU until it expires. With several workers a
+SharedState extends both across processes: a worker that finds the
+command in flight elsewhere polls for that result instead of forwarding
+it again.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from shared_state import PENDING, RESULT
+
+logger = logging.getLogger(__name__)
+
+DEDUP_TTL_SECONDS = float(os.getenv('DEDUP_TTL_SECONDS', '2'))
+DEDUP_MAX_ENTRIES = int(os.getenv('DEDUP_MAX_ENTRIES', '256'))
+DEDUP_DISABLED_TOOLS = {t.strip() for t in os.getenv('DEDUP_DISABLED_TOOLS', '').split(',') if t.strip()}
+# Longest a worker waits on another worker's in-flight forward
+DEDUP_PENDING_SECONDS = float(os.getenv('DEDUP_PENDING_SECONDS', '5'))
+SHARED_POLL_SECONDS = 0.01
+SHARED_PRUNE_EVERY = 256
+
+
+def normalize_command(command):
+    """'  Turn ON the lights! ' -> 'turn on the lights'"""
+    return ' '.join(str(command).lower().split()).strip(' .!?')
+
+
+class CommandDedup:
+    def __init__(self, ttl=DEDUP_TTL_SECONDS, max_entries=DEDUP_MAX_ENTRIES, disabled_tools=DEDUP_DISABLED_TOOLS,
+                 shared=None, pending_ttl=DEDUP_PENDING_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disabled_tools = set(disabled_tools)
+        self.shared = shared
+        self.pending_ttl = pending_ttl
+        self.stats = {'hits': 0, 'inflight_hits': 0, 'misses': 0, 'bypassed': 0}
+        self._inflight = {}
+        self._results = OrderedDict()
+        self._stores = 0
+
+    async def run(self, tool, access_id, command, factory, cacheable=None):
+        """
+        Return factory()'s result, sharing it between identical calls.
+        `cacheable(result)` decides whether a finished result may be reused.
+        """
+        if tool in self.disabled_tools or self.ttl <= 0:
+            self.stats['bypassed'] += 1
+            return await factory()
+
+        key = (access_id, normalize_command(command), tool)
+
+        cached = self._results.get(key)
+        if cached is not None:
+            expires, result = cached
+            if expires > time.monotonic():
+                self._results.move_to_end(key)
+                self.stats['hits'] += 1
+                logger.info(f"DEDUP HIT: {tool}('{command}')")
+                return result
+            del self._results[key]
+
+        task = self._inflight.get(key)
+        if task is None and self.shared is not None:
+            shared_key = '\x1f'.join(key)
+            result = await self._from_other_workers(shared_key)
+            if result is not None:
+                self._remember(key, result)
+                logger.info(f"DEDUP HIT (OTHER WORKER): {tool}('{command}')")
+                return result
+            task = self._inflight.get(key)  # another local caller may have started it meanwhile
+
+        if task is None:
+            self.stats['misses'] += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t, cacheable))
+        else:
+            self.stats['inflight_hits'] += 1
+            logger.info(f"DEDUP JOINED IN-FLIGHT: {tool}('{command}')")
+
+        # shield: a caller that disconnects must not cancel the shared forward
+        return await asyncio.shield(task)
+
+    async def _from_other_workers(self, shared_key):
+        """A result another worker has or is about to have; None means forward it here"""
+        state, result = self.shared.claim(shared_key, self.pending_ttl)
+        if state == RESULT:
+            self.stats['hits'] += 1
+            return result
+        if state != PENDING:
+            return None
+        deadline = time.monotonic() + self.pending_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(SHARED_POLL_SECONDS)
+            state, result = self.shared.peek(shared_key)
+            if state == RESULT:
+                self.stats['inflight_hits'] += 1
+                return result
+            if state is None:
+                break  # the other worker gave up (error / not cacheable)
+        state, result = self.shared.claim(shared_key, self.pending_ttl)
+        return result if state == RESULT else None
+
+    def _remember(self, key, result):
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def _finish(self, key, task, cacheable):
+        self._inflight.pop(key, None)
+        ok = not task.cancelled() and task.exception() is None
+        result = task.result() if ok else None
+        if ok and (cacheable is None or cacheable(result)):
+            self._remember(key, result)
+            if self.shared is not None:
+                self.shared.store('\x1f'.join(key), result, self.ttl)
+                self._stores += 1
+                if self._stores % SHARED_PRUNE_EVERY == 0:
+                    self.shared.prune()
+        elif self.shared is not None:
+            self.shared.release('\x1f'.join(key))
@@ -0,0 +1,109 @@
+"""
+Reconnect - Liveness probing and backoff for the Tuya link
+
+A TCP connection can die without either side noticing (NAT timeout, a
+gateway that stops forwarding): start_listening() just waits forever.
+heartbeat() probes the link every `interval` seconds and raises
+HalfOpenError after `max_misses` probes in a row time out; supervise()
+runs it next to the listener and cancels the listener when that happens.
+
+Retries use decorrelated jitter (sleep = uniform(base, 3 * previous),
+capped) so Spaces that lost the link together do not retry in lockstep,
+and a small circuit breaker says whether we are connected (closed),
+waiting out a backoff (open) or trying one connection (half_open).
+"""
+
+import asyncio
+import random
+import time
+
+
+class HalfOpenError(ConnectionError):
+    """The connection looks open but stopped answering probes"""
+
+
+class DecorrelatedBackoff:
+    __slots__ = ('base', 'cap', 'rng', 'previous')
+
+    def __init__(self, base=1.0, cap=60.0, rng=None):
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random  # shared generator - one per link would cost ~2.5KB each
+        self.previous = base
+
+    def next(self):
+        self.previous = min(self.cap, self.rng.uniform(self.base, self.previous * 3))
+        return self.previous
+
+    def reset(self):
+        self.previous = self.base
+
+
+class Circuit:
+    """closed -> (threshold failures) -> open -> (backoff) -> half_open -> ..."""
+
+    __slots__ = ('threshold', 'state', 'failures')
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, threshold=3):
+        self.threshold = threshold
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def attempt(self):
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+
+    def success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.state = self.OPEN
+
+
+async def heartbeat(probe, interval=15.0, timeout=5.0, max_misses=2, on_beat=None, on_miss=None):
+    """
+    await probe() every `interval` seconds. on_beat(rtt_seconds) after each
+    answer, on_miss(misses_in_a_row, error) after each timeout or error.
+    Raises HalfOpenError once `max_misses` probes in a row failed.
+    """
+    misses = 0
+    while True:
+        await asyncio.sleep(interval)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(probe(), timeout)
+        except (asyncio.TimeoutError, OSError, ConnectionError) as e:
+            misses += 1
+            if on_miss is not None:
+                on_miss(misses, e)
+            if misses >= max_misses:
+                raise HalfOpenError(f"{misses} heartbeats missed ({e or 'timeout'})")
+            continue
+        misses = 0
+        if on_beat is not None:
+            on_beat(time.perf_counter() - started)
+
+
+async def supervise(listening, beating):
+    """
+    Run the listener and the heartbeat until either one ends. The other is
+    cancelled; the listener's result or the first error is returned/raised.
+    """
+    listen_task = asyncio.ensure_future(listening)
+    beat_task = asyncio.ensure_future(beating)
+    try:
+        done, _ = await asyncio.wait({listen_task, beat_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (listen_task, beat_task):
+            task.cancel()
+        await asyncio.gather(listen_task, beat_task, return_exceptions=True)
+    if listen_task in done:
+        return listen_task.result()
+    return beat_task.result()
@@ -0,0 +1,165 @@
+"""
+Request Log - Append-only, memory-mapped ring of recent tool calls
+
+Layout (little endian):
+    header  magic(4s) version(I) slot_size(I) slot_count(I) seq(Q)
+    slots   slot_count x [seq(Q) length(I) payload(slot_size - 12)]
+
+Writers append in O(1) under a short flock, so several uvicorn workers
+can share one ring. Readers map the file read-only and pull everything
+after the last sequence number they saw.
+"""
+
+import fcntl
+import mmap
+import os
+import struct
+from datetime import datetime
+
+import codec
+
+REQUESTS_RING = os.getenv('REQUESTS_RING', '/tmp/mcp_requests.ring')
+RING_SLOTS = int(os.getenv('REQUESTS_RING_SLOTS', '256'))
+RING_SLOT_SIZE = 512
+
+MAGIC = b'MCPR'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQ')
+SLOT_HEADER = struct.Struct('<QI')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = HEADER.size - SEQ.size
+
+
+def _ring_size(slot_size, slot_count):
+    return HEADER.size + slot_size * slot_count
+
+
+class RequestRing:
+    """Writer side - one per process"""
+
+    def __init__(self, path=REQUESTS_RING, slot_count=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            size = os.fstat(self._fd).st_size
+            header = os.pread(self._fd, HEADER.size, 0) if size >= HEADER.size else b''
+            if len(header) == HEADER.size and HEADER.unpack(header)[0] == MAGIC:
+                # Another worker created it first - adopt its geometry
+                _, _, slot_size, slot_count, _ = HEADER.unpack(header)
+            else:
+                os.ftruncate(self._fd, _ring_size(slot_size, slot_count))
+                os.pwrite(self._fd, HEADER.pack(MAGIC, VERSION, slot_size, slot_count, 0), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self.slot_size = slot_size
+        self.slot_count = slot_count
+        self._map = mmap.mmap(self._fd, _ring_size(slot_size, slot_count))
+
+    def append(self, record):
+        """Store one dict; returns its sequence number"""
+        limit = self.slot_size - SLOT_HEADER.size
+        payload = codec.dumps_within(record, limit)
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            seq = SEQ.unpack_from(self._map, SEQ_OFFSET)[0] + 1
+            offset = HEADER.size + ((seq - 1) % self.slot_count) * self.slot_size
+            # seq 0 marks the slot as being rewritten for concurrent readers
+            SLOT_HEADER.pack_into(self._map, offset, 0, len(payload))
+            self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+            SLOT_HEADER.pack_into(self._map, offset, seq, len(payload))
+            SEQ.pack_into(self._map, SEQ_OFFSET, seq)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return seq
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class RequestRingReader:
+    """Read-only view - remembers the last sequence number it returned"""
+
+    def __init__(self, path=REQUESTS_RING):
+        self.path = path
+        self.last_seq = 0
+        self._map = None
+        self._inode = None
+        self.generation = 0
+
+    def _open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._inode = os.fstat(f.fileno()).st_ino
+        except (OSError, ValueError):
+            return False
+        magic, _, self.slot_size, self.slot_count, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            self._map = None
+            return False
+        return True
+
+    @property
+    def seq(self):
+        """Total number of records ever appended"""
+        if self._map is None and not self._open():
+            return 0
+        return SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+
+    def read_new(self):
+        """Return records appended since the previous call (oldest first)"""
+        if self._map is not None:
+            try:
+                recreated = os.stat(self.path).st_ino != self._inode
+            except OSError:
+                recreated = True
+            if recreated:
+                # Ring was recreated (Space restart) - start over
+                self._map.close()
+                self._map = None
+                self.last_seq = 0
+                self.generation += 1
+
+        head = self.seq
+        if head == 0:
+            return []
+        first = max(self.last_seq + 1, head - self.slot_count + 1, 1)
+
+        records = []
+        for seq in range(first, head + 1):
+            offset = HEADER.size + ((seq - 1) % self.slot_count) * self.slot_size
+            slot_seq, length = SLOT_HEADER.unpack_from(self._map, offset)
+            data = self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + length]
+            # Skip slots overwritten while we were reading them
+            if slot_seq != seq or SEQ.unpack_from(self._map, offset)[0] != seq:
+                continue
+            try:
+                records.append(codec.loads(data))
+            except ValueError:
+                continue
+        self.last_seq = max(self.last_seq, head)
+        return records
+
+
+_ring = None
+
+
+def log_request(tool_name, args, result):
+    """Append one tool call to the shared ring (never raises)"""
+    global _ring
+    try:
+        if _ring is None:
+            _ring = RequestRing()
+        _ring.append({
+            'timestamp': datetime.now().isoformat(),
+            'tool': tool_name,
+            'args': str(args)[:100],
+            'result': str(result)[:100]
+        })
+    except Exception:
+        pass
@@ -0,0 +1,147 @@
+"""
+Result Cache - Recent answers to read-only browser queries
+
+Voice users repeat status questions ("check my email", "what's my
+Rankify rank") and every repeat costs a whole agent run in the extension.
+RESULT_CACHE_RULES says which commands only read, and for how long their
+answer stays good - a JSON list, or the path of a JSON file with one:
+
+    [{"pattern": "^(check|read) (my )?(email|inbox)", "ttl": 120},
+     {"pattern": "rankify rank", "ttl": 600}]
+
+Patterns are regular expressions searched in the normalized command
+(dedup.normalize_command); the first rule that matches decides.
+
+    - a matching command waits for the extension's answer (await mode,
+      unless the call says "wait": false) and a successful answer is kept
+      for the rule's ttl, per accessId; repeats get it back with its age:
+      "... [cached 42s ago]"
+    - at most RESULT_CACHE_MAX_ENTRIES answers, least recently used out
+    - a command that matches no rule may change what the queries would
+      see, so it drops its accessId's answers (RESULT_CACHE_INVALIDATE_ON_WRITE);
+      invalidate() and POST /cache/invalidate drop them explicitly
+
+Each worker keeps its own cache. No rules, no cache.
+"""
+
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import codec
+import metrics
+from dedup import normalize_command
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_RULES = os.getenv('RESULT_CACHE_RULES', '')
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '256'))
+# Commands no rule marks read-only drop the cached answers of their accessId
+RESULT_CACHE_INVALIDATE_ON_WRITE = os.getenv('RESULT_CACHE_INVALIDATE_ON_WRITE', 'true').lower() in ('1', 'true', 'yes')
+
+
+@dataclass(slots=True)
+class Rule:
+    pattern: str = ''
+    ttl: float = 60.0
+
+
+def load_rules(text=RESULT_CACHE_RULES):
+    """Rules in priority order ([] when unset)"""
+    if not text.strip():
+        return []
+    if not text.lstrip().startswith('['):
+        with open(text, 'rb') as f:
+            text = f.read()
+    entries = codec.loads(text)
+    if not isinstance(entries, list):
+        raise ValueError("RESULT_CACHE_RULES must be a JSON list")
+    rules = []
+    for entry in entries:
+        rule = codec.convert(entry, Rule)
+        if not rule.pattern or rule.ttl <= 0:
+            raise ValueError(f"RESULT_CACHE_RULES entries need a pattern and a positive ttl: {entry}")
+        try:
+            re.compile(rule.pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid RESULT_CACHE_RULES pattern {rule.pattern!r}: {e}") from None
+        rules.append(rule)
+    return rules
+
+
+class ResultCache:
+    def __init__(self, rules=None, max_entries=RESULT_CACHE_MAX_ENTRIES,
+                 invalidate_on_write=RESULT_CACHE_INVALIDATE_ON_WRITE):
+        self.rules = load_rules() if rules is None else rules
+        self._compiled = [(re.compile(rule.pattern), rule) for rule in self.rules]
+        self.max_entries = max_entries
+        self.invalidate_on_write = invalidate_on_write
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stored': 0, 'invalidated': 0}
+        self._entries = OrderedDict()  # (access_id, normalized command) -> (stored, expires, answer)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self):
+        return bool(self.rules)
+
+    def rule_for(self, command):
+        """The first rule marking this command read-only, or None"""
+        if not self._compiled:
+            return None
+        normalized = normalize_command(command)
+        for regex, rule in self._compiled:
+            if regex.search(normalized):
+                return rule
+        return None
+
+    def get(self, access_id, command):
+        """A fresh cached answer, marked with its age, or None"""
+        key = (access_id, normalize_command(command))
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or entry[1] <= now:
+            if entry is not None:
+                del self._entries[key]
+                self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            metrics.RESULT_CACHE_LOOKUPS.inc('miss')
+            return None
+        self._entries.move_to_end(key)
+        self.stats['hits'] += 1
+        metrics.RESULT_CACHE_LOOKUPS.inc('hit')
+        logger.info(f"RESULT CACHE HIT: '{command}'")
+        return f"{entry[2]} [cached {now - entry[0]:.0f}s ago]"
+
+    def put(self, access_id, command, answer, rule):
+        now = time.monotonic()
+        key = (access_id, normalize_command(command))
+        self._entries[key] = (now, now + rule.ttl, answer)
+        self._entries.move_to_end(key)
+        self.stats['stored'] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def written(self, access_id):
+        """A command that may change state ran for this accessId"""
+        if self.invalidate_on_write and self._entries:
+            self.invalidate(access_id=access_id)
+
+    def invalidate(self, pattern=None, access_id=None):
+        """Drop cached answers (of one accessId and / or matching a regex); returns how many"""
+        regex = re.compile(pattern) if pattern else None
+        doomed = [key for key in self._entries
+                  if (access_id is None or key[0] == access_id) and (regex is None or regex.search(key[1]))]
+        for key in doomed:
+            del self._entries[key]
+        if doomed:
+            self.stats['invalidated'] += len(doomed)
+            logger.info(f"RESULT CACHE INVALIDATED: {len(doomed)} answers")
+        return len(doomed)
+
+
+RESULT_CACHE = ResultCache()
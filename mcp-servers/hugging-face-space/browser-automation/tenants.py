@@ -0,0 +1,76 @@
+"""
+Tenants - Tuya projects served by one runtime
+
+TUYA_TENANTS holds a JSON list, or the path of a JSON file with one:
+
+    [{"name": "acme", "endpoint": "...", "access_id": "...", "access_secret": "...",
+      "toolsets": "device", "bridge_access_id": "acme_user"}]
+
+Each tenant gets its own Tuya connection, link status segment and MCP
+route (/mcp/<name>). Empty fields fall back to the process defaults
+(MCP_TOOLSETS, TUYA_ACCESS_ID, MCP_SERVER_URL). Without TUYA_TENANTS
+there is one tenant, 'default', built from MCP_ENDPOINT / MCP_ACCESS_ID /
+MCP_ACCESS_SECRET and served on /mcp.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+
+import codec
+from link_status import TUYA_STATUS_SHM
+
+TUYA_TENANTS = os.getenv('TUYA_TENANTS', '')
+DEFAULT = 'default'
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+@dataclass(slots=True)
+class Tenant:
+    name: str = DEFAULT
+    endpoint: str = ''
+    access_id: str = ''
+    access_secret: str = ''
+    toolsets: str = ''
+    bridge_access_id: str = ''
+    mcp_server_url: str = ''
+
+    def local_url(self, base):
+        """Local MCP endpoint the Tuya SDK forwards this tenant's calls to"""
+        if self.mcp_server_url:
+            return self.mcp_server_url
+        return base if self.name == DEFAULT else f"{base.rstrip('/')}/{self.name}"
+
+
+def status_path(name):
+    """Link status segment of one tenant; 'default' keeps TUYA_STATUS_SHM"""
+    return TUYA_STATUS_SHM if name == DEFAULT else f"{TUYA_STATUS_SHM}.{name}"
+
+
+def from_env():
+    return Tenant(
+        endpoint=os.getenv('MCP_ENDPOINT', ''),
+        access_id=os.getenv('MCP_ACCESS_ID', ''),
+        access_secret=os.getenv('MCP_ACCESS_SECRET', ''),
+    )
+
+
+def load(text=TUYA_TENANTS):
+    """name -> Tenant, in configuration order"""
+    if not text.strip():
+        return {DEFAULT: from_env()}
+    if not text.lstrip().startswith('['):
+        with open(text, 'rb') as f:
+            text = f.read()
+    entries = codec.loads(text)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("TUYA_TENANTS must be a non-empty JSON list")
+    tenants = {}
+    for entry in entries:
+        tenant = codec.convert(entry, Tenant)
+        if not NAME_PATTERN.match(tenant.name):
+            raise ValueError(f"Invalid tenant name: {tenant.name!r}")
+        if tenant.name in tenants:
+            raise ValueError(f"Duplicate tenant name: {tenant.name}")
+        tenants[tenant.name] = tenant
+    return tenants
@@ -1,121 +1,243 @@
 """
-Tuya Client - Persistent with Auto-Reconnect & Keepalive
+Tuya Client - Persistent with Auto-Reconnect & Heartbeat
+Runs standalone or as a task inside mcp_server.py (MCP_EMBED_TUYA=true)
+One event loop serves every tenant in TUYA_TENANTS (see tenants.py)
 """
 
 import asyncio
+import inspect
 import logging
 import os
-import json
-from datetime import datetime
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [TUYA] - %(message)s',
-    handlers=[
-        logging.FileHandler('/tmp/tuya_client.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-STATUS_FILE = '/tmp/tuya_status.json'
-
-def update_status(connected, message):
-    """Update status file"""
-    status = {
-        'connected': connected,
-        'message': message,
-        'timestamp': datetime.now().isoformat()
-    }
-    with open(STATUS_FILE, 'w') as f:
-        json.dump(status, f)
-
-async def keep_alive(client):
-    """Send keepalive pings every 30 seconds"""
-    try:
-        while True:
-            await asyncio.sleep(30)
-            logger.info("KEEPALIVE PING...")
-            # The connection stays alive just by running
-    except Exception as e:
-        logger.error(f"KEEPALIVE ERROR: {e}")
-
-async def connect_and_listen():
-    """Connect to Tuya with retry logic"""
-    
-    from mcp_sdk import MCPSdkClient
-    
-    TUYA_ENDPOINT = os.getenv('MCP_ENDPOINT')
-    TUYA_ACCESS_ID = os.getenv('MCP_ACCESS_ID')
-    TUYA_ACCESS_SECRET = os.getenv('MCP_ACCESS_SECRET')
-    MCP_SERVER_URL = "http://localhost:7860/mcp"
-    
-    logger.info(f"ENDPOINT: {TUYA_ENDPOINT}")
-    logger.info(f"ACCESS_ID: {TUYA_ACCESS_ID[:20]}..." if TUYA_ACCESS_ID else "NULL")
-    
-    if not all([TUYA_ENDPOINT, TUYA_ACCESS_ID, TUYA_ACCESS_SECRET]):
-        logger.error("MISSING CREDENTIALS!")
-        update_status(False, "MISSING CREDENTIALS")
-        raise Exception("Missing credentials")
-    
-    # Create client
-    logger.info("CREATING CLIENT...")
-    client = MCPSdkClient(
-        endpoint=TUYA_ENDPOINT,
-        access_id=TUYA_ACCESS_ID,
-        access_secret=TUYA_ACCESS_SECRET,
-        custom_mcp_server_endpoint=MCP_SERVER_URL
-    )
-    
-    # Connect
-    logger.info("CONNECTING...")
-    await client.connect()
-    
-    logger.info("CONNECTED!")
-    update_status(True, "CONNECTED TO TUYA")
-    
-    # Start keepalive task
-    keepalive_task = asyncio.create_task(keep_alive(client))
-    
-    # Listen
-    logger.info("LISTENING...")
-    try:
-        await client.start_listening()
-    finally:
-        keepalive_task.cancel()
+import time
 
-async def main_with_retry():
-    """Main loop with auto-reconnect"""
-    
-    retry_count = 0
-    max_retries = None  # Infinite retries
-    
-    while True:
+import httpx
+
+import log_pipeline
+import reconnect
+import tenants
+from link_status import LinkStatusWriter
+
+# Own pipeline (not the root logger) so the log file is the same when embedded
+logger = logging.getLogger('tuya_client')
+logger.propagate = False
+log_pipeline.setup(logger, '/tmp/tuya_client.log', 'TUYA')
+
+MCP_TOOLSETS = os.getenv('MCP_TOOLSETS', 'browser')
+
+HEARTBEAT_INTERVAL = float(os.getenv('TUYA_HEARTBEAT_INTERVAL', '15'))
+HEARTBEAT_TIMEOUT = float(os.getenv('TUYA_HEARTBEAT_TIMEOUT', '5'))
+HEARTBEAT_MAX_MISSES = int(os.getenv('TUYA_HEARTBEAT_MAX_MISSES', '2'))
+BACKOFF_BASE = float(os.getenv('TUYA_BACKOFF_BASE', '1'))
+BACKOFF_CAP = float(os.getenv('TUYA_BACKOFF_CAP', '60'))
+CIRCUIT_THRESHOLD = int(os.getenv('TUYA_CIRCUIT_THRESHOLD', '3'))
+CONNECT_SPREAD = float(os.getenv('TUYA_CONNECT_SPREAD', '5'))
+
+
+class TenantLog(logging.LoggerAdapter):
+    """Prefix lines with the tenant name (the default tenant logs as before)"""
+
+    def process(self, msg, kwargs):
+        return (msg if self.extra is None else f"[{self.extra}] {msg}"), kwargs
+
+
+class TuyaLink:
+    """
+    One tenant's Tuya connection: its own status segment, backoff and
+    circuit. Small on purpose - a VM can host hundreds of these.
+    """
+
+    __slots__ = ('tenant', 'log', 'status', 'backoff', 'circuit', 'down_since')
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.log = TenantLog(logger, None if tenant.name == tenants.DEFAULT else tenant.name)
+        self.status = LinkStatusWriter(tenants.status_path(tenant.name))
+        self.backoff = reconnect.DecorrelatedBackoff(BACKOFF_BASE, BACKOFF_CAP)
+        self.circuit = reconnect.Circuit(CIRCUIT_THRESHOLD)
+        self.down_since = None  # monotonic time the link was lost, for time-to-reconnect
+
+    def update_status(self, connected, message, state=None, **fields):
+        """Publish the link state to this tenant's status segment"""
+        state = state or ('connected' if connected else 'reconnecting')
+        self.status.update(connected=connected, message=message, state=state, **fields)
+
+    def on_beat(self, rtt):
+        self.backoff.reset()  # the link answers - the next drop starts from the base delay
+        self.log.debug(f"HEARTBEAT OK ({rtt * 1000:.0f}ms)")  # RTT lives in the status and metrics
+        self.status.update(last_heartbeat=time.time(), rtt_ms=round(rtt * 1000, 1))
+
+    def on_miss(self, misses, error):
+        self.log.warning(f"HEARTBEAT MISSED ({misses}/{HEARTBEAT_MAX_MISSES}): {error or 'timeout'}")
+        self.status.update(heartbeat_misses=self.status.state['heartbeat_misses'] + 1)
+
+    async def run_session(self, connect, listen, probe=None, close=None):
+        """One connection: connect, then listen until it ends or heartbeats stop (no probe: until it ends)"""
+        self.log.info("CONNECTING...")
+        self.update_status(False, "CONNECTING...", state='connecting', circuit=self.circuit.state)
         try:
-            logger.info("=" * 60)
-            logger.info("BROWSER AUTOMATION - TUYA CLIENT")
-            logger.info("=" * 60)
-            
-            # Try to connect
-            await connect_and_listen()
+            await connect()
+
+            self.circuit.success()
+            fields = {}
+            if self.down_since is not None:
+                fields = {'last_reconnect_seconds': round(time.monotonic() - self.down_since, 3),
+                          'connects': self.status.state['connects'] + 1}
+                self.log.info(f"RECONNECTED AFTER {fields['last_reconnect_seconds']:.1f}s")
+                self.down_since = None
+            self.log.info("CONNECTED!")
+            self.update_status(True, "CONNECTED TO TUYA", circuit=self.circuit.state, rtt_ms=None,
+                               last_heartbeat=time.time(), **fields)
+
+            self.log.info("LISTENING...")
+            if probe is None or HEARTBEAT_INTERVAL <= 0:
+                self.log.warning("HEARTBEAT OFF - A HALF-OPEN LINK IS ONLY NOTICED WHEN LISTENING ENDS")
+                await listen()
+                return
+            await reconnect.supervise(
+                listen(),
+                reconnect.heartbeat(probe, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, HEARTBEAT_MAX_MISSES,
+                                    on_beat=self.on_beat, on_miss=self.on_miss))
+        finally:
+            if close is not None:
+                try:
+                    await asyncio.wait_for(close(), HEARTBEAT_TIMEOUT)
+                except Exception as e:
+                    self.log.warning(f"CLOSE FAILED: {e}")
+
+    async def connect_and_listen(self):
+        """Connect to Tuya and listen until the connection ends"""
+        
+        from mcp_sdk import MCPSdkClient
+        
+        tenant = self.tenant
+        local_url = tenant.local_url(os.getenv('MCP_SERVER_URL', "http://localhost:7860/mcp"))
+        
+        self.log.info(f"ENDPOINT: {tenant.endpoint}")
+        self.log.info(f"ACCESS_ID: {tenant.access_id[:20]}..." if tenant.access_id else "NULL")
+        self.log.info(f"LOCAL MCP: {local_url}")
+        
+        if not all([tenant.endpoint, tenant.access_id, tenant.access_secret]):
+            self.log.error("MISSING CREDENTIALS!")
+            self.update_status(False, "MISSING CREDENTIALS", state='missing_credentials',
+                               last_error="Missing credentials")
+            raise Exception("Missing credentials")
+        
+        # Create client
+        self.log.info("CREATING CLIENT...")
+        client = MCPSdkClient(
+            endpoint=tenant.endpoint,
+            access_id=tenant.access_id,
+            access_secret=tenant.access_secret,
+            custom_mcp_server_endpoint=local_url
+        )
+        
+        close = getattr(client, 'disconnect', None) or getattr(client, 'close', None)
+        await self.run_session(client.connect, client.start_listening, sdk_probe(client, tenant.endpoint), close)
+
+    async def run(self, session=None):
+        """Main loop with auto-reconnect (decorrelated jitter + circuit breaker)"""
+        session = session or self.connect_and_listen
+        toolsets = self.tenant.toolsets or MCP_TOOLSETS
+        
+        while True:
+            self.log.info("=" * 60)
+            self.log.info(f"{toolsets.upper().replace(',', ' + ')} - TUYA CLIENT")
+            self.log.info("=" * 60)
             
-        except Exception as e:
-            retry_count += 1
-            logger.error(f"CONNECTION FAILED (attempt #{retry_count}): {e}")
-            update_status(False, f"RECONNECTING... (#{retry_count})")
+            self.circuit.attempt()
+            try:
+                await session()
+                self.log.warning("CONNECTION DROPPED! AUTO-RECONNECTING...")
+                error = "Connection dropped"
+            except reconnect.HalfOpenError as e:
+                self.log.warning(f"LINK HALF-OPEN: {e} - FORCING RECONNECT")
+                error = str(e)
+            except Exception as e:
+                self.log.error(f"CONNECTION FAILED (attempt #{self.circuit.failures + 1}): {e}")
+                error = str(e)
             
-            # Exponential backoff (max 60 seconds)
-            wait_time = min(2 ** min(retry_count, 6), 60)
-            logger.info(f"RETRYING IN {wait_time} SECONDS...")
+            if self.down_since is None:
+                self.down_since = time.monotonic()
+            self.circuit.failure()
+            wait_time = self.backoff.next()
+            self.log.info(f"RETRYING IN {wait_time:.1f} SECONDS... (CIRCUIT {self.circuit.state.upper()})")
+            self.update_status(False, f"RECONNECTING IN {wait_time:.1f}s (#{self.circuit.failures})",
+                               circuit=self.circuit.state, last_error=error, next_retry=time.time() + wait_time,
+                               reconnects=self.status.state['reconnects'] + 1)
             await asyncio.sleep(wait_time)
-            
-            logger.info("ATTEMPTING RECONNECT...")
-            
-        # If we get here, connection dropped - try to reconnect
-        logger.warning("CONNECTION DROPPED! AUTO-RECONNECTING...")
-        update_status(False, "CONNECTION DROPPED - RECONNECTING...")
-        await asyncio.sleep(2)
+            self.log.info("ATTEMPTING RECONNECT...")
+
+    async def supervised(self, delay=0.0):
+        """run() forever; a bug in one tenant's loop must not take the others down"""
+        await asyncio.sleep(delay)
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                self.log.exception(f"LINK LOOP CRASHED: {e}")
+                self.update_status(False, "LINK LOOP CRASHED - RESTARTING", last_error=str(e))
+                await asyncio.sleep(self.backoff.next())
+
+
+def sdk_probe(client, endpoint=None):
+    """
+    Liveness probe through the Tuya session itself: the SDK client's ping(),
+    answered by the gateway over the same connection, so a half-open socket
+    misses it (a websockets-style ping() hands back a pong waiter, which is
+    awaited too). A client without ping() falls back to an HTTP request to
+    the gateway `endpoint` - any answer counts - which notices a lost
+    network or gateway but not a half-open session. None if neither.
+    """
+    ping = getattr(client, 'ping', None)
+    if callable(ping):
+        async def probe():
+            waiter = ping()
+            while inspect.isawaitable(waiter):
+                waiter = await waiter
+        return probe
+    if not endpoint:
+        return None
+
+    async def probe():
+        try:
+            async with httpx.AsyncClient(timeout=HEARTBEAT_TIMEOUT) as http:
+                await http.head(endpoint)
+        except httpx.TransportError as e:
+            raise ConnectionError(f"{type(e).__name__}: {e}") from e
+    return probe
+
+
+def sdk_has_ping():
+    """Whether the installed MCPSdkClient has ping() (None if the SDK is missing)"""
+    try:
+        from mcp_sdk import MCPSdkClient
+    except ImportError:
+        return None
+    return callable(getattr(MCPSdkClient, 'ping', None))
+
+links = {}
+
+async def main_with_retry(configured=None):
+    """Run every tenant's link as its own supervised task in this event loop"""
+    configured = configured or tenants.load()
+    for name, tenant in configured.items():
+        links[name] = TuyaLink(tenant)
+    logger.info(f"TENANTS: {len(links)} ({', '.join(list(links)[:10])}{', ...' if len(links) > 10 else ''})")
+    if HEARTBEAT_INTERVAL <= 0:
+        logger.warning("HEARTBEAT OFF (TUYA_HEARTBEAT_INTERVAL=0) - A HALF-OPEN LINK IS ONLY NOTICED WHEN LISTENING ENDS")
+    elif sdk_has_ping() is False:
+        logger.warning("MCPSdkClient HAS NO ping() - HEARTBEAT PROBES THE GATEWAY OVER HTTP, "
+                       "WHICH DOES NOT NOTICE A HALF-OPEN SESSION")
+    
+    # Spread the first connects so hundreds of tenants don't dial in the same second
+    spread = CONNECT_SPREAD if len(links) > 1 else 0
+    tasks = [asyncio.create_task(link.supervised(spread * i / len(links)))
+             for i, link in enumerate(links.values())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
 
 if __name__ == "__main__":
-    update_status(False, "STARTING...")
     asyncio.run(main_with_retry())
@@ -1,42 +1,88 @@
 """
-Device Controller UI - Minimal Black & White Glass
+MCP Runtime UI - Minimal Black & White Glass
+One dashboard for whichever tool sets MCP_TOOLSETS enables
 """
 
 import streamlit as st
 import os
-import json
-
-STATUS_FILE = '/tmp/tuya_status.json'
-LOG_FILE = '/tmp/tuya_client.log'
-REQUESTS_FILE = '/tmp/mcp_requests.json'
-
-def read_tuya_status():
-    try:
-        with open(STATUS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return {'connected': False, 'message': 'INITIALIZING...'}
-
-def read_logs():
-    try:
-        with open(LOG_FILE, 'r') as f:
-            lines = f.readlines()
-            return ''.join(lines[-30:])
-    except:
-        return "No logs..."
+import threading
+from collections import deque
+
+import tenants
+from log_pipeline import to_text
+from link_status import LinkStatusReader
+from log_tail import LogTail
+from request_log import RequestRingReader
+from tools import runtime_title
+
+LOG_FILES = {'Tuya Log': '/tmp/tuya_client.log', 'MCP Server Log': '/tmp/mcp_server.log'}
+LOG_LINES = 30
+# Each panel re-checks its sources this often and rebuilds only when they changed
+DASHBOARD_REFRESH = float(os.getenv('DASHBOARD_REFRESH', '1'))
+
+class RequestFeed:
+    """Recent requests from the ring; only new slots are read on each tick"""
+
+    def __init__(self):
+        self.reader = RequestRingReader()
+        self.recent = deque(maxlen=50)
+        self.lock = threading.Lock()
+
+    def read(self):
+        with self.lock:
+            generation = self.reader.generation
+            new_requests = self.reader.read_new()
+            if self.reader.generation != generation:
+                self.recent.clear()
+            self.recent.extend(new_requests)
+            return list(self.recent), self.reader.last_seq
+
+# Shared by every viewer of the dashboard: one reader per source per process
+@st.cache_resource
+def sources():
+    return {
+        'status': LinkStatusReader(),
+        'tenants': {name: LinkStatusReader(tenants.status_path(name)) for name in tenants.load()},
+        'requests': RequestFeed(),
+        'logs': {label: LogTail(path, LOG_LINES) for label, path in LOG_FILES.items()},
+    }
 
-def read_requests():
-    try:
-        with open(REQUESTS_FILE, 'r') as f:
-            return json.load(f)
-    except:
-        return []
+# Where each panel's sources are at - cheap reads, compared on every tick
+def status_version():
+    src = sources()
+    return src['status'].seq, tuple(link.seq for link in src['tenants'].values()), src['requests'].reader.seq
+
+def requests_version():
+    return sources()['requests'].reader.seq
+
+def logs_version():
+    positions = []
+    for tail in sources()['logs'].values():
+        tail.read()  # follows the file only if inotify (or the stat fallback) saw a change
+        positions.append(tail.position)
+    return tuple(positions)
+
+def changed(key, version):
+    """True the first time and whenever version() moved since this viewer's panel last rendered"""
+    seen = version()
+    if st.session_state.get(key) == seen:
+        return False
+    st.session_state[key] = seen
+    return True
+
+def read_logs(label):
+    lines = sources()['logs'][label].read()
+    if not lines:
+        return "No logs..."
+    return '\n'.join(to_text(line) for line in lines)
 
 CLOUD_BRIDGE_URL = os.getenv('CLOUD_BRIDGE_URL')
 MCP_API_KEY = os.getenv('MCP_API_KEY')
+CREDENTIALS = os.getenv('MCP_ACCESS_ID') or tenants.TUYA_TENANTS
+TITLE = runtime_title()
 
 st.set_page_config(
-    page_title="Device Controller",
+    page_title=TITLE,
     page_icon="⬛",
     layout="wide",
     initial_sidebar_state="collapsed"
@@ -151,25 +197,43 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-st.markdown("<h1>Device Controller</h1>", unsafe_allow_html=True)
+st.markdown(f"<h1>{TITLE}</h1>", unsafe_allow_html=True)
 st.markdown("<p class='subtitle'>Tuya MCP Bridge</p>", unsafe_allow_html=True)
 
-tuya_status = read_tuya_status()
-requests = read_requests()
+# Each panel is its own fragment: a tick re-runs that panel only, and its
+# markup is rebuilt from the sources only when their version moved
 
-col1, col2 = st.columns(2)
+@st.fragment(run_every=DASHBOARD_REFRESH)
+def status_cards():
+    if changed('status_version', status_version):
+        st.session_state.status_html = status_html()
+    left, right = st.session_state.status_html
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown(left, unsafe_allow_html=True)
+    with col2:
+        st.markdown(right, unsafe_allow_html=True)
+
+def status_html():
+    tuya_status = sources()['status'].current() or {'connected': False, 'message': 'INITIALIZING...'}
+    _, total_requests = sources()['requests'].read()
 
-with col1:
-    st.markdown("<div class='glass'>", unsafe_allow_html=True)
-    
     mcp_status = 'Online'
-    
-    if tuya_status['connected']:
+
+    links = sources()['tenants']
+    if len(links) > 1:
+        connected = sum(1 for link in links.values() if (link.current() or {}).get('connected'))
+        tuya_status = {'connected': connected == len(links)}
+        tuya_display = f"{connected}/{len(links)} Connected"
+    elif tuya_status['connected']:
         tuya_display = 'Connected'
+        if tuya_status.get('rtt_ms') is not None:
+            tuya_display += f" ({tuya_status['rtt_ms']:.0f}ms)"
     else:
-        tuya_display = 'Disconnected'
-    
-    st.markdown(f"""
+        tuya_display = tuya_status.get('state', 'disconnected').replace('_', ' ').title()
+
+    left = f"""
+    <div class='glass'>
     <div class='status-row'>
         <span class='label'>MCP Server</span>
         <span class='value ok'>{mcp_status}</span>
@@ -178,50 +242,56 @@ with col1:
         <span class='label'>Tuya Client</span>
         <span class='value {"ok" if tuya_status["connected"] else "err"}'>{tuya_display}</span>
     </div>
-    """, unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)
-
-with col2:
-    st.markdown("<div class='glass'>", unsafe_allow_html=True)
-    
-    st.markdown(f"""
+    </div>
+    """
+    right = f"""
+    <div class='glass'>
     <div class='status-row'>
         <span class='label'>Cloud Bridge</span>
         <span class='value {"ok" if CLOUD_BRIDGE_URL else "err"}'>{'Set' if CLOUD_BRIDGE_URL else 'Not Set'}</span>
     </div>
     <div class='status-row'>
         <span class='label'>Credentials</span>
-        <span class='value {"ok" if os.getenv("MCP_ACCESS_ID") else "err"}'>{'Set' if os.getenv("MCP_ACCESS_ID") else 'Not Set'}</span>
+        <span class='value {"ok" if CREDENTIALS else "err"}'>{'Set' if CREDENTIALS else 'Not Set'}</span>
     </div>
     <div class='status-row'>
         <span class='label'>Requests</span>
-        <span class='value ok'>{len(requests)}</span>
+        <span class='value ok'>{total_requests}</span>
     </div>
-    """, unsafe_allow_html=True)
-    st.markdown("</div>", unsafe_allow_html=True)
-
-# Request Flow
-st.markdown("<div class='glass'>", unsafe_allow_html=True)
-st.markdown("<h3 style='font-size:1rem; font-weight:400; margin-bottom:12px;'>Request Flow</h3>", unsafe_allow_html=True)
+    </div>
+    """
+    return left, right
 
-if requests:
-    for req in reversed(requests[-5:]):
-        timestamp = req['timestamp'].split('T')[1][:8]
-        st.markdown(f"<div class='flow-item'>[{timestamp}] {req['tool']} → {req['result'][:60]}</div>", unsafe_allow_html=True)
-else:
-    st.markdown("<div style='color:rgba(255,255,255,0.3); text-align:center; padding:20px; font-size:0.875rem;'>Waiting for requests...</div>", unsafe_allow_html=True)
+@st.fragment(run_every=DASHBOARD_REFRESH)
+def request_flow():
+    if changed('requests_version', requests_version):
+        st.session_state.requests_html = request_flow_html()
+    st.markdown(st.session_state.requests_html, unsafe_allow_html=True)
 
-st.markdown("</div>", unsafe_allow_html=True)
+def request_flow_html():
+    requests, _ = sources()['requests'].read()
 
-# Logs
-st.markdown("<div class='glass'>", unsafe_allow_html=True)
-logs_text = read_logs()
-st.text_area("System Log", logs_text, height=250, label_visibility="visible")
-st.markdown("</div>", unsafe_allow_html=True)
+    html = ["<div class='glass'>",
+            "<h3 style='font-size:1rem; font-weight:400; margin-bottom:12px;'>Request Flow</h3>"]
+    if requests:
+        for req in reversed(requests[-5:]):
+            timestamp = req['timestamp'].split('T')[1][:8]
+            html.append(f"<div class='flow-item'>[{timestamp}] {req['tool']} → {req['result'][:60]}</div>")
+    else:
+        html.append("<div style='color:rgba(255,255,255,0.3); text-align:center; padding:20px; font-size:0.875rem;'>Waiting for requests...</div>")
+    html.append("</div>")
+    return '\n'.join(html)
 
-if st.button("Refresh", use_container_width=True):
-    st.rerun()
+@st.fragment(run_every=DASHBOARD_REFRESH)
+def log_panel():
+    if changed('logs_version', logs_version):
+        st.session_state.logs_text = {label: read_logs(label) for label in LOG_FILES}
+    st.markdown("<div class='glass'>", unsafe_allow_html=True)
+    for log_col, label in zip(st.columns(len(LOG_FILES)), LOG_FILES):
+        with log_col:
+            st.text_area(label, st.session_state.logs_text[label], height=250, label_visibility="visible")
+    st.markdown("</div>", unsafe_allow_html=True)
 
-import time
-time.sleep(5)
-st.rerun()
+status_cards()
+request_flow()
+log_panel()
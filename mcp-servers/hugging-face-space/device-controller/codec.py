@@ -0,0 +1,153 @@
+"""
+Codec - One JSON layer for every server file
+
+Uses orjson or msgspec when installed and falls back to the stdlib.
+MCP_JSON_CODEC=auto|orjson|msgspec|stdlib forces one (auto picks the
+fastest available). dumps() always returns bytes.
+
+Typed envelopes are plain dataclasses: msgspec decodes bytes straight
+into them, the fallback builds them from a decoded dict and checks the
+plain field types (str, bool, dict, Optional[...]) the same way.
+"""
+
+import dataclasses
+import json
+import os
+import typing
+from dataclasses import dataclass, field
+from typing import Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+MCP_JSON_CODEC = os.getenv('MCP_JSON_CODEC', 'auto').lower()
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _select(name):
+    if name in ('auto', 'orjson') and orjson is not None:
+        return 'orjson', orjson.loads, orjson.dumps
+    if name in ('auto', 'msgspec', 'orjson') and msgspec is not None:
+        decoder = msgspec.json.Decoder()
+        encoder = msgspec.json.Encoder()
+
+        def msgspec_loads(data):
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as e:
+                # Callers catch ValueError, like json/orjson decode errors
+                raise ValueError(str(e)) from None
+
+        return 'msgspec', msgspec_loads, encoder.encode
+    return 'stdlib', json.loads, _stdlib_dumps
+
+
+NAME, loads, dumps = _select(MCP_JSON_CODEC)
+
+
+def use(name):
+    """Switch codec at runtime (benchmarks compare them in one process)"""
+    global NAME, loads, dumps
+    NAME, loads, dumps = _select(name)
+    return NAME
+
+
+# ----------------------------------------------------------------------------
+# Typed envelopes
+# ----------------------------------------------------------------------------
+
+@dataclass
+class ToolCallParams:
+    """params of a tools/call request"""
+    name: str = ''
+    arguments: Optional[dict] = None  # null and absent both mean no arguments
+
+
+@dataclass
+class CommandArguments:
+    """arguments of the command-forwarding tools"""
+    command: str = ''
+    wait: Optional[bool] = None  # None = MCP_AWAIT_RESULTS
+
+
+@dataclass
+class ExecuteResult:
+    """Cloud Bridge /api/execute response body"""
+    success: bool = False
+    commandId: str = 'unknown'
+    message: str = ''
+    status: str = ''
+    error: str = ''
+
+
+def _accepts(kind, value):
+    """value fits the field type (types that are not plain classes pass)"""
+    if typing.get_origin(kind) is Union:
+        return any(_accepts(k, value) for k in typing.get_args(kind))
+    if kind is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return not isinstance(kind, type) or isinstance(value, kind)
+
+
+def _type_name(kind):
+    if typing.get_origin(kind) is Union:
+        return ' | '.join(_type_name(k) for k in typing.get_args(kind))
+    return {type(None): 'null', dict: 'object', list: 'array'}.get(kind, getattr(kind, '__name__', str(kind)))
+
+
+def _from_dict(cls, data):
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected an object for {cls.__name__}")
+    kwargs = {}
+    for f in dataclasses.fields(cls):
+        if f.name in data:
+            if not _accepts(f.type, data[f.name]):
+                raise ValueError(f"Expected `{_type_name(f.type)}` at `$.{f.name}`")
+            kwargs[f.name] = data[f.name]
+    return cls(**kwargs)
+
+
+def decode(data, cls):
+    """bytes -> typed envelope (unknown fields are ignored)"""
+    if msgspec is not None and NAME != 'stdlib':
+        try:
+            return msgspec.json.decode(data, type=cls)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            raise ValueError(str(e)) from None
+    return _from_dict(cls, loads(data))
+
+
+def convert(obj, cls):
+    """already-decoded dict -> typed envelope"""
+    if msgspec is not None and NAME != 'stdlib':
+        try:
+            return msgspec.convert(obj, type=cls)
+        except msgspec.ValidationError as e:
+            raise ValueError(str(e)) from None
+    return _from_dict(cls, obj)
+
+
+def dumps_within(record, limit, keep=120):
+    """dict -> JSON of at most `limit` bytes, shortening its string values until it fits
+
+    The strings are cut, never the encoded bytes, so the result always parses.
+    """
+    payload = dumps(record)
+    while len(payload) > limit and keep:
+        payload = dumps({k: v[:keep] if isinstance(v, str) else v for k, v in record.items()})
+        keep //= 2
+    if len(payload) > limit:
+        raise ValueError(f"record does not fit in {limit} bytes")
+    return payload
@@ -1,17 +1,23 @@
 #!/bin/bash
 # Entrypoint - ALL on same port 7860!
+# MCP_TOOLSETS picks the tools (browser, device or browser,device)
+
+export MCP_PORT=8860
+export MCP_SERVER_URL=http://localhost:8860/mcp
+export MCP_EMBED_TUYA=${MCP_EMBED_TUYA:-true}
 
 # 1. Start MCP server on port 8860 (different port!)
-echo "Starting MCP server on port 8860..."
-sed -i 's/port=7860/port=8860/g' /app/mcp_server.py
+#    Tuya client runs inside it unless MCP_EMBED_TUYA=false
+echo "Starting MCP server on port 8860 (tools: $MCP_TOOLSETS)..."
 python /app/mcp_server.py &
 sleep 3
 
-# 2. Start Tuya client (connects to localhost:8860)
-echo "Starting Tuya client..."
-sed -i 's/:7860\/mcp/:8860\/mcp/g' /app/tuya_client.py
-python /app/tuya_client.py &
-sleep 2
+# 2. Start Tuya client separately only when not embedded
+if [ "$MCP_EMBED_TUYA" != "true" ]; then
+    echo "Starting Tuya client..."
+    python /app/tuya_client.py &
+    sleep 2
+fi
 
 # 3. Start UI on port 7860 (HF default)
 echo "Starting UI on port 7860..."
@@ -0,0 +1,164 @@
+"""
+Intents - Simple device commands parsed without an LLM
+
+Most device phrases are one of a few forms. These are matched here by
+precompiled patterns and become a structured action:
+
+    "turn on the kitchen lights"         -> kitchen lights.power = on
+    "switch the fan off"                 -> fan.power = off
+    "set the AC to 22 degrees"           -> ac.temperature = 22 C
+    "set thermostat temperature to 70F"  -> thermostat.temperature = 70 F
+    "dim the bedroom lamp to 30%"        -> bedroom lamp.brightness = 30 %
+
+control_device sends the action with the command ("action": {"device",
+"property", "value", "unit"}), so whatever runs it can skip interpreting
+the text. Anything else - several devices, schedules ("at 7pm", "in 10
+minutes"), pronouns ("turn it off"), relative changes, values out of
+range - returns None and goes as text only, as before. A phrase without a
+verb ("lights off") counts only when it ends in a known device noun.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Optional, Union
+
+# Parse device commands into actions (false = send the text only)
+DEVICE_INTENTS = os.getenv('DEVICE_INTENTS', 'true').lower() in ('1', 'true', 'yes')
+
+BRIGHTNESS_RANGE = (0, 100)
+TEMPERATURE_RANGE = {'C': (5, 35), 'F': (40, 95)}
+
+# A device phrase with one of these words is more than a device name
+NOT_A_DEVICE = frozenset('and then or but after before when while if until unless every at for by minutes '
+                         'minute seconds second hours hour tomorrow tonight today morning evening night '
+                         'it that this them those these everything something anything '
+                         "is are was were be what which how why whether not don't dont never no keep leave "
+                         'still already also too again up down'.split())
+VERBS = frozenset('turn switch power shut set change adjust put make dim brighten'.split())
+# "set the AC to 22" / "set the lamp to 40": what the number means, from the device name
+CLIMATE_DEVICES = frozenset('ac a/c aircon air conditioner conditioning thermostat heater heating heat pump '
+                            'hvac climate'.split())
+LIGHT_DEVICES = frozenset('light lights lamp lamps bulb bulbs led leds'.split())
+# "lights off" has no verb: only taken as a command when the phrase ends in one of these
+DEVICE_NOUNS = LIGHT_DEVICES | CLIMATE_DEVICES | frozenset(
+    'fan fans tv tvs television socket sockets plug plugs outlet outlets switch strip purifier humidifier '
+    'dehumidifier speaker speakers radio kettle charger'.split())
+
+POLITE = re.compile(r"^(?:(?:hey|ok|okay|please|can you|could you|would you|will you)\b[ ,]*)+|(?:[ ,]+please)+$")
+
+_ART = r"(?:(?:the|my) )?"
+_DEVICE = r"(?P<device>[a-z][a-z0-9' -]{0,40}?)"
+_NUMBER = r"(?P<number>\d{1,3}(?:\.\d+)?)"
+_UNIT = r"(?P<unit> ?(?:%|percent|°c|°f|°|degrees? celsius|degrees? fahrenheit|degrees? [cf]|degrees?|celsius|fahrenheit|[cf]))?"
+_SET = r"(?P<verb>set|change|adjust|put|turn|make|dim|brighten)"
+
+PATTERNS = [
+    # turn on the lights / switch off fan
+    ('power', re.compile(rf"^(?:turn|switch|power|shut) (?P<state>on|off) {_ART}{_DEVICE}$")),
+    # turn the lights on / switch fan off
+    ('power', re.compile(rf"^(?:turn|switch|shut) {_ART}{_DEVICE} (?P<state>on|off)$")),
+    # lights off (known device nouns only: "hold on", "log off")
+    ('bare', re.compile(rf"^{_ART}{_DEVICE} (?P<state>on|off)$")),
+    # set the brightness of the lamp to 40%
+    ('level', re.compile(rf"^{_SET} (?:the )?(?P<property>temperature|brightness) (?:of|on|for|in) {_ART}{_DEVICE} "
+                         rf"(?:to|at) {_NUMBER}{_UNIT}$")),
+    # set the AC to 22 degrees / set lamp brightness to 40 / dim the lights to 30%
+    ('level', re.compile(rf"^{_SET} {_ART}{_DEVICE}(?: (?P<property>temperature|brightness))? (?:to|at) "
+                         rf"{_NUMBER}{_UNIT}$")),
+]
+
+
+@dataclass(slots=True)
+class Action:
+    device: str
+    property: str  # power | temperature | brightness
+    value: Union[bool, int, float]
+    unit: str = ''
+
+    def as_payload(self):
+        return {"device": self.device, "property": self.property, "value": self.value, "unit": self.unit}
+
+    def describe(self):
+        value = ('on' if self.value else 'off') if self.property == 'power' else f"{self.value:g}"
+        return f"{self.device}.{self.property} = {value}{' ' + self.unit if self.unit else ''}"
+
+
+def normalize(command):
+    """'  Please turn ON the lights! ' -> 'turn on the lights'"""
+    text = ' '.join(str(command).lower().split()).strip(' .!?')
+    return POLITE.sub('', text).strip(' ,')
+
+
+def _device(match):
+    device = match.group('device').strip(" -'")
+    words = device.split()
+    if not words or NOT_A_DEVICE.intersection(words):
+        return None
+    if words[0] in VERBS and not (words[0] == 'power' and len(words) > 1):  # "power strip" is a device
+        return None
+    return device
+
+
+def _unit_of(text):
+    """'%' / 'C' / 'F' / '' (degrees, scale not given) / None (no unit)"""
+    if not text:
+        return None
+    text = text.strip()
+    if text in ('%', 'percent'):
+        return '%'
+    if text.endswith(('f', 'fahrenheit')):
+        return 'F'
+    if text.endswith(('c', 'celsius')):
+        return 'C'
+    return ''
+
+
+def _level(match, device):
+    unit = _unit_of(match.group('unit'))
+    prop = match.group('property')
+    if prop is None:
+        if unit == '%' or match.group('verb') in ('dim', 'brighten'):
+            if not LIGHT_DEVICES.intersection(device.split()):
+                return None  # "brighten the room to 10": not one light to set
+            prop = 'brightness'
+        elif unit is not None or CLIMATE_DEVICES.intersection(device.split()):
+            prop = 'temperature'
+        elif LIGHT_DEVICES.intersection(device.split()):
+            prop = 'brightness'
+        else:
+            return None  # "set the fan to 3": speed? mode? leave it to the LLM
+    number = float(match.group('number'))
+    if prop == 'brightness':
+        if unit not in (None, '%') or not BRIGHTNESS_RANGE[0] <= number <= BRIGHTNESS_RANGE[1]:
+            return None
+        return Action(device, 'brightness', int(number) if number.is_integer() else number, '%')
+    if unit == '%':
+        return None
+    for scale in ([unit] if unit else TEMPERATURE_RANGE):  # no scale: the ranges don't overlap
+        low, high = TEMPERATURE_RANGE[scale]
+        if low <= number <= high:
+            unit = scale
+            break
+    else:
+        return None
+    return Action(device, 'temperature', int(number) if number.is_integer() else number, unit)
+
+
+def parse(command) -> Optional[Action]:
+    """The action a simple device command asks for, or None"""
+    text = normalize(command)
+    for kind, pattern in PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        device = _device(match)
+        if device is None or kind == 'bare' and device.split()[-1] not in DEVICE_NOUNS:
+            continue
+        if kind in ('power', 'bare'):
+            action = Action(device, 'power', match.group('state') == 'on')
+        else:
+            action = _level(match, device)
+        if action is not None:
+            return action
+    return None
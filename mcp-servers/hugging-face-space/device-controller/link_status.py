@@ -0,0 +1,197 @@
+"""
+Link Status - Tuya connection state shared between processes
+
+One small memory-mapped file written under a seqlock, like the request
+ring: the writer bumps `seq` to odd, writes the JSON payload, then bumps
+it back to even. Readers copy the payload and retry if `seq` moved, so a
+half-written status is never seen. Checking for a change is one 8-byte
+read, and watch() turns that into an async stream of updates.
+
+Layout (little endian):
+    magic(4s) version(I) seq(Q) length(I) pad(I) payload(PAYLOAD_SIZE)
+
+Fields: state, connected, message, pid, updated, last_heartbeat,
+reconnects, last_error, plus the heartbeat/backoff view: circuit, rtt_ms,
+heartbeat_misses, connects, last_reconnect_seconds, next_retry.
+There is exactly one writer (the Tuya client).
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import time
+
+import codec
+
+TUYA_STATUS_SHM = os.getenv('TUYA_STATUS_SHM', '/tmp/tuya_status.shm')
+
+MAGIC = b'TLNK'
+VERSION = 1
+HEADER = struct.Struct('<4sIQII')
+SEQ = struct.Struct('<Q')
+SEQ_OFFSET = 8
+LENGTH = struct.Struct('<I')
+LENGTH_OFFSET = 16
+PAYLOAD_SIZE = 1024
+SIZE = HEADER.size + PAYLOAD_SIZE
+
+
+class LinkStatusWriter:
+    """Writer side - owned by tuya_client"""
+
+    def __init__(self, path=TUYA_STATUS_SHM):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        seq = 0
+        if self._map[:4] == MAGIC:
+            # Keep counting from the previous writer so readers see a change
+            seq = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+            seq += seq & 1
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, seq, 0, 0)
+        self.state = {
+            'state': 'starting', 'connected': False, 'message': 'STARTING...',
+            'pid': os.getpid(), 'updated': time.time(), 'last_heartbeat': None,
+            'reconnects': 0, 'last_error': None,
+            'circuit': 'closed', 'rtt_ms': None, 'heartbeat_misses': 0,
+            'connects': 0, 'last_reconnect_seconds': None, 'next_retry': None,
+        }
+        self._subscribers = []
+        self._write()
+
+    def subscribe(self, callback):
+        """In-process listeners: callback(state) after every update"""
+        self._subscribers.append(callback)
+
+    def update(self, **fields):
+        self.state.update(fields, updated=time.time())
+        self._write()
+        for callback in self._subscribers:
+            callback(dict(self.state))
+
+    def heartbeat(self):
+        self.update(last_heartbeat=time.time())
+
+    def _write(self):
+        payload = codec.dumps_within(self.state, PAYLOAD_SIZE)
+        seq = SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+        SEQ.pack_into(self._map, SEQ_OFFSET, seq + 1)  # odd: write in progress
+        self._map[HEADER.size:HEADER.size + len(payload)] = payload
+        LENGTH.pack_into(self._map, LENGTH_OFFSET, len(payload))
+        SEQ.pack_into(self._map, SEQ_OFFSET, seq + 2)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, TypeError):
+        return True
+    return True
+
+
+class LinkStatusReader:
+    """Read-only view; read() only parses when the sequence number moved"""
+
+    def __init__(self, path=TUYA_STATUS_SHM):
+        self.path = path
+        self._map = None
+        self._inode = None
+        self._seq = None
+        self._status = None
+
+    def _open(self):
+        try:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._inode = os.fstat(f.fileno()).st_ino
+        except (OSError, ValueError):
+            return False
+        if len(self._map) < SIZE or self._map[:4] != MAGIC:
+            self._map.close()
+            self._map = None
+            return False
+        return True
+
+    @property
+    def seq(self):
+        if self._map is None and not self._open():
+            return 0
+        return SEQ.unpack_from(self._map, SEQ_OFFSET)[0]
+
+    def read(self):
+        """Latest status dict, or None before the Tuya client ever started"""
+        if self._map is not None and self._seq is not None and self.seq == self._seq:
+            return self._status
+        if self._map is not None:
+            try:
+                if os.stat(self.path).st_ino != self._inode:
+                    self._map.close()
+                    self._map = None
+            except OSError:
+                pass
+        for _ in range(100):
+            before = self.seq
+            if self._map is None:
+                return self._status
+            if before & 1:
+                continue
+            length = LENGTH.unpack_from(self._map, LENGTH_OFFSET)[0]
+            payload = self._map[HEADER.size:HEADER.size + min(length, PAYLOAD_SIZE)]
+            if self.seq != before:
+                continue
+            try:
+                self._status = codec.loads(payload)
+            except ValueError:
+                return self._status
+            self._seq = before
+            return self._status
+        return self._status
+
+    def current(self):
+        """Like read(), but a dead writer process reads as state 'stopped'"""
+        status = self.read()
+        if status is None:
+            return None
+        if not _pid_alive(status.get('pid')):
+            return {**status, 'state': 'stopped', 'connected': False, 'message': 'TUYA CLIENT NOT RUNNING'}
+        return status
+
+    async def watch(self, interval=0.05, recheck=1.0):
+        """
+        Yield the status every time it changes (one 8-byte read per tick).
+        Every `recheck` seconds the writer's pid is checked too, so a Tuya
+        client that died without writing shows up as 'stopped'.
+        """
+        async for _, status in watch_all({None: self}, interval, recheck):
+            yield status
+
+
+async def watch_all(readers, interval=0.05, recheck=1.0):
+    """
+    watch() for many segments from one loop: yields (key, status) for
+    whichever of `readers` (key -> LinkStatusReader) changed. Hundreds of
+    tenants cost one task and one 8-byte read each per tick.
+    """
+    last = {key: (None, None) for key in readers}
+    next_check = 0
+    while True:
+        now = time.monotonic()
+        pid_check = now >= next_check
+        if pid_check:
+            next_check = now + recheck
+        for key, reader in readers.items():
+            seq = reader.seq
+            last_seq, last_state = last[key]
+            if (seq != last_seq and not seq & 1) or pid_check:
+                status = reader.current()
+                if status is not None and (seq != last_seq or status['state'] != last_state):
+                    last[key] = (seq, status['state'])
+                    yield key, status
+        await asyncio.sleep(interval)
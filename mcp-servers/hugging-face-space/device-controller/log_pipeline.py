@@ -0,0 +1,194 @@
+"""
+Log Pipeline - Non-blocking logging for the async servers
+
+Loggers only hand records to a queue; a listener thread formats them and
+writes a rotating file (JSON lines by default) plus the console. That
+keeps disk and stderr I/O off the event loop. High-volume INFO lines
+are sampled by message prefix before they are even queued.
+
+    LOG_FORMAT=json|text        file format (console is always text)
+    LOG_MAX_BYTES / LOG_BACKUP_COUNT   size-based rotation
+    LOG_ROTATE_WHEN=midnight    time-based rotation instead (any
+                                TimedRotatingFileHandler `when`;
+                                single worker only)
+    LOG_SAMPLE="MCP REQUEST=0.1,DEDUP HIT=0.5"   keep 10% / 50%
+"""
+
+import atexit
+import fcntl
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+
+import codec
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '3'))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')
+LOG_SAMPLE = os.getenv('LOG_SAMPLE', 'MCP REQUEST=0.1,HTTP Request=0.1')
+
+
+def parse_sample_rules(text):
+    """'MCP REQUEST=0.1' -> [('MCP REQUEST', 10)] (keep one line in 10)"""
+    rules = []
+    for part in text.split(','):
+        prefix, _, rate = part.partition('=')
+        prefix = prefix.strip()
+        if not prefix:
+            continue
+        rate = float(rate or 1)
+        rules.append((prefix, max(round(1 / rate), 1) if rate > 0 else 0))
+    return rules
+
+
+class SampleFilter(logging.Filter):
+    """Keep 1 in N INFO-or-lower lines per message prefix (N=0 drops them all)"""
+
+    def __init__(self, rules):
+        super().__init__()
+        self.rules = rules
+        self.seen = {prefix: 0 for prefix, _ in rules}
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not isinstance(record.msg, str):
+            return True
+        for prefix, every in self.rules:
+            if record.msg.startswith(prefix):
+                if every == 0:
+                    return False
+                self.seen[prefix] += 1
+                return (self.seen[prefix] - 1) % every == 0
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, component):
+        super().__init__()
+        self.component = component
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'component': self.component,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return codec.dumps(entry).decode()
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue the record untouched - formatting happens on the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def text_formatter(component):
+    return logging.Formatter(f'%(asctime)s - [{component}] - %(message)s')
+
+
+class SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that several worker processes can share: every
+    write holds an flock on `<path>.lock`, and a worker whose file was
+    rotated away by another reopens it before writing.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._lock_file = None
+        self._inode = self._current_inode()
+
+    def _current_inode(self):
+        try:
+            return os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            return None
+
+    def emit(self, record):
+        try:
+            if self._lock_file is None:
+                # opened lazily like the stream: logging.config closes handlers, emit() reopens them
+                self._lock_file = open(self.baseFilename + '.lock', 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                if self.stream is not None and self._current_inode() != self._inode:
+                    self.stream.close()
+                    self.stream = None  # reopened by emit() below
+                if self.shouldRollover(record):
+                    self.doRollover()
+                logging.FileHandler.emit(self, record)
+                self._inode = self._current_inode()
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def file_handler(path):
+    if LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT)
+    return SharedRotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+
+
+_listeners = {}
+
+
+def setup(logger, path, component, level=logging.INFO, console=True):
+    """Route `logger` through a queue to `path` (rotated) and the console"""
+    if path in _listeners:
+        return _listeners[path]
+
+    target = file_handler(path)
+    target.setFormatter(JsonFormatter(component) if LOG_FORMAT == 'json' else text_formatter(component))
+    targets = [target]
+    if console:
+        stream = logging.StreamHandler()
+        stream.setFormatter(text_formatter(component))
+        targets.append(stream)
+
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    if LOG_SAMPLE:
+        handler.addFilter(SampleFilter(parse_sample_rules(LOG_SAMPLE)))
+    logger.setLevel(level)
+    logger.addHandler(handler)
+
+    listener = logging.handlers.QueueListener(records, *targets)
+    listener.start()
+    _listeners[path] = listener
+    return listener
+
+
+@atexit.register
+def shutdown():
+    """Flush whatever is still queued and stop every listener thread"""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+def to_text(line):
+    """One log file line -> 'time - [COMPONENT] - message' (JSON or text)"""
+    if not line.startswith('{'):
+        return line.rstrip('\n')
+    try:
+        entry = codec.loads(line)
+    except ValueError:
+        return line.rstrip('\n')
+    text = f"{entry.get('ts', '').replace('T', ' ')} - [{entry.get('component', '?')}] - {entry.get('msg', '')}"
+    if entry.get('exc'):
+        text += '\n' + entry['exc']
+    return text
@@ -0,0 +1,182 @@
+"""
+Log Tail - Last N lines of a growing log file at constant cost
+
+The first read seeks back from EOF one block at a time until it has N
+lines. After that only the bytes appended since the saved offset are
+read. On rotation (new inode) the rest of the old file is read through
+the open handle before following the new one; truncation (size < offset)
+starts over from the tail. On Linux an inotify watch tells us whether the
+file changed at all, so an idle log costs a single non-blocking read();
+elsewhere we fall back to os.stat().
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+from collections import deque
+
+BLOCK_SIZE = 8192
+# Never read more than this per refresh - a burst just resyncs from the tail
+MAX_CATCH_UP = 256 * 1024
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_MOVE_SELF = 0x800
+IN_DELETE_SELF = 0x400
+IN_IGNORED = 0x8000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT = struct.Struct('iIII')
+
+
+def _load_inotify():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_inotify()
+
+
+class FileWatch:
+    """inotify watch on one path; changed() is True when we must look again"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = -1
+        self.wd = -1
+        if _libc is not None:
+            self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+
+    @property
+    def available(self):
+        return self.fd >= 0
+
+    def arm(self):
+        """(Re)watch the path - after rotation it is a different file"""
+        if self.available:
+            self.wd = _libc.inotify_add_watch(self.fd, os.fsencode(self.path),
+                                              IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF)
+
+    def changed(self):
+        if not self.available or self.wd < 0:
+            return True
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return changed
+            changed = True
+            offset = 0
+            while offset < len(data):
+                _, mask, _, name_len = EVENT.unpack_from(data, offset)
+                if mask & (IN_MOVE_SELF | IN_DELETE_SELF | IN_IGNORED):
+                    self.wd = -1
+                offset += EVENT.size + name_len
+
+    def close(self):
+        if self.available:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def read_last_lines(f, size, count):
+    """Seek back from `size` until `count` complete lines are buffered"""
+    data = b''
+    position = size
+    while position > 0 and data.count(b'\n') <= count:
+        step = min(BLOCK_SIZE, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+    lines = data.split(b'\n')
+    if position > 0:
+        lines = lines[1:]  # first piece is the tail of an older line
+    return lines[-count - 1:]
+
+
+class LogTail:
+    def __init__(self, path, lines=30):
+        self.path = path
+        self.lines = deque(maxlen=lines)
+        self._file = None
+        self._inode = None
+        self._offset = 0
+        self._partial = b''
+        self._watch = FileWatch(path)
+        self._lock = threading.Lock()
+
+    def _open(self):
+        """Open whatever file is at `path` now; False if there is none yet"""
+        try:
+            f = open(self.path, 'rb')
+        except OSError:
+            return False
+        if self._file is not None:
+            self._file.close()
+        self._file = f
+        self._inode = os.fstat(f.fileno()).st_ino
+        self._offset = 0
+        self._watch.arm()
+        return True
+
+    def _load_tail(self, size):
+        self.lines.clear()
+        pieces = read_last_lines(self._file, size, self.lines.maxlen)
+        self._partial = pieces.pop() if pieces else b''
+        self.lines.extend(piece.decode('utf-8', 'replace') for piece in pieces)
+        self._offset = size
+
+    def _append(self, data):
+        pieces = (self._partial + data).split(b'\n')
+        self._partial = pieces.pop()
+        self.lines.extend(piece.decode('utf-8', 'replace') for piece in pieces)
+
+    def _follow(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return  # rotated away and not recreated yet - keep what we have
+        if stat.st_ino != self._inode:
+            # Rotated: finish the old file through our handle, then switch
+            self._file.seek(self._offset)
+            self._append(self._file.read(MAX_CATCH_UP))
+            if self._partial:
+                self._append(b'\n')
+            if not self._open():
+                return
+            stat = os.fstat(self._file.fileno())
+        if stat.st_size < self._offset or stat.st_size - self._offset > MAX_CATCH_UP:
+            # Truncated in place, or too far behind to be worth reading
+            self._load_tail(stat.st_size)
+        elif stat.st_size > self._offset:
+            self._file.seek(self._offset)
+            self._append(self._file.read(stat.st_size - self._offset))
+            self._offset = stat.st_size
+
+    def read(self):
+        """Current last N lines (oldest first); cheap when nothing changed"""
+        with self._lock:
+            if self._file is None:
+                if self._open():
+                    self._load_tail(os.fstat(self._file.fileno()).st_size)
+            elif self._watch.changed():
+                self._follow()
+            return list(self.lines)
+
+    @property
+    def position(self):
+        """(inode, offset) read up to - moves whenever read() picked up something new"""
+        return self._inode, self._offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._watch.close()
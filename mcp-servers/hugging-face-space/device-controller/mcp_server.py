@@ -1,193 +1,514 @@
 """
-MCP Server - Device Controller
+MCP Server - HTTP endpoint for Tuya SDK
 Implements full MCP protocol
+
+One runtime for every tool set: MCP_TOOLSETS=browser, device or
+browser,device. With MCP_EMBED_TUYA=true the Tuya client runs as a task
+in this process instead of as a separate one. Each tenant in
+TUYA_TENANTS is served on /mcp/<name> with its own tool sets, Cloud
+Bridge accessId and Tuya link; /mcp serves the default tenant.
+
+MCP_WORKERS=N runs N uvicorn worker processes (uvloop / httptools when
+installed). Sessions and dedup then live in a SharedState SQLite file,
+metrics are merged from per-worker snapshots, and one worker - whichever
+holds /tmp/mcp_tuya.lock - watches the Tuya link and runs the embedded
+Tuya client.
 """
 
+import asyncio
+import contextvars
+import fcntl
+import functools
+import importlib.util
 import logging
 import os
-import httpx
-import json
-from datetime import datetime
+import re
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import uvicorn
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [MCP-SERVER] - %(message)s',
-    handlers=[
-        logging.FileHandler('/tmp/mcp_server.log'),
-        logging.StreamHandler()
-    ]
-)
+import bridge_client
+import codec
+import log_pipeline
+import metrics
+import tenants
+import tools
+from admission import ADMISSION, Overloaded
+from codec import ToolCallParams
+from dedup import CommandDedup
+from outbox import OUTBOX, OUTBOX_ENABLED
+from result_stream import MCP_AWAIT_RESULTS, RESULTS
+from link_status import LinkStatusReader, watch_all
+from shared_state import SharedState
+from streamable_http import SESSION_HEADER, SessionStore, bind_session, stream_responses, wants_sse
+from tools import MCP_TOOLSETS, RESULT_CACHE, TUYA_ACCESS_ID, cache_served, load_tools, parse_toolsets, runtime_title
+
+log_pipeline.setup(logging.getLogger(), '/tmp/mcp_server.log', 'MCP-SERVER')
 logger = logging.getLogger(__name__)
 
-REQUESTS_FILE = '/tmp/mcp_requests.json'
+MCP_API_KEY = os.getenv('MCP_API_KEY')
+MCP_PORT = int(os.getenv('MCP_PORT', '7860'))
+MCP_EMBED_TUYA = os.getenv('MCP_EMBED_TUYA', 'false').lower() in ('1', 'true', 'yes')
+MCP_WORKERS = max(int(os.getenv('MCP_WORKERS', '1')), 1)
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/mcp_metrics') if MCP_WORKERS > 1 else None
+LEADER_LOCK = '/tmp/mcp_tuya.lock'
+# What tools/call does while the Tuya link is down: ignore | annotate | fail
+TUYA_LINK_POLICY = os.getenv('TUYA_LINK_POLICY', 'annotate').lower()
 
-def log_request(tool_name, args, result):
-    try:
-        requests = []
+SERVER_NAME = runtime_title()
+TENANTS = tenants.load()
+
+@asynccontextmanager
+async def lifespan(app):
+    """Shared bridge pool, outbox drainer, result stream, loop-lag probe, metrics export, plus the Tuya tasks on the leader worker"""
+    async with bridge_client.lifespan(app):
+        tasks = [asyncio.create_task(metrics.watch_event_loop()), asyncio.create_task(lead())]
+        if METRICS_DIR:
+            tasks.append(asyncio.create_task(metrics.export_periodically(METRICS_DIR, before=refresh_metrics)))
+        if OUTBOX_ENABLED:
+            OUTBOX.ensure_draining()  # also delivers whatever a previous run left behind
+        if MCP_AWAIT_RESULTS:
+            for access_id in {runtime.access_id for runtime in RUNTIMES.values()}:
+                RESULTS.ensure_running(access_id)  # otherwise opened by the first call that waits
         try:
-            with open(REQUESTS_FILE, 'r') as f:
-                requests = json.load(f)
-        except:
-            pass
-        
-        requests.append({
-            'timestamp': datetime.now().isoformat(),
-            'tool': tool_name,
-            'args': str(args)[:100],
-            'result': str(result)[:100]
-        })
-        
-        with open(REQUESTS_FILE, 'w') as f:
-            json.dump(requests[-50:], f)
-    except:
-        pass
-
-CLOUD_BRIDGE_URL = os.getenv('CLOUD_BRIDGE_URL')
-MCP_API_KEY = os.getenv('MCP_API_KEY')
-TUYA_ACCESS_ID = os.getenv('TUYA_ACCESS_ID', 'tuya_mcp_user')
+            yield
+        finally:
+            for task in tasks:
+                task.cancel()
+            await OUTBOX.stop()
+            await RESULTS.stop()
+
+async def lead():
+    """Tuya link watcher (+ embedded Tuya client) - in exactly one worker"""
+    if MCP_WORKERS > 1:
+        lock = open(LEADER_LOCK, 'a')
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(1)  # the leader holds it until its process exits
+        logger.info(f"WORKER {os.getpid()}: RUNNING THE TUYA TASKS")
+    tasks = [asyncio.create_task(watch_tuya_link())]
+    if MCP_EMBED_TUYA:
+        import tuya_client
+        os.environ.setdefault('MCP_SERVER_URL', f"http://localhost:{MCP_PORT}/mcp")
+        tasks.append(asyncio.create_task(tuya_client.main_with_retry(TENANTS)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+app = FastAPI(lifespan=lifespan)
+shared = SharedState() if MCP_WORKERS > 1 else None
+dedup = CommandDedup(shared=shared)
+sessions = SessionStore(shared=shared)
+
+DEDUP_RESULTS = metrics.Counter('mcp_dedup_total', "Dedup lookups by result", ('result',))
+SESSIONS = metrics.Gauge('mcp_sessions', "Open Streamable HTTP sessions")
+
+async def watch_tuya_link():
+    """Log Tuya link transitions and keep their metrics current (all tenants, one loop)"""
+    previous = {}
+    async for name, status in watch_all({name: runtime.link for name, runtime in RUNTIMES.items()}):
+        before = previous.get(name, {})
+        metrics.TUYA_CONNECTED.set(name, value=1 if status['connected'] else 0)
+        metrics.TUYA_RECONNECTS.set_total(name, value=status.get('reconnects', 0))
+        metrics.TUYA_HEARTBEAT_MISSES.set_total(name, value=status.get('heartbeat_misses', 0))
+        for state in ('closed', 'open', 'half_open'):
+            metrics.TUYA_CIRCUIT.set(name, state, value=1 if status.get('circuit', 'closed') == state else 0)
+        if status.get('rtt_ms') is not None and status.get('last_heartbeat') != before.get('last_heartbeat'):
+            metrics.TUYA_HEARTBEAT_RTT.observe(status['rtt_ms'] / 1000)
+        if status.get('connects', 0) > before.get('connects', 0) and status.get('last_reconnect_seconds') is not None:
+            metrics.TUYA_RECONNECT_DURATION.observe(status['last_reconnect_seconds'])
+        if (status['state'], status.get('message')) != (before.get('state'), before.get('message')):
+            prefix = '' if name == tenants.DEFAULT else f"[{name}] "
+            logger.info(f"{prefix}TUYA LINK: {status['state'].upper()} - {status.get('message')}")
+        previous[name] = status
+
+def tuya_link_down(runtime=None):
+    """The link status when the tenant's Tuya client is known to be down, else None"""
+    if TUYA_LINK_POLICY == 'ignore':
+        return None
+    status = (runtime or DEFAULT_RUNTIME).link.current()
+    if status is None or status['connected']:
+        return None
+    return status
+
+class Prebuilt:
+    """A JSON-RPC result serialized once; only the request id is spliced in"""
+
+    def __init__(self, result):
+        self.tail = b',"result":' + codec.dumps(result) + b'}'
+
+    def splice(self, request_id):
+        return b'{"jsonrpc":"2.0","id":' + encode_id(request_id) + self.tail
+
+def encode_id(request_id):
+    if type(request_id) is int:
+        return str(request_id).encode()
+    return codec.dumps(request_id)
 
-app = FastAPI()
+def tool_result(request_id, text):
+    """tools/call result envelope, written straight to bytes"""
+    return (b'{"jsonrpc":"2.0","id":' + encode_id(request_id) +
+            b',"result":{"content":[{"type":"text","text":' + codec.dumps(text) + b'}]}}')
 
-async def control_device_impl(command: str) -> str:
-    logger.info(f"TOOL: control_device('{command}')")
+EMPTY_RESULT = Prebuilt({})
+
+@functools.lru_cache(maxsize=None)
+def toolset_runtime(toolsets):
+    """
+    Tools plus the static parts of the handshake/discovery path for one
+    tool-set combination - the Tuya SDK re-runs these on every reconnect,
+    so they are built once here and shared by every tenant using them
+    """
+    loaded = load_tools(list(toolsets))
+    initialize = Prebuilt({
+        "protocolVersion": "2025-11-25",
+        "capabilities": {
+            "logging": {},
+            "tools": {}
+        },
+        "serverInfo": {
+            "name": runtime_title(toolsets),
+            "version": "1.0.0"
+        }
+    })
+    return loaded, initialize, Prebuilt({"tools": [tool.schema() for tool in loaded.values()]})
+
+class Runtime:
+    """What one MCP route serves: a tenant's tools, Cloud Bridge accessId and Tuya link"""
+
+    __slots__ = ('name', 'toolsets', 'tools', 'initialize', 'tools_list', 'access_id', 'link')
+
+    def __init__(self, tenant):
+        self.name = tenant.name
+        self.toolsets = tuple(parse_toolsets(tenant.toolsets) or MCP_TOOLSETS)
+        self.tools, self.initialize, self.tools_list = toolset_runtime(self.toolsets)
+        self.access_id = tenant.bridge_access_id or TUYA_ACCESS_ID
+        self.link = LinkStatusReader(tenants.status_path(tenant.name))
+
+RUNTIMES = {name: Runtime(tenant) for name, tenant in TENANTS.items()}
+DEFAULT_RUNTIME = RUNTIMES.get(tenants.DEFAULT) or Runtime(tenants.Tenant())
+TOOLS = DEFAULT_RUNTIME.tools
+_runtime = contextvars.ContextVar('runtime', default=DEFAULT_RUNTIME)
+# Some route serves the browser tool set, which uses the result cache
+RESULT_CACHE_ON = any(cache_served(runtime.toolsets) for runtime in (DEFAULT_RUNTIME, *RUNTIMES.values()))
+
+METHODS = {}
+
+def rpc_method(name):
+    """Register a JSON-RPC method handler: handler(request_id, params)"""
+    def register(handler):
+        METHODS[name] = handler
+        return handler
+    return register
+
+@rpc_method('initialize')
+async def initialize(request_id, params):
+    return _runtime.get().initialize.splice(request_id)
+
+@rpc_method('ping')
+async def ping(request_id, params):
+    return EMPTY_RESULT.splice(request_id)
+
+@rpc_method('logging/setLevel')
+async def logging_set_level(request_id, params):
+    # Late results are the only log messages sent, and each is sent at any level
+    return EMPTY_RESULT.splice(request_id)
+
+@rpc_method('tools/list')
+async def tools_list(request_id, params):
+    return _runtime.get().tools_list.splice(request_id)
+
+@rpc_method('tools/call')
+async def tools_call(request_id, params):
+    try:
+        call = codec.convert(params, ToolCallParams)
+    except ValueError as e:
+        return rpc_error(request_id, -32602, f"Invalid params: {e}")
+    runtime = _runtime.get()
     
+    tool = runtime.tools.get(call.name)
+    if tool is None:
+        logger.warning(f"Unknown tool: {call.name}")
+        return rpc_error(request_id, -32602, f"Unknown tool: {call.name}")
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{CLOUD_BRIDGE_URL}/api/execute",
-                json={
-                    "userId": "tuya_ai",
-                    "apiKey": MCP_API_KEY,
-                    "accessId": TUYA_ACCESS_ID,
-                    "command": command,
-                    "type": "device_control"
-                },
-                timeout=15.0
+        arguments = tool.parse(call.arguments or {})
+    except ValueError as e:
+        return rpc_error(request_id, -32602, f"Invalid arguments for {call.name}: {e}")
+    
+    down = tuya_link_down(runtime)
+    if down is not None and TUYA_LINK_POLICY == 'fail':
+        return rpc_error(request_id, -32002, f"Tuya link {down['state']}: {down['message']}")
+    
+    try:
+        result = await call_tool(tool, arguments)
+    except Overloaded as e:
+        return rpc_error(request_id, -32003, str(e), {"reason": e.reason, "retryAfter": round(e.retry_after, 3)})
+    if down is not None:
+        result = f"{result} [Tuya link {down['state']}: {down['message']}]"
+    return tool_result(request_id, result)
+
+async def call_tool(tool, arguments):
+    """Run a tool on its parsed arguments, sharing identical in-flight/recent calls when allowed"""
+    metrics.TOOLS_IN_FLIGHT.inc(tool.name)
+    started = time.perf_counter()
+    outcome = 'exception'
+    try:
+        if not tool.dedup:
+            result = await tool.handler(arguments)
+        else:
+            # A waiting call must not be answered with a "queued" reply, nor the other way round;
+            # wait=None means the MCP_AWAIT_RESULTS default
+            wait = MCP_AWAIT_RESULTS if arguments.wait is None else arguments.wait
+            command = arguments.command + (' [wait]' if wait else '')
+            result = await dedup.run(
+                tool.name, tools.bridge_access_id.get(), command,
+                lambda: tool.handler(arguments),
+                cacheable=lambda r: r.startswith('OK')
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                command_id = result.get('commandId', 'unknown')
-                logger.info(f"SUCCESS: ID {command_id}")
-                
-                result_msg = f"OK: {command} (ID:{command_id})"
-                log_request('control_device', {'command': command}, result_msg)
-                return result_msg
-            else:
-                logger.error(f"FAILED: {response.status_code}")
-                error_msg = f"ERROR: {response.text}"
-                log_request('control_device', {'command': command}, error_msg)
-                return error_msg
-                
+        outcome = 'ok' if result.startswith('OK') else 'error'
+        return result
+    except Overloaded:
+        outcome = 'overloaded'
+        raise
+    finally:
+        metrics.TOOLS_IN_FLIGHT.dec(tool.name)
+        metrics.TOOL_DURATION.observe(time.perf_counter() - started, tool.name)
+        metrics.TOOL_CALLS.inc(tool.name, outcome)
+
+def rpc_error(request_id, code, message, data=None):
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": error
+    }
+
+async def handle_message(data, runtime=None):
+    """Handle one JSON-RPC message; returns None for notifications"""
+    if runtime is not None:
+        # Each message runs in its own task, so this stays per request
+        _runtime.set(runtime)
+        tools.bridge_access_id.set(runtime.access_id)
+    
+    if not isinstance(data, dict) or not isinstance(data.get('method'), str):
+        return rpc_error(data.get('id') if isinstance(data, dict) else None, -32600, "Invalid Request")
+    
+    method = data['method']
+    request_id = data.get('id')
+    
+    logger.info(f"MCP REQUEST: {method}")
+    
+    # Client notifications (e.g. notifications/initialized) need no handling
+    if method.startswith('notifications/'):
+        return None
+    
+    try:
+        response = await dispatch(method, request_id, data)
     except Exception as e:
-        logger.error(f"EXCEPTION: {e}")
-        error_msg = f"ERROR: {str(e)}"
-        log_request('control_device', {'command': command}, error_msg)
-        return error_msg
+        logger.error(f"ERROR: {e}")
+        response = rpc_error(request_id, -32603, str(e))
+    
+    # Unknown method names share one label so clients can't blow up cardinality
+    label = method if method in METHODS else 'unknown'
+    metrics.MCP_REQUESTS.inc(label, 'error' if isinstance(response, dict) and 'error' in response else 'ok')
+    
+    # Notifications (no id) still run, but never get a response
+    return response if 'id' in data else None
+
+async def dispatch(method, request_id, data):
+    """Route a JSON-RPC request to its handler"""
+    handler = METHODS.get(method)
+    if handler is None:
+        logger.warning(f"Unknown method: {method}")
+        return rpc_error(request_id, -32601, f"Method not found: {method}")
+    params = data.get('params')
+    return await handler(request_id, params if isinstance(params, dict) else {})
+
+def encode(response):
+    """Pre-serialized responses are already bytes; everything else is a dict"""
+    if isinstance(response, bytes):
+        return response
+    return codec.dumps(response)
+
+def json_body(responses, is_batch, headers):
+    if is_batch:
+        body = b'[' + b','.join(encode(r) for r in responses) + b']'
+    else:
+        body = encode(responses[0])
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def runtime_for(tenant):
+    """Runtime for a /mcp/<tenant> route (None -> default), or None if unknown"""
+    return DEFAULT_RUNTIME if tenant is None else RUNTIMES.get(tenant)
+
+def unknown_tenant(tenant):
+    return JSONResponse(rpc_error(None, -32004, f"Unknown tenant: {tenant}"), status_code=404)
 
 @app.post("/mcp")
-async def mcp_endpoint(request: Request):
-    """Handle MCP protocol"""
+@app.post("/mcp/{tenant}")
+async def mcp_endpoint(request: Request, tenant: str = None):
+    """Handle MCP protocol requests (single message or JSON-RPC batch)"""
+    runtime = runtime_for(tenant)
+    if runtime is None:
+        return unknown_tenant(tenant)
+    handle = functools.partial(handle_message, runtime=runtime)
+    
+    session_id = request.headers.get(SESSION_HEADER)
+    session = sessions.get(session_id) if session_id else None
+    if session_id and session is None:
+        return JSONResponse(rpc_error(None, -32001, "Session not found"), status_code=404)
+    
     try:
-        data = await request.json()
-        method = data.get('method')
-        request_id = data.get('id')
-        
-        logger.info(f"MCP REQUEST: {method}")
-        
-        if method == 'initialize':
-            return JSONResponse({
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "protocolVersion": "2025-11-25",
-                    "capabilities": {"tools": {}},
-                    "serverInfo": {
-                        "name": "Device Controller",
-                        "version": "1.0.0"
-                    }
-                }
-            })
-        
-        elif method == 'tools/list':
-            return JSONResponse({
-                "jsonrpc": "2.0",
-                "id": request_id,
-                "result": {
-                    "tools": [
-                        {
-                            "name": "control_device",
-                            "description": "Control smart devices",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "command": {"type": "string", "description": "Device command"}
-                                },
-                                "required": ["command"]
-                            }
-                        },
-                        {
-                            "name": "health_check",
-                            "description": "Health check",
-                            "inputSchema": {"type": "object", "properties": {}}
-                        }
-                    ]
-                }
-            })
-        
-        elif method == 'tools/call':
-            tool_name = data.get('params', {}).get('name')
-            arguments = data.get('params', {}).get('arguments', {})
-            
-            if tool_name == 'control_device':
-                command = arguments.get('command', '')
-                result = await control_device_impl(command)
-                return JSONResponse({
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": result}]
-                    }
-                })
-            
-            elif tool_name == 'health_check':
-                return JSONResponse({
-                    "jsonrpc": "2.0",
-                    "id": request_id,
-                    "result": {
-                        "content": [{"type": "text", "text": "OK: Device Controller is healthy!"}]
-                    }
-                })
-        
-        logger.warning(f"Unknown method: {method}")
-        return JSONResponse({
-            "jsonrpc": "2.0",
-            "id": request_id,
-            "error": {"code": -32601, "message": f"Method not found: {method}"}
-        })
-        
+        data = codec.loads(await request.body())
     except Exception as e:
-        logger.error(f"ERROR: {e}")
-        return JSONResponse({
-            "jsonrpc": "2.0",
-            "id": data.get('id') if 'data' in locals() else None,
-            "error": {"code": -32603, "message": str(e)}
-        })
+        logger.error(f"PARSE ERROR: {e}")
+        return JSONResponse(rpc_error(None, -32700, "Parse error"))
+    
+    # Batch: every item runs concurrently, responses come back in one body
+    is_batch = isinstance(data, list)
+    messages = data if is_batch else [data]
+    if not messages:
+        return JSONResponse(rpc_error(None, -32600, "Invalid Request"))
+    if is_batch:
+        logger.info(f"MCP BATCH: {len(messages)} messages")
+    
+    # initialize starts a new session; its id goes back in a header
+    headers = {}
+    if any(isinstance(m, dict) and m.get('method') == 'initialize' for m in messages):
+        session = sessions.create()
+        session_id = session.id
+    if session_id:
+        headers['Mcp-Session-Id'] = session_id
+    bind_session(session)  # where a late tool result is sent
+    
+    has_requests = any(isinstance(m, dict) and 'id' in m for m in messages)
+    if has_requests and wants_sse(request):
+        return StreamingResponse(
+            stream_responses(messages, handle),
+            media_type="text/event-stream",
+            headers={**headers, "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    responses = await asyncio.gather(*(handle(item) for item in messages))
+    responses = [r for r in responses if r is not None]
+    if not responses:
+        return Response(status_code=202, headers=headers)
+    return json_body(responses, is_batch, headers)
+
+@app.get("/mcp")
+@app.get("/mcp/{tenant}")
+async def mcp_stream(request: Request, tenant: str = None):
+    """Server-initiated messages for one session, as an SSE stream"""
+    if runtime_for(tenant) is None:
+        return unknown_tenant(tenant)
+    if not wants_sse(request):
+        return Response(status_code=405)
+    session = sessions.get(request.headers.get(SESSION_HEADER, ''))
+    if session is None:
+        return JSONResponse(rpc_error(None, -32001, "Session not found"), status_code=404)
+    return StreamingResponse(
+        session.listen(request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/mcp")
+@app.delete("/mcp/{tenant}")
+async def mcp_close(request: Request, tenant: str = None):
+    """Client ends its session"""
+    if runtime_for(tenant) is None:
+        return unknown_tenant(tenant)
+    if not sessions.close(request.headers.get(SESSION_HEADER, '')):
+        return Response(status_code=404)
+    return Response(status_code=204)
+
+def refresh_metrics():
+    """Values that are only copied into metrics at scrape / snapshot time"""
+    for result, count in dedup.stats.items():
+        DEDUP_RESULTS.set_total(result, value=count)
+    SESSIONS.set(value=len(sessions))
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape target (every worker's series when MCP_WORKERS > 1)"""
+    refresh_metrics()
+    return Response(content=metrics.render(METRICS_DIR), media_type=metrics.CONTENT_TYPE)
+
+@app.post("/cache/invalidate")
+async def cache_invalidate(request: Request, pattern: str = None, accessId: str = None):
+    """Drop cached query answers (this worker's): all, one accessId's and / or those matching a regex"""
+    if MCP_API_KEY and request.headers.get('authorization') != f"Bearer {MCP_API_KEY}":
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+    if not RESULT_CACHE_ON:
+        return JSONResponse({"error": "No result cache in this runtime"}, status_code=404)
+    try:
+        dropped = RESULT_CACHE.invalidate(pattern, accessId)
+    except re.error as e:
+        return JSONResponse({"error": f"Invalid pattern: {e}"}, status_code=400)
+    return {"invalidated": dropped, "entries": len(RESULT_CACHE)}
+
+@app.get("/outbox/{local_id}")
+async def outbox_status(local_id: str, request: Request):
+    """Delivery state of a command acknowledged with an outbox id (ID:local_...)"""
+    if MCP_API_KEY and request.headers.get('authorization') != f"Bearer {MCP_API_KEY}":
+        return JSONResponse({"error": "Unauthorized"}, status_code=401)
+    state = await OUTBOX.lookup(local_id)
+    if state is None:
+        return JSONResponse({"error": "Unknown id (or past OUTBOX_RETENTION)"}, status_code=404)
+    return {"id": local_id, **state}
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    tuya = DEFAULT_RUNTIME.link.current()
+    body = {"status": "ok", "dedup": dedup.stats, "sessions": sessions.count(),
+            "bridge": {**ADMISSION.stats(), **bridge_client.POOL.stats()}, "tuya": tuya}
+    if OUTBOX_ENABLED:
+        pending, oldest = await OUTBOX.backlog()
+        body["outbox"] = {**OUTBOX.stats, "pending": pending, "oldest_seconds": round(oldest, 1)}
+    if RESULTS.stats['connects'] or MCP_AWAIT_RESULTS:
+        body["results"] = {**RESULTS.stats, "connected": RESULTS.connected, "waiting": len(RESULTS),
+                           "supported": RESULTS.supported}
+    if RESULT_CACHE_ON and RESULT_CACHE.enabled:
+        body["result_cache"] = {**RESULT_CACHE.stats, "entries": len(RESULT_CACHE)}
+    if MCP_WORKERS > 1:
+        body["worker"] = os.getpid()
+    if len(RUNTIMES) > 1:
+        down = [name for name, runtime in RUNTIMES.items()
+                if not (runtime.link.current() or {}).get('connected')]
+        body["tenants"] = {"total": len(RUNTIMES), "connected": len(RUNTIMES) - len(down), "down": down[:50]}
+    if TUYA_LINK_POLICY == 'fail' and tuya_link_down() is not None:
+        return JSONResponse({**body, "status": "degraded"}, status_code=503)
+    return body
 
 if __name__ == "__main__":
     logger.info("=" * 60)
-    logger.info("STARTING DEVICE CONTROLLER MCP SERVER")
+    logger.info(f"STARTING MCP HTTP SERVER - {SERVER_NAME}")
     logger.info("=" * 60)
-    logger.info(f"CLOUD_BRIDGE: {CLOUD_BRIDGE_URL}")
+    logger.info(f"TOOLSETS: {', '.join(MCP_TOOLSETS)} -> {', '.join(TOOLS)}")
+    logger.info(f"TENANTS: {len(RUNTIMES)} ({', '.join(list(RUNTIMES)[:10])}{', ...' if len(RUNTIMES) > 10 else ''})")
+    logger.info(f"CLOUD_BRIDGE: {', '.join(e.url for e in bridge_client.POOL.endpoints)}")
     logger.info(f"API_KEY: {'SET' if MCP_API_KEY else 'NOT SET'}")
-    logger.info("Listening on http://0.0.0.0:7860/mcp")
+    logger.info(f"AWAIT RESULTS: {'ON' if MCP_AWAIT_RESULTS else 'PER CALL (wait: true)'}")
+    logger.info(f"RESULT CACHE: {f'{len(RESULT_CACHE.rules)} RULES' if RESULT_CACHE_ON and RESULT_CACHE.enabled else 'OFF'}")
+    logger.info(f"TUYA CLIENT: {'EMBEDDED' if MCP_EMBED_TUYA else 'SEPARATE PROCESS'} (link down -> {TUYA_LINK_POLICY})")
+    loop = 'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'
+    http = 'httptools' if importlib.util.find_spec('httptools') else 'h11'
+    logger.info(f"WORKERS: {MCP_WORKERS} (loop={loop}, http={http})")
+    logger.info(f"Listening on http://0.0.0.0:{MCP_PORT}/mcp")
     logger.info("=" * 60)
     
-    uvicorn.run(app, host="0.0.0.0", port=7860, log_level="error")
+    if MCP_WORKERS > 1:
+        # workers import the app themselves; state they share lives in SharedState / METRICS_DIR
+        uvicorn.run("mcp_server:app", host="0.0.0.0", port=MCP_PORT, workers=MCP_WORKERS,
+                    loop=loop, http=http, log_level="error")
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=MCP_PORT, loop=loop, http=http, log_level="error")
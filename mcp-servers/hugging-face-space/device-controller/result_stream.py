@@ -0,0 +1,232 @@
+"""
+Result Stream - The extension's answers, pushed by the Cloud Bridge
+
+A tool call normally returns as soon as its command is queued. In await
+mode (MCP_AWAIT_RESULTS=true, or "wait": true on one call) it returns the
+extension's result instead:
+
+    - the caller registers a future under the command's commandId before
+      sending it; a command sent with a requestId is stored by the bridge
+      as cmd_<requestId>, so the id is known up front
+    - one SSE subscription per accessId (GET /api/results/stream?accessId=)
+      carries the results of that accessId's commands, and nobody else's;
+      each event resolves the future waiting for it. Thousands of waiting
+      commands cost one connection per accessId and no polling loop
+    - the bridge ends the stream now and then (Vercel's maxDuration);
+      the reconnect sends Last-Event-ID, and what completed in between
+      is replayed. A subscription nobody has waited on for STREAM_IDLE
+      seconds is closed
+    - a call that has no answer within MCP_AWAIT_TIMEOUT seconds gets the
+      usual "queued" reply; the command itself carries on. If the caller's
+      MCP session has a GET stream open, the result is still sent there
+      when it comes, for up to MCP_LATE_RESULT_TIMEOUT seconds
+
+A bridge without the stream endpoint (404) turns await mode off.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+
+import httpx
+
+import bridge_client
+import codec
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MCP_API_KEY = os.getenv('MCP_API_KEY')
+# Wait for the extension's result by default (a call's "wait" argument overrides it)
+MCP_AWAIT_RESULTS = os.getenv('MCP_AWAIT_RESULTS', 'false').lower() in ('1', 'true', 'yes')
+# Longest a call waits for its result (seconds)
+MCP_AWAIT_TIMEOUT = float(os.getenv('MCP_AWAIT_TIMEOUT', '25'))
+# How long after that a late result is still sent to the session's GET stream (seconds)
+MCP_LATE_RESULT_TIMEOUT = float(os.getenv('MCP_LATE_RESULT_TIMEOUT', '600'))
+
+STREAM_PATH = '/api/results/stream'
+READ_TIMEOUT = 45.0  # the bridge sends a keepalive comment every 15s
+STREAM_IDLE = 60.0  # close an accessId's subscription this long after its last waiting call
+REPLAY_MARGIN_MS = 5000  # a new subscription replays this far back, for clock skew between us and the bridge
+RETRY_BASE = 0.5
+RETRY_CAP = 10.0
+
+
+def command_id_for(request_id):
+    """The commandId the bridge stores a command sent with this requestId under"""
+    return f"cmd_{request_id}"
+
+
+class StreamUnsupported(Exception):
+    """The bridge has no result stream"""
+
+
+class ResultStream:
+    def __init__(self, path=STREAM_PATH, idle=STREAM_IDLE):
+        self.path = path
+        self.idle = idle
+        self.supported = True
+        self.last_event_ids = {}  # access_id -> Last-Event-ID of its subscription
+        self.stats = {'events': 0, 'matched': 0, 'timeouts': 0, 'connects': 0}
+        self._waiting = {}  # command_id -> (access_id, future)
+        self._tasks = {}  # access_id -> subscription task
+        self._connected = set()
+        self._last_wait = {}  # access_id -> monotonic time of its last expect()
+        self._client = None
+
+    def __len__(self):
+        return len(self._waiting)
+
+    @property
+    def connected(self):
+        """Open subscriptions"""
+        return len(self._connected)
+
+    def expect(self, command_id, access_id):
+        """Future for one command's result - call before sending it, so a quick answer is not missed"""
+        self._last_wait[access_id] = time.monotonic()
+        self.ensure_running(access_id)
+        entry = self._waiting.get(command_id)
+        if entry is None:
+            entry = self._waiting[command_id] = (access_id, asyncio.get_running_loop().create_future())
+            metrics.RESULT_WAITING.set(value=len(self._waiting))
+        return entry[1]
+
+    def rename(self, command_id, new_id):
+        """The bridge queued the command under another id (it ignores requestId)"""
+        entry = self._waiting.pop(command_id, None)
+        if entry is not None:
+            self._waiting[new_id] = entry
+
+    def forget(self, command_id):
+        if self._waiting.pop(command_id, None) is not None:
+            metrics.RESULT_WAITING.set(value=len(self._waiting))
+
+    async def wait(self, command_id, future, timeout=MCP_AWAIT_TIMEOUT):
+        """The result event (a dict), or None after `timeout` seconds or without a stream"""
+        try:
+            if self.supported:
+                # asyncio.wait, not wait_for: the shared future must survive a timeout or a cancel
+                await asyncio.wait((future,), timeout=timeout)
+            if future.done() and not future.cancelled():
+                metrics.RESULT_WAITS.inc('result')
+                return future.result()
+            if self.supported:
+                self.stats['timeouts'] += 1
+            metrics.RESULT_WAITS.inc('timeout' if self.supported else 'unsupported')
+            return None
+        finally:
+            entry = self._waiting.get(command_id)
+            if entry is not None and entry[1] is future:
+                self.forget(command_id)
+
+    # ------------------------------------------------------------------
+    # Subscriptions
+    # ------------------------------------------------------------------
+
+    def ensure_running(self, access_id):
+        """Open this accessId's subscription on the running loop if it isn't open"""
+        task = self._tasks.get(access_id)
+        if self.supported and (task is None or task.done()):
+            self._last_wait.setdefault(access_id, time.monotonic())
+            if access_id not in self.last_event_ids:
+                self.last_event_ids[access_id] = str(int(time.time() * 1000) - REPLAY_MARGIN_MS)
+            self._tasks[access_id] = asyncio.get_running_loop().create_task(self._run(access_id))
+
+    async def stop(self):
+        tasks, self._tasks = list(self._tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _idle(self, access_id):
+        """Nobody waits for this accessId's results, and nobody has for a while"""
+        if time.monotonic() - self._last_wait.get(access_id, 0) < self.idle:
+            return False
+        return not any(owner == access_id for owner, _ in self._waiting.values())
+
+    async def _run(self, access_id):
+        failures = 0
+        while not self._idle(access_id):
+            started = time.monotonic()
+            try:
+                await self._listen(access_id)
+            except StreamUnsupported:
+                self.supported = False
+                logger.warning("BRIDGE HAS NO /api/results/stream - AWAIT MODE DISABLED")
+                for _, future in self._waiting.values():
+                    if not future.done():
+                        future.cancel()
+                return
+            except (httpx.HTTPError, OSError, ValueError) as e:
+                logger.warning(f"RESULT STREAM DOWN ({access_id}): {type(e).__name__}: {e}")
+            finally:
+                self._connected.discard(access_id)
+                metrics.RESULT_STREAM_CONNECTED.set(value=len(self._connected))
+            if time.monotonic() - started > 5:
+                failures = 0  # it was up: a routine end of stream, reconnect at once
+            else:
+                await asyncio.sleep(random.uniform(0.5, 1.0) * min(RETRY_CAP, RETRY_BASE * 2 ** failures))
+                failures += 1
+        logger.info(f"RESULT STREAM CLOSED ({access_id}): IDLE")
+        # the next call that waits starts afresh: what completed meanwhile was nobody's concern
+        self.last_event_ids.pop(access_id, None)
+        if self._tasks.get(access_id) is asyncio.current_task():
+            del self._tasks[access_id]
+
+    async def _listen(self, access_id):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, read=READ_TIMEOUT))
+        url = bridge_client.POOL.ranked()[0].url  # any deployment: they share one database
+        headers = {"Accept": "text/event-stream", "Last-Event-ID": self.last_event_ids[access_id]}
+        if MCP_API_KEY:
+            headers["Authorization"] = f"Bearer {MCP_API_KEY}"
+        async with self._client.stream('GET', f"{url}{self.path}", params={"accessId": access_id},
+                                       headers=headers) as response:
+            if response.status_code in (404, 405):
+                raise StreamUnsupported()  # an unknown accessId is a 403, so this is the route missing
+            if response.status_code != 200:
+                raise httpx.HTTPStatusError(f"HTTP {response.status_code}", request=response.request,
+                                            response=response)
+            self._connected.add(access_id)
+            self.stats['connects'] += 1
+            metrics.RESULT_STREAM_CONNECTED.set(value=len(self._connected))
+            logger.info(f"RESULT STREAM CONNECTED: {url} for {access_id} "
+                        f"(replaying from {self.last_event_ids[access_id]})")
+            event_id, data = None, []
+            async for line in response.aiter_lines():
+                if not line:
+                    if data:
+                        self._dispatch(access_id, event_id, '\n'.join(data))
+                    event_id, data = None, []
+                    if self._idle(access_id):
+                        return
+                elif not line.startswith(':'):
+                    name, _, value = line.partition(':')
+                    value = value[1:] if value.startswith(' ') else value
+                    if name == 'id':
+                        event_id = value
+                    elif name == 'data':
+                        data.append(value)
+
+    def _dispatch(self, access_id, event_id, data):
+        try:
+            event = codec.loads(data)
+        except ValueError:
+            logger.warning(f"RESULT STREAM: BAD EVENT {data[:200]!r}")
+            return
+        if event_id:
+            self.last_event_ids[access_id] = event_id
+        self.stats['events'] += 1
+        entry = self._waiting.get(event.get('commandId'))
+        if entry is not None and entry[0] == access_id and not entry[1].done():
+            self.stats['matched'] += 1
+            entry[1].set_result(event)
+
+
+RESULTS = ResultStream()
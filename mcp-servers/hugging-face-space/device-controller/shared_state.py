@@ -0,0 +1,112 @@
+"""
+Shared State - Small SQLite store for what every uvicorn worker must see
+
+With MCP_WORKERS > 1 every worker is its own process, so in-memory dicts
+stop being the whole truth: a session opened on one worker must be valid
+on the next, and a command already in flight on one worker should not be
+forwarded again by another. SQLite in WAL mode gives process-safe
+reads and short writes without running another service. Each process
+opens its own connection on first use (connections never cross a fork).
+
+    sessions  id -> last_seen
+    dedup     key -> owner pid, expiry, result (NULL while in flight)
+"""
+
+import os
+import sqlite3
+import time
+
+MCP_SHARED_DB = os.getenv('MCP_SHARED_DB', '/tmp/mcp_shared.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, last_seen REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS dedup (key TEXT PRIMARY KEY, owner INTEGER NOT NULL,
+                                  expires REAL NOT NULL, result TEXT);
+"""
+
+CLAIMED = 'claimed'
+PENDING = 'pending'
+RESULT = 'result'
+
+
+class SharedState:
+    def __init__(self, path=MCP_SHARED_DB):
+        self.path = path
+        self._db = None
+        self._pid = None
+
+    @property
+    def db(self):
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=OFF')  # /tmp state - a crash may lose it anyway
+            db.executescript(SCHEMA)
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    # ------------------------------------------------------------------
+    # Sessions
+    # ------------------------------------------------------------------
+
+    def add_session(self, session_id):
+        self.db.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?)', (session_id, time.time()))
+
+    def has_session(self, session_id, ttl):
+        row = self.db.execute('SELECT last_seen FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        return row is not None and row[0] > time.time() - ttl
+
+    def touch_session(self, session_id):
+        self.db.execute('UPDATE sessions SET last_seen = ? WHERE id = ?', (time.time(), session_id))
+
+    def remove_session(self, session_id):
+        return self.db.execute('DELETE FROM sessions WHERE id = ?', (session_id,)).rowcount > 0
+
+    def expire_sessions(self, ttl):
+        self.db.execute('DELETE FROM sessions WHERE last_seen < ?', (time.time() - ttl,))
+
+    def count_sessions(self):
+        return self.db.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Dedup
+    # ------------------------------------------------------------------
+
+    def claim(self, key, pending_ttl):
+        """
+        (RESULT, text)   a finished result is cached
+        (PENDING, None)  another worker is forwarding this command now
+        (CLAIMED, None)  nobody is - this worker should forward it
+        """
+        now = time.time()
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT owner, expires, result FROM dedup WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[1] > now:
+                if row[2] is not None:
+                    return RESULT, row[2]
+                if row[0] != os.getpid():
+                    return PENDING, None
+            db.execute('INSERT OR REPLACE INTO dedup VALUES (?, ?, ?, NULL)', (key, os.getpid(), now + pending_ttl))
+            return CLAIMED, None
+        finally:
+            db.execute('COMMIT')
+
+    def peek(self, key):
+        """Like claim() but read-only: (RESULT, text), (PENDING, None) or (None, None)"""
+        row = self.db.execute('SELECT expires, result FROM dedup WHERE key = ?', (key,)).fetchone()
+        if row is None or row[0] <= time.time():
+            return None, None
+        return (RESULT, row[1]) if row[1] is not None else (PENDING, None)
+
+    def store(self, key, result, ttl):
+        self.db.execute('INSERT OR REPLACE INTO dedup VALUES (?, ?, ?, ?)',
+                        (key, os.getpid(), time.time() + ttl, result))
+
+    def release(self, key):
+        """Drop our in-flight marker without a result (error / not cacheable)"""
+        self.db.execute('DELETE FROM dedup WHERE key = ? AND owner = ? AND result IS NULL', (key, os.getpid()))
+
+    def prune(self):
+        self.db.execute('DELETE FROM dedup WHERE expires < ?', (time.time(),))
@@ -0,0 +1,201 @@
+"""
+Streamable HTTP - MCP session + SSE plumbing for the /mcp endpoint
+
+- Mcp-Session-Id is issued on initialize and reused by later requests
+- POSTs that Accept text/event-stream get an SSE response that carries
+  notifications/progress while tools run, then the JSON-RPC response(s)
+- GET /mcp opens a per-session stream for server-initiated messages:
+  a waiting tool call's result that comes in after MCP_AWAIT_TIMEOUT is
+  sent there as a notifications/message
+- With several workers, session ids live in a SharedState so any worker
+  accepts them; GET streams stay on the worker that opened them
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import secrets
+import time
+
+import codec
+
+logger = logging.getLogger(__name__)
+
+SESSION_HEADER = 'mcp-session-id'
+MCP_SESSION_TTL = float(os.getenv('MCP_SESSION_TTL', '3600'))
+SSE_PING_INTERVAL = float(os.getenv('SSE_PING_INTERVAL', '15'))
+
+_progress_sink = contextvars.ContextVar('progress_sink', default=None)
+_session = contextvars.ContextVar('mcp_session', default=None)
+
+
+def sse_event(message, event_id=None):
+    """Format one JSON-RPC message (dict or pre-serialized bytes) as an SSE event"""
+    data = message if isinstance(message, bytes) else codec.dumps(message)
+    head = b"event: message\ndata: "
+    if event_id is not None:
+        head = f"id: {event_id}\n".encode() + head
+    return head + data + b"\n\n"
+
+
+SSE_PING = b": ping\n\n"
+
+
+def wants_sse(request):
+    return 'text/event-stream' in request.headers.get('accept', '')
+
+
+def progress_token(message):
+    if not isinstance(message, dict):
+        return None
+    params = message.get('params')
+    if not isinstance(params, dict) or not isinstance(params.get('_meta'), dict):
+        return None
+    return params['_meta'].get('progressToken')
+
+
+async def report_progress(progress, total=None, message=None):
+    """Send notifications/progress for the current request, if it asked for it"""
+    sink = _progress_sink.get()
+    if sink is not None:
+        sink(progress, total, message)
+
+
+def bind_session(session):
+    """Make `session` the one current_session() returns while this request is handled"""
+    _session.set(session)
+
+
+def current_session():
+    """The MCP session of the request being handled, or None"""
+    return _session.get()
+
+
+class Session:
+    def __init__(self, session_id):
+        self.id = session_id
+        self.last_seen = time.monotonic()
+        self.shared_seen = self.last_seen  # last time the shared row was refreshed
+        self._streams = set()
+
+    @property
+    def listening(self):
+        """A GET stream is open on this worker"""
+        return bool(self._streams)
+
+    def send(self, message):
+        """Push a server-initiated message to every open GET stream"""
+        for queue in self._streams:
+            queue.put_nowait(message)
+        return bool(self._streams)
+
+    async def listen(self, is_disconnected):
+        """SSE generator for GET /mcp"""
+        queue = asyncio.Queue()
+        self._streams.add(queue)
+        try:
+            while not await is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield SSE_PING
+                    continue
+                self.last_seen = time.monotonic()
+                yield sse_event(message)
+        finally:
+            self._streams.discard(queue)
+
+
+class SessionStore:
+    def __init__(self, ttl=MCP_SESSION_TTL, shared=None):
+        self.ttl = ttl
+        self.shared = shared
+        self._sessions = {}
+
+    def create(self):
+        self._expire()
+        session = Session(secrets.token_urlsafe(24))
+        self._sessions[session.id] = session
+        if self.shared is not None:
+            self.shared.add_session(session.id)
+        logger.info(f"MCP SESSION OPENED: {session.id[:8]}... ({len(self._sessions)} active)")
+        return session
+
+    def get(self, session_id):
+        if self.shared is not None:
+            # The shared row is the truth: another worker may have closed it
+            if not self.shared.has_session(session_id, self.ttl):
+                self._sessions.pop(session_id, None)
+                return None
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            elif time.monotonic() - session.shared_seen > self.ttl / 4:
+                self.shared.touch_session(session_id)
+                session.shared_seen = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_seen = time.monotonic()
+        return session
+
+    def close(self, session_id):
+        closed = self._sessions.pop(session_id, None) is not None
+        if self.shared is not None:
+            closed = self.shared.remove_session(session_id) or closed
+        return closed
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        for session_id in [s.id for s in self._sessions.values() if s.last_seen < cutoff and not s.listening]:
+            del self._sessions[session_id]
+        if self.shared is not None:
+            self.shared.expire_sessions(self.ttl)
+
+    def count(self):
+        """Open sessions across every worker"""
+        return self.shared.count_sessions() if self.shared is not None else len(self._sessions)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+async def stream_responses(messages, handle):
+    """
+    Run `handle` on every message concurrently and yield SSE events:
+    progress notifications as they happen, each response when it is ready.
+    """
+    queue = asyncio.Queue()
+
+    async def run(message):
+        token = progress_token(message)
+        if token is not None:
+            def sink(progress, total, text):
+                params = {"progressToken": token, "progress": progress}
+                if total is not None:
+                    params["total"] = total
+                if text is not None:
+                    params["message"] = text
+                queue.put_nowait({"jsonrpc": "2.0", "method": "notifications/progress", "params": params})
+            _progress_sink.set(sink)
+        response = await handle(message)
+        if response is not None:
+            queue.put_nowait(response)
+
+    tasks = [asyncio.create_task(run(message)) for message in messages]
+    pending = asyncio.ensure_future(asyncio.gather(*tasks))
+    try:
+        while not (pending.done() and queue.empty()):
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, pending}, timeout=SSE_PING_INTERVAL,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield sse_event(getter.result())
+                continue
+            getter.cancel()
+            if not done:
+                yield SSE_PING
+    finally:
+        # Client went away: stop tools that only exist to answer this stream
+        if not pending.done():
+            pending.cancel()
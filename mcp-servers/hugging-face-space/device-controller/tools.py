@@ -0,0 +1,346 @@
+"""
+Tools - Every tool the MCP runtime can host, grouped into tool sets
+
+MCP_TOOLSETS picks which sets one process advertises:
+    browser          -> execute_browser_command
+    device           -> control_device
+    browser,device   -> both, from a single process
+
+Commands go into the local outbox, which delivers them to the Cloud
+Bridge; a call is answered with the outbox id once the command is stored
+(GET /outbox/<id> tells whether the bridge took it; OUTBOX_ENABLED=false
+forwards them synchronously instead). In await mode a call then waits for the
+extension's result, pushed back over the result stream; one that comes
+too late is sent to the caller's GET /mcp stream if it has one open. Browser queries
+that RESULT_CACHE_RULES marks read-only are answered from the result
+cache while their last answer is fresh. Simple device commands also carry
+the structured action intents.py parses from them. Both modules ship in
+every image; each is used only by its tool set's handler, so MCP_TOOLSETS
+is what turns it on.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import uuid
+
+import bridge_client
+import codec
+import metrics
+from admission import Overloaded
+from codec import CommandArguments, ExecuteResult
+import intents
+import outbox
+from outbox import OUTBOX, OUTBOX_ENABLED
+from request_log import log_request
+from result_cache import RESULT_CACHE
+from result_stream import MCP_AWAIT_RESULTS, MCP_AWAIT_TIMEOUT, MCP_LATE_RESULT_TIMEOUT, RESULTS, command_id_for
+from streamable_http import current_session, report_progress
+
+logger = logging.getLogger(__name__)
+
+
+def parse_toolsets(text):
+    """'browser, device' -> ['browser', 'device']"""
+    return [t.strip() for t in text.split(',') if t.strip()]
+
+
+MCP_API_KEY = os.getenv('MCP_API_KEY')
+TUYA_ACCESS_ID = os.getenv('TUYA_ACCESS_ID', 'tuya_mcp_user')
+MCP_TOOLSETS = parse_toolsets(os.getenv('MCP_TOOLSETS', 'browser'))
+
+# Cloud Bridge accessId for the request being handled (per tenant route)
+bridge_access_id = contextvars.ContextVar('bridge_access_id', default=TUYA_ACCESS_ID)
+
+_late_results = set()  # follow_up tasks, kept so they are not collected while they wait
+
+
+class Tool:
+    def __init__(self, name, description, input_schema, handler, dedup=True, arguments=CommandArguments):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.dedup = dedup
+        self.arguments = arguments  # typed envelope the handler gets (None = the raw dict)
+
+    def parse(self, arguments):
+        """tools/call arguments -> what the handler takes (ValueError if they don't fit)"""
+        return arguments if self.arguments is None else codec.convert(arguments, self.arguments)
+
+    def schema(self):
+        return {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": self.input_schema
+        }
+
+
+async def forward_command(tool_name, command, extra=None, wait=None, on_result=None):
+    """Queue a command on the Cloud Bridge for the extension to run (and, in await mode, wait for its result)
+
+    on_result(result_msg) is called when the extension reports success.
+    """
+    logger.info(f"TOOL: {tool_name}('{command}')")
+    wait = (MCP_AWAIT_RESULTS if wait is None else wait) and RESULTS.supported
+    payload = {
+        "userId": "tuya_ai",
+        "apiKey": MCP_API_KEY,
+        "accessId": bridge_access_id.get(),
+        "command": command,
+        **(extra or {})
+    }
+    if OUTBOX_ENABLED:
+        return await enqueue_command(tool_name, command, payload, wait, on_result)
+
+    future = None
+    if wait:
+        payload["requestId"] = uuid.uuid4().hex
+        future = RESULTS.expect(command_id_for(payload["requestId"]), payload["accessId"])
+    try:
+        await report_progress(0, 2 if wait else 1, "Forwarding to cloud bridge")
+        response = await bridge_client.post_execute(payload)
+
+        if response.status_code == 200:
+            result = codec.decode(response.content, ExecuteResult)
+            command_id = result.commandId
+            logger.info(f"SUCCESS: ID {command_id}")
+            result_msg = f"OK: {command} (ID:{command_id})"
+            if future is not None:
+                RESULTS.rename(command_id_for(payload["requestId"]), command_id)
+                return await await_result(tool_name, command, command_id, future, result_msg, on_result)
+            await report_progress(1, 1, f"Queued for the extension (ID:{command_id})")
+
+            log_request(tool_name, {'command': command}, result_msg)
+            return result_msg
+        else:
+            logger.error(f"FAILED: {response.status_code}")
+            error_msg = f"ERROR: {response.text}"
+            log_request(tool_name, {'command': command}, error_msg)
+            return error_msg
+
+    except Overloaded as e:
+        logger.warning(f"REJECTED: {e}")
+        log_request(tool_name, {'command': command}, f"ERROR: {e}")
+        raise  # answered as a JSON-RPC error with retry-after data
+
+    except Exception as e:
+        logger.error(f"EXCEPTION: {e}")
+        error_msg = f"ERROR: {str(e)}"
+        log_request(tool_name, {'command': command}, error_msg)
+        return error_msg
+
+    finally:
+        if future is not None:
+            RESULTS.forget(command_id_for(payload["requestId"]))  # still registered only if it never got queued
+
+
+async def enqueue_command(tool_name, command, payload, wait=False, on_result=None):
+    """Store the command in the outbox and answer with its id; the drainer delivers it"""
+    error = outbox.validate(payload)
+    if error:
+        logger.error(f"NOT QUEUED: {error}")
+        error_msg = f"ERROR: {error}"
+        log_request(tool_name, {'command': command}, error_msg)
+        return error_msg
+    local_id = outbox.new_local_id()
+    command_id = future = None
+    if wait:
+        # registered before the row exists, so even a quick result is not missed
+        command_id = command_id_for(local_id)
+        future = RESULTS.expect(command_id, payload["accessId"])
+    try:
+        await report_progress(0, 2 if wait else 1, "Storing for delivery to the cloud bridge")
+        await OUTBOX.submit(payload, local_id)
+    except Overloaded as e:
+        logger.warning(f"REJECTED: {e}")
+        log_request(tool_name, {'command': command}, f"ERROR: {e}")
+        if future is not None:
+            RESULTS.forget(command_id)
+        raise
+
+    except Exception as e:
+        logger.error(f"OUTBOX EXCEPTION: {e}")
+        error_msg = f"ERROR: {str(e)}"
+        log_request(tool_name, {'command': command}, error_msg)
+        if future is not None:
+            RESULTS.forget(command_id)
+        return error_msg
+
+    logger.info(f"QUEUED: ID {local_id}")
+    # a rejection by the bridge shows up on GET /outbox/<id>, not here
+    result_msg = f"OK: {command} (ID:{local_id})"
+    if future is not None:
+        return await await_result(tool_name, command, command_id, future, result_msg, on_result)
+    await report_progress(1, 1, f"Stored for delivery (ID:{local_id})")
+    log_request(tool_name, {'command': command}, result_msg)
+    return result_msg
+
+
+async def await_result(tool_name, command, command_id, future, queued_msg, on_result=None):
+    """The extension's answer to a queued command, or `queued_msg` if none comes within MCP_AWAIT_TIMEOUT"""
+    await report_progress(1, 2, f"Queued (ID:{command_id}), waiting for the extension")
+    event = await RESULTS.wait(command_id, future, MCP_AWAIT_TIMEOUT)
+    if event is None and not RESULTS.supported:
+        result_msg = queued_msg  # the bridge cannot push results
+    elif event is None:
+        logger.info(f"NO RESULT IN {MCP_AWAIT_TIMEOUT:g}s: ID {command_id}")
+        result_msg = f"{queued_msg} - still running, no result within {MCP_AWAIT_TIMEOUT:g}s"
+        session = current_session()
+        if session is not None and session.listening:
+            follow_up(session, command, command_id)
+            result_msg += " (it will be sent to this session's stream)"
+    else:
+        result = event_result(event)
+        if event_succeeded(event):
+            logger.info(f"RESULT: ID {command_id}")
+            result_msg = f"OK: {command} (ID:{command_id}) -> {result}"
+            if on_result is not None:
+                on_result(result_msg)
+        else:
+            logger.warning(f"FAILED IN THE EXTENSION: ID {command_id}")
+            result_msg = f"ERROR: {command} failed (ID:{command_id}) -> {result}"
+    await report_progress(2, 2, "Done" if event is not None else "Still running")
+    log_request(tool_name, {'command': command}, result_msg)
+    return result_msg
+
+
+def event_result(event):
+    result = event.get('result')
+    return result if isinstance(result, str) else codec.dumps(result).decode()
+
+
+def event_succeeded(event):
+    return event.get('success', event.get('status') != 'failed')
+
+
+def follow_up(session, command, command_id):
+    """Keep waiting for a result the call gave up on, and send it to the session's GET stream"""
+    # re-registered before anything awaits, so a result landing right now is not missed
+    future = RESULTS.expect(command_id, bridge_access_id.get())
+
+    async def send_when_done():
+        event = await RESULTS.wait(command_id, future, MCP_LATE_RESULT_TIMEOUT)
+        if event is None:
+            logger.info(f"NO LATE RESULT IN {MCP_LATE_RESULT_TIMEOUT:g}s: ID {command_id}")
+            return
+        ok = event_succeeded(event)
+        sent = session.send({
+            "jsonrpc": "2.0",
+            "method": "notifications/message",
+            "params": {
+                "level": "info" if ok else "error",
+                "logger": "tools",
+                "data": {"commandId": command_id, "command": command, "success": ok, "result": event_result(event)}
+            }
+        })
+        logger.info(f"LATE RESULT {'SENT' if sent else 'DROPPED (stream closed)'}: ID {command_id}")
+
+    task = asyncio.get_running_loop().create_task(send_when_done())
+    _late_results.add(task)
+    task.add_done_callback(_late_results.discard)
+
+
+async def execute_browser_command_impl(command: str, wait: bool = None) -> str:
+    access_id = bridge_access_id.get()
+    rule = RESULT_CACHE.rule_for(command)
+    if rule is None:
+        RESULT_CACHE.written(access_id)
+        return await forward_command('execute_browser_command', command, wait=wait)
+
+    cached = RESULT_CACHE.get(access_id, command)
+    if cached is not None:
+        log_request('execute_browser_command', {'command': command}, cached)
+        return cached
+    # A read-only query waits for its answer, so there is one to keep
+    return await forward_command('execute_browser_command', command, wait=True if wait is None else wait,
+                                 on_result=lambda answer: RESULT_CACHE.put(access_id, command, answer, rule))
+
+
+async def control_device_impl(command: str, wait: bool = None) -> str:
+    extra = {"type": "device_control"}
+    if intents.DEVICE_INTENTS:
+        action = intents.parse(command)
+        metrics.DEVICE_INTENT_PARSES.inc('matched' if action is not None else 'unmatched')
+        if action is not None:
+            logger.info(f"INTENT: {action.describe()}")
+            extra["action"] = action.as_payload()
+    return await forward_command('control_device', command, extra, wait=wait)
+
+
+def _command_schema(description):
+    return {
+        "type": "object",
+        "properties": {
+            "command": {"type": "string", "description": description},
+            "wait": {
+                "type": "boolean",
+                "description": f"Wait up to {MCP_AWAIT_TIMEOUT:g}s for the result instead of returning once queued"
+            }
+        },
+        "required": ["command"]
+    }
+
+
+TOOLSETS = {
+    'browser': {
+        'title': 'Browser Automation',
+        'tools': [
+            Tool(
+                'execute_browser_command',
+                "Execute browser command",
+                _command_schema("Command to execute"),
+                lambda args: execute_browser_command_impl(args.command, args.wait)
+            )
+        ]
+    },
+    'device': {
+        'title': 'Device Controller',
+        'tools': [
+            Tool(
+                'control_device',
+                "Control smart devices",
+                _command_schema("Device command"),
+                lambda args: control_device_impl(args.command, args.wait)
+            )
+        ]
+    }
+}
+
+
+def cache_served(toolsets=MCP_TOOLSETS):
+    """Only execute_browser_command reads the result cache"""
+    return 'browser' in toolsets
+
+
+def runtime_title(toolsets=MCP_TOOLSETS):
+    """'Browser Automation', 'Device Controller' or 'Rankify Assist' for both"""
+    titles = [TOOLSETS[name]['title'] for name in toolsets if name in TOOLSETS]
+    return titles[0] if len(titles) == 1 else 'Rankify Assist'
+
+
+def load_tools(toolsets=MCP_TOOLSETS):
+    """name -> Tool for every requested tool set, plus health_check"""
+    tools = {}
+    for name in toolsets:
+        if name not in TOOLSETS:
+            logger.warning(f"UNKNOWN TOOLSET: {name}")
+            continue
+        for tool in TOOLSETS[name]['tools']:
+            tools[tool.name] = tool
+
+    title = runtime_title(toolsets)
+
+    async def health_check(args):
+        return f"OK: {title} is healthy!"
+
+    tools['health_check'] = Tool(
+        'health_check',
+        "Health check",
+        {"type": "object", "properties": {}},
+        health_check,
+        dedup=False,
+        arguments=None
+    )
+    return tools
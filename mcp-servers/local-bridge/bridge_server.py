@@ -0,0 +1,640 @@
+"""
+Local Bridge - Self-hostable stand-in for the Vercel Cloud Bridge
+
+Speaks the cloud-bridge/api contract (ping, execute, execute/batch, poll,
+result) on one SQLite file instead of Supabase, so the MCP servers and the
+extension can use it by pointing CLOUD_BRIDGE_URL at it.
+
+    - accessId -> userId comes from an in-memory cache (misses included).
+      The admin API drops it at once; any other writer to mcp_configs is
+      noticed within ACCESS_CACHE_CHECK seconds, because a trigger bumps
+      config_version on every change
+    - all writes go through one writer task that commits whatever queued
+      up during LOCAL_BRIDGE_BATCH_MS in a single transaction; a request
+      is answered once its own write is committed
+    - pending commands are also queued in memory per accessId, so
+      /api/poll - called by every extension every few seconds - reads no
+      database at all; they are reloaded from the file on start
+    - a command's structured "action" (simple device commands) is stored
+      with it and handed back by /api/poll
+    - GET /api/results/stream?accessId= pushes the results of that
+      accessId's commands to the MCP servers as server-sent events;
+      Last-Event-ID replays the ones completed since
+
+One process owns the database: run a single worker.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - [LOCAL-BRIDGE] - %(message)s')
+logger = logging.getLogger(__name__)
+
+LOCAL_BRIDGE_DB = os.getenv('LOCAL_BRIDGE_DB', 'local_bridge.db')
+LOCAL_BRIDGE_PORT = int(os.getenv('LOCAL_BRIDGE_PORT', '8787'))
+# Same key the MCP servers send as apiKey; unset = accept any (local development)
+MCP_API_KEY = os.getenv('MCP_API_KEY')
+# Group commit: writes queued within this many ms share one transaction, 0 = one commit per write
+LOCAL_BRIDGE_BATCH_MS = float(os.getenv('LOCAL_BRIDGE_BATCH_MS', '2'))
+LOCAL_BRIDGE_BATCH_MAX = int(os.getenv('LOCAL_BRIDGE_BATCH_MAX', '500'))
+# How often the accessId cache looks for mcp_configs changes by other processes (seconds), 0 = no cache
+ACCESS_CACHE_CHECK = float(os.getenv('ACCESS_CACHE_CHECK', '1'))
+# Register an unknown accessId on first use, as its own user (development, benchmarks)
+LOCAL_BRIDGE_AUTO_REGISTER = os.getenv('LOCAL_BRIDGE_AUTO_REGISTER', 'false').lower() in ('1', 'true', 'yes')
+
+MAX_CACHED = 100000
+HEARTBEAT = 15.0  # seconds between keepalive comments on a result stream
+STREAM_BACKLOG = 10000  # events a slow subscriber may fall behind before it is dropped (it replays on reconnect)
+REPLAY_LIMIT = 10000
+REQUEST_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    email TEXT,
+    name TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mcp_configs (
+    config_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name TEXT,
+    type TEXT,
+    access_id TEXT NOT NULL,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mcp_configs_access ON mcp_configs (access_id, enabled);
+CREATE TABLE IF NOT EXISTS commands (
+    command_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    access_id TEXT NOT NULL,
+    command TEXT NOT NULL,
+    action TEXT,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS commands_pending ON commands (status, access_id, created_at);
+CREATE TABLE IF NOT EXISTS results (
+    command_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    result TEXT,
+    success INTEGER NOT NULL,
+    completed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_completed ON results (completed_at);
+CREATE TABLE IF NOT EXISTS config_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO config_version VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS mcp_configs_inserted AFTER INSERT ON mcp_configs
+    BEGIN UPDATE config_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS mcp_configs_updated AFTER UPDATE ON mcp_configs
+    BEGIN UPDATE config_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS mcp_configs_deleted AFTER DELETE ON mcp_configs
+    BEGIN UPDATE config_version SET version = version + 1; END;
+"""
+
+REPLAY = """
+SELECT r.command_id, c.access_id, c.status, r.result, r.success, r.completed_at
+FROM results r JOIN commands c ON c.command_id = r.command_id
+WHERE r.completed_at >= ? AND c.access_id = ? ORDER BY r.completed_at LIMIT ?
+"""
+
+UPSERT_RESULT = """
+INSERT INTO results (command_id, user_id, result, success, completed_at) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (command_id) DO UPDATE SET
+    result = excluded.result, success = excluded.success, completed_at = excluded.completed_at
+"""
+
+
+def connect(path):
+    db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    return db
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def result_event(command_id, access_id, status, result, success, completed):
+    """One result as a server-sent event; its id (completion time in ms) is what Last-Event-ID replays from"""
+    body = json.dumps({"commandId": command_id, "accessId": access_id, "status": status, "result": result,
+                       "success": bool(success), "completedAt": iso(completed)})
+    return f"id: {int(completed * 1000)}\nevent: result\ndata: {body}\n\n"
+
+
+class Writer:
+    """Group commit: each write() waits for the one transaction that carries it"""
+
+    def __init__(self, path, batch_ms=LOCAL_BRIDGE_BATCH_MS, batch_max=LOCAL_BRIDGE_BATCH_MAX):
+        self.db = connect(path)  # only ever used from the commit thread
+        self.window = batch_ms / 1000
+        self.limit = batch_max if batch_ms > 0 else 1
+        self.commits = 0
+        self.writes = 0
+        self._queue = []
+        self._ready = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Commit what is queued, then stop"""
+        self._stopping = True
+        self._ready.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        self.db.close()
+
+    async def write(self, *statements):
+        """Run (sql, params) statements atomically; raises the statement's error if one fails"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((statements, future))
+        self._ready.set()
+        await future
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            if self.window and len(self._queue) < self.limit and not self._stopping:
+                await asyncio.sleep(self.window)
+            await self._flush()
+            if self._stopping and not self._queue:
+                return
+
+    async def _flush(self):
+        batch, self._queue = self._queue[:self.limit], self._queue[self.limit:]
+        if not self._queue:
+            self._ready.clear()
+        if not batch:
+            return
+        try:
+            errors = await asyncio.to_thread(self._commit, [statements for statements, _ in batch])
+        except Exception as e:
+            # fail this batch only: the loop carries on with the next one
+            logger.error(f"COMMIT FAILED: {type(e).__name__}: {e}")
+            errors = [e] * len(batch)
+        for (_, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def _commit(self, batch):
+        # A savepoint per write, so one failing write (a duplicate id) leaves the rest of the batch alone
+        errors = []
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            for statements in batch:
+                self.db.execute('SAVEPOINT write')
+                try:
+                    for sql, params in statements:
+                        self.db.execute(sql, params)
+                    self.db.execute('RELEASE write')
+                    errors.append(None)
+                except sqlite3.Error as e:
+                    self.db.execute('ROLLBACK TO write')
+                    self.db.execute('RELEASE write')
+                    errors.append(e)
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.commits += 1
+        self.writes += len(batch)
+        return errors
+
+
+class AccessCache:
+    """accessId -> userId, None for unregistered ones; emptied whenever mcp_configs changes"""
+
+    def __init__(self, db, check=ACCESS_CACHE_CHECK):
+        self.db = db
+        self.check = check
+        self.hits = 0
+        self.misses = 0
+        self._users = {}
+        self._version = None
+        self._checked = 0.0
+
+    def lookup(self, access_id):
+        if self.check <= 0:
+            self.misses += 1
+            return self._query(access_id)
+        self._revalidate()
+        if access_id in self._users:
+            self.hits += 1
+            return self._users[access_id]
+        self.misses += 1
+        if len(self._users) >= MAX_CACHED:
+            self._users.clear()
+        user_id = self._users[access_id] = self._query(access_id)
+        return user_id
+
+    def invalidate(self):
+        self._users.clear()
+        self._checked = 0.0
+
+    def _revalidate(self):
+        now = time.monotonic()
+        if now - self._checked < self.check:
+            return
+        self._checked = now
+        version = self.db.execute('SELECT version FROM config_version').fetchone()[0]
+        if version != self._version:
+            self._users.clear()
+            self._version = version
+
+    def _query(self, access_id):
+        row = self.db.execute('SELECT user_id FROM mcp_configs WHERE access_id = ? AND enabled = 1 LIMIT 1',
+                              (access_id,)).fetchone()
+        return row[0] if row else None
+
+
+class LocalBridge:
+    def __init__(self, path=LOCAL_BRIDGE_DB, batch_ms=LOCAL_BRIDGE_BATCH_MS, cache_check=ACCESS_CACHE_CHECK,
+                 auto_register=LOCAL_BRIDGE_AUTO_REGISTER):
+        self.path = path
+        self.batch_ms = batch_ms
+        self.cache_check = cache_check
+        self.auto_register = auto_register
+        self.db = None
+        self.writer = None
+        self.access = None
+        self.pending = {}  # access_id -> deque of (command_id, command, created_at, action)
+        self._users = set()  # users known to exist, so their upsert is skipped
+        self._inserting = {}  # command_id -> commit of a command still in flight
+        self._subscribers = {}  # access_id -> one queue per open result stream
+        self._heartbeat = None
+        self.stats = {'executed': 0, 'duplicates': 0, 'polls': 0, 'delivered': 0, 'results': 0, 'pushed': 0}
+
+    async def start(self):
+        self.db = connect(self.path)
+        self.db.executescript(SCHEMA)
+        if 'action' not in {row[1] for row in self.db.execute('PRAGMA table_info(commands)')}:
+            self.db.execute('ALTER TABLE commands ADD COLUMN action TEXT')  # a file from before actions
+        self.writer = Writer(self.path, self.batch_ms)
+        self.writer.start()
+        self.access = AccessCache(self.db, self.cache_check)
+        self._users = {row[0] for row in self.db.execute('SELECT user_id FROM users')}
+        self.pending.clear()
+        for command_id, access_id, command, created, action in self.db.execute(
+                "SELECT command_id, access_id, command, created_at, action FROM commands WHERE status = 'pending' "
+                "ORDER BY created_at"):
+            self.pending.setdefault(access_id, deque()).append(
+                (command_id, command, created, json.loads(action) if action else None))
+        self._heartbeat = asyncio.create_task(self._beat())
+        logger.info(f"LOCAL BRIDGE READY: {self.path} ({self.backlog()} pending commands, "
+                    f"batch {self.batch_ms:g}ms, access cache {'on' if self.cache_check > 0 else 'off'})")
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self.writer is not None:
+            await self.writer.stop()
+        if self.db is not None:
+            self.db.close()
+
+    def backlog(self):
+        return sum(len(queue) for queue in self.pending.values())
+
+    # ------------------------------------------------------------------
+    # accessId registry
+    # ------------------------------------------------------------------
+
+    async def register(self, access_id, user_id, name=None, type='browser'):
+        now = time.time()
+        config_id = f"cfg_{int(now * 1000)}_{uuid.uuid4().hex[:9]}"
+        await self.writer.write(
+            ('INSERT OR IGNORE INTO users (user_id, email, name, created_at) VALUES (?, ?, ?, ?)',
+             (user_id, f"{user_id}@system.local", user_id, now)),
+            ('INSERT INTO mcp_configs (config_id, user_id, name, type, access_id, enabled, created_at) '
+             'VALUES (?, ?, ?, ?, ?, 1, ?)', (config_id, user_id, name or 'Tuya MCP', type, access_id, now)))
+        self._users.add(user_id)
+        self.access.invalidate()
+        logger.info(f"ACCESS ID REGISTERED: {access_id} -> {user_id}")
+        return config_id
+
+    async def unregister(self, access_id):
+        await self.writer.write(('DELETE FROM mcp_configs WHERE access_id = ?', (access_id,)))
+        self.access.invalidate()
+        logger.info(f"ACCESS ID REMOVED: {access_id}")
+
+    # ------------------------------------------------------------------
+    # Bridge contract
+    # ------------------------------------------------------------------
+
+    async def execute(self, body):
+        """(http status, response body) for one /api/execute call"""
+        access_id, command, request_id = body.get('accessId'), body.get('command'), body.get('requestId')
+        action = body.get('action')
+        if MCP_API_KEY and body.get('apiKey') != MCP_API_KEY:
+            return 401, {"error": "Invalid API key"}
+        if not command or not access_id:
+            return 400, {"error": "Missing required fields: command, accessId"}
+        if request_id is not None and not (isinstance(request_id, str) and REQUEST_ID.match(request_id)):
+            return 400, {"error": "Invalid requestId"}
+        if action is not None and not isinstance(action, dict):
+            return 400, {"error": "Invalid action"}
+
+        user_id = self.access.lookup(access_id)
+        if user_id is None and self.auto_register:
+            await self.register(access_id, access_id)
+            user_id = access_id
+        if user_id is None:
+            return 404, {"error": "Access ID not registered. Please add your Tuya Access ID in the extension settings."}
+
+        if request_id:
+            command_id = f"cmd_{request_id}"
+            insert = self._inserting.get(command_id)
+            if insert is None and self.db.execute('SELECT 1 FROM commands WHERE command_id = ?',
+                                                  (command_id,)).fetchone():
+                return self._duplicate(command_id)
+        else:
+            command_id = f"cmd_{int(time.time() * 1000)}_{uuid.uuid4().hex[:9]}"
+            insert = None
+
+        duplicate = insert is not None
+        if insert is None:
+            # A task, so a caller hanging up cannot leave a committed command out of the poll queue
+            insert = self._inserting[command_id] = asyncio.ensure_future(
+                self._insert(command_id, user_id, access_id, command, action))
+            insert.add_done_callback(lambda task: self._inserted(command_id, task))
+        try:
+            await asyncio.shield(insert)
+        except sqlite3.IntegrityError:
+            duplicate = True
+        except sqlite3.Error as e:
+            logger.error(f"EXECUTE FAILED: {command_id} - {e}")
+            return 500, {"error": "Failed to queue command", "details": str(e)}
+        if duplicate:
+            return self._duplicate(command_id)
+        return 200, {"success": True, "commandId": command_id,
+                     "message": "Command queued successfully. Extension will execute it.", "status": "pending"}
+
+    def _inserted(self, command_id, task):
+        self._inserting.pop(command_id, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here too, in case every caller hung up
+
+    async def _insert(self, command_id, user_id, access_id, command, action=None):
+        now = time.time()
+        statements = []
+        if user_id not in self._users:
+            statements.append(('INSERT OR IGNORE INTO users (user_id, email, name, created_at) VALUES (?, ?, ?, ?)',
+                               (user_id, f"{user_id}@system.local", user_id, now)))
+        statements.append(('INSERT INTO commands (command_id, user_id, access_id, command, action, status, created_at) '
+                           "VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                           (command_id, user_id, access_id, command, json.dumps(action) if action else None, now)))
+        await self.writer.write(*statements)
+        self._users.add(user_id)
+        self.pending.setdefault(access_id, deque()).append((command_id, command, now, action))
+        self.stats['executed'] += 1
+
+    def _duplicate(self, command_id):
+        self.stats['duplicates'] += 1
+        return 200, {"success": True, "commandId": command_id, "message": "Command already queued.",
+                     "status": "pending"}
+
+    async def poll(self, access_id):
+        """Oldest pending command of an accessId, marked processing"""
+        self.stats['polls'] += 1
+        queue = self.pending.get(access_id)
+        if not queue:
+            return {"hasCommand": False}
+        head = queue.popleft()
+        command_id, command, created, action = head
+        if not queue:
+            del self.pending[access_id]
+        try:
+            await self.writer.write(("UPDATE commands SET status = 'processing', updated_at = ? WHERE command_id = ?",
+                                     (time.time(), command_id)))
+        except Exception:
+            # still 'pending' on disk, so it goes back to the front of the queue for the next poll
+            self.pending.setdefault(access_id, deque()).appendleft(head)
+            raise
+        self.stats['delivered'] += 1
+        reply = {"hasCommand": True, "commandId": command_id, "command": command, "timestamp": iso(created)}
+        if action:
+            reply["action"] = action  # structured form of a simple device command; the text stays the fallback
+        return reply
+
+    async def store_result(self, body):
+        command_id = body.get('commandId')
+        if not command_id:
+            return 400, {"error": "Command ID required"}
+        row = self.db.execute('SELECT user_id, access_id FROM commands WHERE command_id = ?',
+                              (command_id,)).fetchone()
+        if row is None:
+            return 404, {"error": "Command not found"}
+        status = body.get('status') or 'completed'
+        result = body.get('result')
+        now = time.time()
+        try:
+            await self.writer.write(
+                ('UPDATE commands SET status = ?, updated_at = ? WHERE command_id = ?', (status, now, command_id)),
+                (UPSERT_RESULT, (command_id, row[0], result, int(status != 'failed'), now)))
+        except sqlite3.Error as e:
+            return 500, {"error": "Failed to save result", "details": str(e)}
+        self.stats['results'] += 1
+        self._publish(row[1], result_event(command_id, row[1], status, result, status != 'failed', now))
+        return 200, {"success": True}
+
+    # ------------------------------------------------------------------
+    # Result stream
+    # ------------------------------------------------------------------
+
+    def _publish(self, access_id, event):
+        queues = self._subscribers.get(access_id, ())
+        for queue in list(queues):
+            try:
+                queue.put_nowait(event)
+                self.stats['pushed'] += 1
+            except asyncio.QueueFull:
+                queues.discard(queue)  # it drains what it has, then ends; the reconnect replays
+                logger.warning("RESULT STREAM: SLOW SUBSCRIBER DROPPED")
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT)
+            for queues in list(self._subscribers.values()):
+                for queue in list(queues):
+                    if not queue.full():
+                        queue.put_nowait(": keepalive\n\n")
+
+    def streams(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def stream_results(self, access_id, last_event_id=None):
+        """Server-sent events: this accessId's results completed since last_event_id, then every new one"""
+        queue = asyncio.Queue(maxsize=STREAM_BACKLOG)
+        queues = self._subscribers.setdefault(access_id, set())
+        queues.add(queue)  # before the replay, so nothing falls between the two
+        logger.info(f"RESULT STREAM OPENED: {access_id} ({self.streams()} open)")
+        try:
+            yield "retry: 1000\n\n"
+            if last_event_id and last_event_id.isdigit():
+                since = int(last_event_id) / 1000
+                for row in self.db.execute(REPLAY, (since, access_id, REPLAY_LIMIT)).fetchall():
+                    yield result_event(*row)
+            while queue in queues or not queue.empty():
+                yield await queue.get()
+        finally:
+            queues.discard(queue)
+            if not queues and self._subscribers.get(access_id) is queues:
+                del self._subscribers[access_id]
+
+    def get_result(self, command_id):
+        row = self.db.execute(
+            'SELECT c.status, r.result, r.success, r.completed_at FROM commands c '
+            'LEFT JOIN results r ON r.command_id = c.command_id WHERE c.command_id = ?', (command_id,)).fetchone()
+        if row is None:
+            return None
+        status, result, success, completed = row
+        return {"commandId": command_id, "status": status, "result": result,
+                "success": None if success is None else bool(success),
+                "completedAt": iso(completed) if completed else None}
+
+    def health(self):
+        return {"status": "ok", "service": "Local Bridge", **self.stats, "pending": self.backlog(),
+                "streams": self.streams(),
+                "accessCache": {"hits": self.access.hits, "misses": self.access.misses},
+                "writer": {"commits": self.writer.commits, "writes": self.writer.writes}}
+
+
+def create_app(bridge):
+    @asynccontextmanager
+    async def lifespan(app):
+        await bridge.start()
+        try:
+            yield
+        finally:
+            await bridge.stop()
+
+    app = FastAPI(title="Local Bridge", lifespan=lifespan)
+
+    def reply(status, body):
+        return body if status == 200 else JSONResponse(body, status_code=status)
+
+    def admin(request):
+        return not MCP_API_KEY or request.headers.get('authorization') == f"Bearer {MCP_API_KEY}"
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"status": "ok", "service": "Local Bridge", "version": "1.0.0",
+                "timestamp": iso(time.time())}
+
+    @app.get("/health")
+    async def health():
+        return bridge.health()
+
+    @app.post("/api/execute")
+    async def execute(request: Request):
+        return reply(*await bridge.execute(await request.json()))
+
+    @app.post("/api/execute/batch")
+    async def execute_batch(request: Request):
+        body = await request.json()
+        answers = await asyncio.gather(*(bridge.execute(item) for item in body.get('commands', [])))
+        return {"results": [{"status": status, "body": result} for status, result in answers]}
+
+    @app.get("/api/poll")
+    async def poll(accessId: str = None):
+        if not accessId:
+            return JSONResponse({"error": "Access ID required"}, status_code=400)
+        try:
+            return await bridge.poll(accessId)
+        except Exception as e:
+            logger.error(f"POLL FAILED ({accessId}): {type(e).__name__}: {e}")
+            return JSONResponse({"error": "Failed to claim command", "details": str(e)}, status_code=500)
+
+    @app.post("/api/result")
+    async def result(request: Request):
+        return reply(*await bridge.store_result(await request.json()))
+
+    @app.get("/api/result")
+    async def get_result(commandId: str = None):
+        found = bridge.get_result(commandId) if commandId else None
+        if found is None:
+            return JSONResponse({"error": "Command not found"}, status_code=404)
+        return found
+
+    @app.get("/api/results/stream")
+    async def results_stream(request: Request, accessId: str = None):
+        if not admin(request):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        if not accessId:
+            return JSONResponse({"error": "Access ID required"}, status_code=400)
+        if bridge.access.lookup(accessId) is None and not bridge.auto_register:
+            return JSONResponse({"error": "Access ID not registered"}, status_code=403)
+        since = request.headers.get('last-event-id') or request.query_params.get('since')
+        return StreamingResponse(bridge.stream_results(accessId, since), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.get("/api/mcp/config")
+    async def list_configs(request: Request):
+        if not admin(request):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        rows = bridge.db.execute(
+            'SELECT config_id, user_id, name, type, access_id, enabled FROM mcp_configs ORDER BY created_at')
+        return {"configs": [dict(zip(('configId', 'userId', 'name', 'type', 'accessId', 'enabled'), row))
+                            for row in rows]}
+
+    @app.post("/api/mcp/config")
+    async def add_config(request: Request):
+        if not admin(request):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        body = await request.json()
+        if not body.get('accessId'):
+            return JSONResponse({"error": "Access ID is required"}, status_code=400)
+        if bridge.access.lookup(body['accessId']) is not None:
+            return JSONResponse({"error": "This Access ID is already registered"}, status_code=400)
+        config_id = await bridge.register(body['accessId'], body.get('userId') or body['accessId'],
+                                          body.get('name'), body.get('type', 'browser'))
+        return {"success": True, "message": "Access ID registered successfully!", "configId": config_id}
+
+    @app.delete("/api/mcp/config")
+    async def delete_config(request: Request, accessId: str = None):
+        if not admin(request):
+            return JSONResponse({"error": "Unauthorized"}, status_code=401)
+        if not accessId:
+            return JSONResponse({"error": "Access ID is required"}, status_code=400)
+        await bridge.unregister(accessId)
+        return {"success": True, "message": "Configuration deleted"}
+
+    return app
+
+
+BRIDGE = LocalBridge()
+app = create_app(BRIDGE)
+
+if __name__ == "__main__":
+    logger.info(f"LOCAL BRIDGE on http://0.0.0.0:{LOCAL_BRIDGE_PORT} - point CLOUD_BRIDGE_URL here")
+    uvicorn.run(app, host="0.0.0.0", port=LOCAL_BRIDGE_PORT, log_level="warning", workers=1)
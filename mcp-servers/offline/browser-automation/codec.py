@@ -0,0 +1,113 @@
+"""
+Codec - One JSON layer for every server file
+
+Uses orjson or msgspec when installed and falls back to the stdlib.
+MCP_JSON_CODEC=auto|orjson|msgspec|stdlib forces one (auto picks the
+fastest available). dumps() always returns bytes.
+
+Typed envelopes are plain dataclasses: msgspec decodes bytes straight
+into them, the fallback builds them from a decoded dict.
+"""
+
+import dataclasses
+import json
+import os
+from dataclasses import dataclass, field
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+MCP_JSON_CODEC = os.getenv('MCP_JSON_CODEC', 'auto').lower()
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _select(name):
+    if name in ('auto', 'orjson') and orjson is not None:
+        return 'orjson', orjson.loads, orjson.dumps
+    if name in ('auto', 'msgspec', 'orjson') and msgspec is not None:
+        decoder = msgspec.json.Decoder()
+        encoder = msgspec.json.Encoder()
+
+        def msgspec_loads(data):
+            try:
+                return decoder.decode(data)
+            except msgspec.DecodeError as e:
+                # Callers catch ValueError, like json/orjson decode errors
+                raise ValueError(str(e)) from None
+
+        return 'msgspec', msgspec_loads, encoder.encode
+    return 'stdlib', json.loads, _stdlib_dumps
+
+
+NAME, loads, dumps = _select(MCP_JSON_CODEC)
+
+
+def use(name):
+    """Switch codec at runtime (benchmarks compare them in one process)"""
+    global NAME, loads, dumps
+    NAME, loads, dumps = _select(name)
+    return NAME
+
+
+# ----------------------------------------------------------------------------
+# Typed envelopes
+# ----------------------------------------------------------------------------
+
+@dataclass
+class ToolCallParams:
+    """params of a tools/call request"""
+    name: str = ''
+    arguments: dict = field(default_factory=dict)
+
+
+@dataclass
+class CommandArguments:
+    """arguments of the command-forwarding tools"""
+    command: str = ''
+
+
+@dataclass
+class ExecuteResult:
+    """Cloud Bridge /api/execute response body"""
+    success: bool = False
+    commandId: str = 'unknown'
+    message: str = ''
+    status: str = ''
+    error: str = ''
+
+
+def _from_dict(cls, data):
+    if not isinstance(data, dict):
+        raise ValueError(f"Expected an object for {cls.__name__}")
+    names = {f.name for f in dataclasses.fields(cls)}
+    return cls(**{k: v for k, v in data.items() if k in names})
+
+
+def decode(data, cls):
+    """bytes -> typed envelope (unknown fields are ignored)"""
+    if msgspec is not None and NAME != 'stdlib':
+        try:
+            return msgspec.json.decode(data, type=cls)
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            raise ValueError(str(e)) from None
+    return _from_dict(cls, loads(data))
+
+
+def convert(obj, cls):
+    """already-decoded dict -> typed envelope"""
+    if msgspec is not None and NAME != 'stdlib':
+        try:
+            return msgspec.convert(obj, type=cls)
+        except msgspec.ValidationError as e:
+            raise ValueError(str(e)) from None
+    return _from_dict(cls, obj)
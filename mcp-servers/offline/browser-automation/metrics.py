@@ -0,0 +1,278 @@
+"""
+Metrics - Prometheus text exposition without a client library
+
+Counters, gauges and histograms are plain dicts keyed by label values.
+Every update happens on the event loop thread of its own worker, so
+there are no locks on the hot path; a scrape renders the current values
+(cumulative buckets are only summed at render time). With MCP_WORKERS > 1
+each worker's series carry a `pid` label so Prometheus can sum them; a
+single process leaves it out, so a restart does not start new series.
+
+With several uvicorn workers a scrape only reaches one of them, so each
+worker also writes its rendered series to METRICS_DIR/<pid>.json about
+once a second (export_periodically) and render(directory) merges the
+other live workers' files under one HELP/TYPE per metric.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import time
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = []
+
+# Several worker processes: tell their series apart by pid
+PER_WORKER = int(os.getenv('MCP_WORKERS', '1')) > 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if PER_WORKER:
+        pairs.append(f'pid="{os.getpid()}"')
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set_total(self, *labels, value):
+        """Mirror a total kept elsewhere (another process, a stats dict)"""
+        self._values[labels] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        series = self._values.get(labels)
+        if series is None:
+            # per-bucket counts (+Inf last), then sum
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, (counts, total) in list(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+
+def render(directory=None):
+    """Every registered metric in the Prometheus text format (+ other workers' snapshots)"""
+    peers = list(_peer_snapshots(directory)) if directory else []
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+        for snapshot in peers:
+            lines.extend(snapshot.get(metric.name, ()))
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def snapshot():
+    """metric name -> sample lines (no HELP/TYPE) of this worker"""
+    return {metric.name: metric.render()[2:] for metric in REGISTRY}
+
+
+def write_snapshot(directory):
+    """Atomically replace this worker's snapshot file"""
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(path + '.tmp', 'w') as f:
+        json.dump(snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _peer_snapshots(directory):
+    """Snapshots of the other live workers; files of dead workers are removed"""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in names:
+        pid, _, ext = name.partition('.')
+        if ext != 'json' or not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        path = os.path.join(directory, name)
+        if not _alive(int(pid)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+async def export_periodically(directory, interval=1.0, before=None):
+    """Keep this worker's snapshot fresh; `before()` updates scrape-time values first"""
+    os.makedirs(directory, exist_ok=True)
+    try:
+        while True:
+            if before is not None:
+                before()
+            write_snapshot(directory)
+            await asyncio.sleep(interval)
+    finally:
+        try:
+            os.unlink(os.path.join(directory, f"{os.getpid()}.json"))
+        except FileNotFoundError:
+            pass
+
+
+# ----------------------------------------------------------------------------
+# Shared metrics
+# ----------------------------------------------------------------------------
+
+MCP_REQUESTS = Counter('mcp_requests_total', "JSON-RPC messages handled", ('method', 'outcome'))
+TOOL_CALLS = Counter('mcp_tool_calls_total', "Tool calls by result", ('tool', 'outcome'))
+TOOL_DURATION = Histogram('mcp_tool_duration_seconds', "End-to-end tool call latency", ('tool',))
+TOOLS_IN_FLIGHT = Gauge('mcp_tool_calls_in_flight', "Tool calls currently running", ('tool',))
+
+BRIDGE_DURATION = Histogram('bridge_request_duration_seconds', "Cloud Bridge round trip",
+                            ('endpoint', 'status'))
+BRIDGE_IN_FLIGHT = Gauge('bridge_requests_in_flight', "Cloud Bridge requests currently open")
+BRIDGE_ENDPOINT_LATENCY = Gauge('bridge_endpoint_latency_seconds', "EWMA round trip per Cloud Bridge deployment",
+                                ('bridge',))
+BRIDGE_ENDPOINT_ERRORS = Gauge('bridge_endpoint_error_rate', "EWMA error rate per Cloud Bridge deployment", ('bridge',))
+BRIDGE_ENDPOINT_CIRCUIT = Gauge('bridge_endpoint_circuit_state', "1 for the current circuit state of each deployment",
+                                ('bridge', 'state'))
+BRIDGE_FAILOVERS = Counter('bridge_failovers_total', "Requests retried on another deployment after a failure")
+BRIDGE_HEDGES = Counter('bridge_hedged_requests_total', "Hedged requests by which copy answered first", ('winner',))
+ADMISSION_QUEUE_DEPTH = Gauge('bridge_admission_queue_depth', "Commands waiting for a Cloud Bridge slot")
+ADMISSION_WAIT = Histogram('bridge_admission_wait_seconds', "Time queued commands waited for a slot")
+ADMISSION_REJECTED = Counter('bridge_admission_rejected_total', "Commands refused before reaching the Cloud Bridge",
+                             ('reason',))
+
+OUTBOX_PENDING = Gauge('outbox_pending', "Commands stored locally and not yet delivered to the Cloud Bridge")
+OUTBOX_OLDEST_AGE = Gauge('outbox_oldest_pending_seconds', "Age of the oldest undelivered command")
+OUTBOX_LAG = Histogram('outbox_delivery_lag_seconds', "Time from accepting a command to the bridge queueing it",
+                       buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900))
+OUTBOX_RETRIES = Counter('outbox_retries_total', "Failed delivery attempts that will be retried")
+OUTBOX_FINISHED = Counter('outbox_finished_total', "Commands that left the outbox", ('outcome',))
+
+RESULT_WAITS = Counter('mcp_result_waits_total', "Await-mode tool calls by how they ended", ('outcome',))
+RESULT_WAITING = Gauge('mcp_results_waiting', "Commands waiting for their result")
+RESULT_STREAM_CONNECTED = Gauge('mcp_result_stream_connected', "Open Cloud Bridge result streams (one per accessId)")
+RESULT_CACHE_LOOKUPS = Counter('mcp_result_cache_lookups_total', "Read-only browser queries by cache result",
+                               ('result',))
+DEVICE_INTENT_PARSES = Counter('mcp_device_intents_total', "Device commands by whether a local intent pattern matched",
+                               ('result',))
+
+EVENT_LOOP_LAG = Histogram('event_loop_lag_seconds', "How late a periodic loop tick wakes up",
+                           buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+TUYA_CONNECTED = Gauge('tuya_connected', "1 while the Tuya client is connected", ('tenant',))
+TUYA_RECONNECTS = Counter('tuya_reconnects_total', "Tuya connection failures and drops", ('tenant',))
+TUYA_HEARTBEAT_RTT = Histogram('tuya_heartbeat_rtt_seconds', "Tuya liveness probe round trip")
+TUYA_HEARTBEAT_MISSES = Counter('tuya_heartbeat_misses_total', "Tuya liveness probes that timed out or failed",
+                                ('tenant',))
+TUYA_RECONNECT_DURATION = Histogram('tuya_reconnect_duration_seconds', "Time from losing the Tuya link to the next connect",
+                                    buckets=(1, 2, 5, 10, 30, 60, 120, 300, 600, 1800))
+TUYA_CIRCUIT = Gauge('tuya_circuit_state', "1 for the current Tuya reconnect circuit state", ('tenant', 'state'))
+
+
+def status_class(status_code):
+    """200 -> '2xx'; keeps the status label to a handful of values"""
+    return f"{status_code // 100}xx"
+
+
+async def watch_event_loop(interval=0.05):
+    """Record event-loop stalls: anything that blocks the loop delays this wake-up"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - expected, 0.0))
+
+
+def timed_tool(name, ok):
+    """Decorator for FastMCP tools: in-flight, latency and ok/error counts"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            TOOLS_IN_FLIGHT.inc(name)
+            started = time.perf_counter()
+            outcome = 'exception'
+            try:
+                result = await fn(*args, **kwargs)
+                outcome = 'ok' if ok(result) else 'error'
+                return result
+            finally:
+                TOOLS_IN_FLIGHT.dec(name)
+                TOOL_DURATION.observe(time.perf_counter() - started, name)
+                TOOL_CALLS.inc(name, outcome)
+        return wrapper
+    return decorate
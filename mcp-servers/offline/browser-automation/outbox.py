@@ -0,0 +1,329 @@
+"""
+Outbox - Durable local queue between the tools and /api/execute
+
+A command is written to a WAL-mode SQLite file first; a drainer task
+then delivers it to the Cloud Bridge and records the bridge's commandId.
+A slow or failing bridge no longer costs the Tuya call its latency or the
+user their command.
+
+    - what the bridge would refuse outright (no command, accessId or
+      apiKey) is refused before it is stored (validate())
+    - the call is answered with the local id as soon as the row is stored;
+      GET /outbox/<local id> tells how the command fared, a rejection by
+      the bridge included
+    - SQLite runs on one thread of its own, never on the event loop
+
+    - per accessId, commands are delivered in order: only the oldest
+      pending one is tried, the rest wait behind it
+    - failures and timeouts retry with jittered exponential backoff;
+      a 4xx other than 408/429 fails the command for good, and so does
+      reaching OUTBOX_MAX_AGE
+    - one drainer per OUTBOX_DB (flock), so several workers can share it;
+      accessIds drain concurrently, each one a command at a time
+
+    OUTBOX_ENABLED=false forwards synchronously as before.
+"""
+
+import asyncio
+import concurrent.futures
+import fcntl
+import logging
+import os
+import random
+import sqlite3
+import time
+import uuid
+
+import bridge_client
+import codec
+import metrics
+from admission import Overloaded
+from codec import ExecuteResult
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+OUTBOX_DB = os.getenv('OUTBOX_DB', '/tmp/mcp_outbox.db')
+# Retry backoff (seconds): uniform(0.5, 1) * min(cap, base * 2^attempts)
+OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', '0.5'))
+OUTBOX_RETRY_CAP = float(os.getenv('OUTBOX_RETRY_CAP', '30'))
+# Undelivered commands older than this are given up (seconds)
+OUTBOX_MAX_AGE = float(os.getenv('OUTBOX_MAX_AGE', '3600'))
+# Delivered / failed rows are kept this long for lookups (seconds)
+OUTBOX_RETENTION = float(os.getenv('OUTBOX_RETENTION', '86400'))
+# An accessId with this many undelivered commands gets Overloaded instead
+OUTBOX_MAX_PENDING = int(os.getenv('OUTBOX_MAX_PENDING', '500'))
+# Drainer poll interval when idle - also how soon another worker's command is seen
+OUTBOX_POLL = float(os.getenv('OUTBOX_POLL', '0.25'))
+
+PENDING = 'pending'
+DELIVERED = 'delivered'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    local_id TEXT NOT NULL UNIQUE,
+    access_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    command_id TEXT,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, access_id, id);
+"""
+
+# The oldest pending command of every accessId that is due
+DUE = """
+SELECT id, local_id, access_id, payload, created, attempts FROM outbox
+WHERE id IN (SELECT MIN(id) FROM outbox WHERE status = 'pending' GROUP BY access_id)
+  AND next_attempt <= ?
+"""
+
+
+def retryable(status_code):
+    return status_code >= 500 or status_code in (408, 429)
+
+
+def new_local_id():
+    return f"local_{uuid.uuid4().hex[:16]}"
+
+
+def validate(payload):
+    """Why the bridge would reject this command without queueing it, or None"""
+    if not payload.get('command') or not payload.get('accessId'):
+        return "Missing required fields: command, accessId"
+    if not payload.get('apiKey'):
+        return "MCP_API_KEY is not set"
+    return None
+
+
+class Outbox:
+    def __init__(self, path=OUTBOX_DB):
+        self.path = path
+        self._db = None
+        self._pid = None
+        self._woken = False
+        self._waiter = None
+        self._drainer = None
+        self._sending = {}  # access_id -> delivery task of its head command
+        self._executor = None  # the one thread every query runs on
+        self._executor_pid = None
+        self.lag = 0.0  # EWMA of delivery lag, for retry-after hints
+        self.stats = {'queued': 0, 'delivered': 0, 'retries': 0, 'failed': 0}
+
+    @property
+    def db(self):
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')  # durable across process crashes
+            db.executescript(SCHEMA)
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    async def _run(self, fn, *args):
+        """fn(*args) on the outbox thread, off the event loop"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            # a forked worker does not inherit the parent's thread
+            self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='outbox')
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _execute(self, sql, params):
+        self.db.execute(sql, params)
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    async def submit(self, payload, local_id=None):
+        """Store a command for delivery; returns its local id (Overloaded if its accessId is too far behind)"""
+        local_id = await self._run(self._store, payload, local_id or new_local_id())
+        self.stats['queued'] += 1
+        self.ensure_draining()
+        self._wake()
+        return local_id
+
+    def _store(self, payload, local_id):
+        access_id = payload.get('accessId') or ''
+        pending = self.db.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending' AND access_id = ?",
+                                  (access_id,)).fetchone()[0]
+        if pending >= OUTBOX_MAX_PENDING:
+            metrics.ADMISSION_REJECTED.inc('outbox_full')
+            raise Overloaded('outbox_full', max(OUTBOX_POLL, self.lag))
+        payload = {**payload, 'requestId': local_id}  # retries and failovers stay one command at the bridge
+        now = time.time()
+        self.db.execute(
+            'INSERT INTO outbox (local_id, access_id, payload, status, created, next_attempt) VALUES (?, ?, ?, ?, ?, ?)',
+            (local_id, access_id, codec.dumps(payload).decode(), PENDING, now, now))
+        return local_id
+
+    async def lookup(self, local_id):
+        """Delivery state of one command, or None"""
+        return await self._run(self._lookup, local_id)
+
+    def _lookup(self, local_id):
+        row = self.db.execute(
+            'SELECT status, command_id, attempts, created, finished, error FROM outbox WHERE local_id = ?',
+            (local_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('status', 'command_id', 'attempts', 'created', 'finished', 'error'), row))
+
+    async def backlog(self):
+        """(pending commands, age of the oldest in seconds)"""
+        return await self._run(self._backlog)
+
+    def _backlog(self):
+        count, oldest = self.db.execute(
+            "SELECT COUNT(*), MIN(created) FROM outbox WHERE status = 'pending'").fetchone()
+        return count, (time.time() - oldest) if oldest else 0.0
+
+    # ------------------------------------------------------------------
+    # Drainer
+    # ------------------------------------------------------------------
+
+    def ensure_draining(self):
+        """Start the drainer task on the running loop if it isn't running"""
+        if self._drainer is None or self._drainer.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._drainer = loop.create_task(self.drain_forever())
+
+    async def stop(self):
+        if self._drainer is not None:
+            self._drainer.cancel()
+            await asyncio.gather(self._drainer, return_exceptions=True)
+            self._drainer = None
+
+    async def drain_forever(self):
+        lock = open(self.path + '.lock', 'a')
+        try:
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(1)  # another worker drains this outbox
+            logger.info(f"OUTBOX DRAINER STARTED: {self.path}")
+            last_cleanup = 0
+            while True:
+                self._woken = False  # before the pass, so a submit during it is not missed
+                try:
+                    progress = await self.drain_once()
+                    if time.time() - last_cleanup > 60:
+                        last_cleanup = time.time()
+                        await self._run(self.cleanup)
+                except sqlite3.Error as e:
+                    logger.error(f"OUTBOX ERROR: {e}")
+                    progress = 0
+                if not progress:
+                    await self._idle()
+        finally:
+            for task in list(self._sending.values()):
+                task.cancel()
+            lock.close()
+
+    def _wake(self):
+        self._woken = True
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def _idle(self):
+        """Sleep up to OUTBOX_POLL or until submit(); a bare future, since 3.11's
+        wait_for() can swallow a cancel that races with the wake-up"""
+        if self._woken:
+            return
+        loop = asyncio.get_running_loop()
+        self._waiter = waiter = loop.create_future()
+        timer = loop.call_later(OUTBOX_POLL, lambda: waiter.done() or waiter.set_result(None))
+        try:
+            await waiter
+        finally:
+            timer.cancel()
+            self._waiter = None
+
+    async def drain_once(self):
+        """Start delivering the due head of every accessId not already sending; returns how many started"""
+        due, (count, oldest) = await self._run(self._due)
+        metrics.OUTBOX_PENDING.set(value=count)
+        metrics.OUTBOX_OLDEST_AGE.set(value=round(oldest, 3))
+        heads = [head for head in due if head[2] not in self._sending]
+        for head in heads:
+            task = asyncio.create_task(self.deliver(*head))
+            self._sending[head[2]] = task
+            task.add_done_callback(lambda t, access_id=head[2]: self._delivered(access_id, t))
+        return len(heads)
+
+    def _due(self):
+        return self.db.execute(DUE, (time.time(),)).fetchall(), self._backlog()
+
+    def _delivered(self, access_id, task):
+        self._sending.pop(access_id, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"OUTBOX ERROR: {task.exception()}")
+        self._wake()  # this accessId's next command may be due now
+
+    async def deliver(self, row_id, local_id, access_id, payload, created, attempts):
+        now = time.time()
+        if now - created > OUTBOX_MAX_AGE:
+            await self.finish(row_id, FAILED, error=f"expired after {attempts} attempts")
+            metrics.OUTBOX_FINISHED.inc('expired')
+            logger.error(f"OUTBOX EXPIRED: {local_id} ({access_id}) after {attempts} attempts")
+            return
+
+        delay = None
+        try:
+            response = await bridge_client.post_execute(codec.loads(payload))
+        except Overloaded as e:
+            error, delay = str(e), e.retry_after
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        else:
+            if response.status_code == 200:
+                try:
+                    command_id = codec.decode(response.content, ExecuteResult).commandId
+                except ValueError as e:
+                    # queued all the same: a resend would only hit the same body again
+                    logger.warning(f"OUTBOX: UNREADABLE REPLY FOR {local_id} ({e}): {response.text[:200]!r}")
+                    command_id = 'unknown'
+                await self.finish(row_id, DELIVERED, command_id=command_id)
+                lag = time.time() - created
+                self.lag += 0.2 * (lag - self.lag)
+                metrics.OUTBOX_FINISHED.inc('delivered')
+                metrics.OUTBOX_LAG.observe(lag)
+                logger.info(f"OUTBOX DELIVERED: {local_id} -> {command_id} (lag {lag:.2f}s)")
+                return
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            if not retryable(response.status_code):
+                await self.finish(row_id, FAILED, error=error)
+                metrics.OUTBOX_FINISHED.inc('failed')
+                logger.error(f"OUTBOX FAILED: {local_id} ({access_id}) - {error}")
+                return
+
+        if delay is None:
+            delay = random.uniform(0.5, 1.0) * min(OUTBOX_RETRY_CAP, OUTBOX_RETRY_BASE * 2 ** attempts)
+        await self._run(self._execute, 'UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, error = ? WHERE id = ?',
+                        (time.time() + delay, error, row_id))
+        self.stats['retries'] += 1
+        metrics.OUTBOX_RETRIES.inc()
+        logger.warning(f"OUTBOX RETRY IN {delay:.1f}s: {local_id} ({access_id}) - {error}")
+
+    async def finish(self, row_id, status, command_id=None, error=None):
+        await self._run(self._execute, 'UPDATE outbox SET status = ?, command_id = ?, error = ?, finished = ? WHERE id = ?',
+                        (status, command_id, error, time.time(), row_id))
+        self.stats['delivered' if status == DELIVERED else 'failed'] += 1
+
+    def cleanup(self):
+        self.db.execute("DELETE FROM outbox WHERE status != 'pending' AND finished < ?",
+                        (time.time() - OUTBOX_RETENTION,))
+
+
+OUTBOX = Outbox()
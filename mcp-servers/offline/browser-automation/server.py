@@ -7,18 +7,24 @@ The Extension AI Agent does the actual work!
 import os
 import asyncio
 import logging
-import httpx
+import uuid
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 from pydantic import Field
+from starlette.responses import JSONResponse, Response
 from typing import Annotated
 
 load_dotenv()
 
+import bridge_client  # reads CLOUD_BRIDGE_URL(S) / pool settings, so after load_dotenv()
+import metrics
+import outbox  # commands are stored locally first, then delivered by its drainer
+from result_stream import MCP_AWAIT_RESULTS, MCP_AWAIT_TIMEOUT, RESULTS, command_id_for
+
 # Configuration
-CLOUD_BRIDGE_URL = os.getenv('CLOUD_BRIDGE_URL', 'https://tuya-cloud-bridge.vercel.app')
 MCP_API_KEY = os.getenv('MCP_API_KEY')
 TUYA_ACCESS_ID = os.getenv('MCP_ACCESS_ID')  # Use the Tuya Access ID from .env
+SENT = "✅ Command sent! The browser extension will execute it shortly."
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -26,7 +32,7 @@ logger = logging.getLogger(__name__)
 
 print("🌐 Browser Automation MCP Server (Command Forwarder)")
 print("=" * 50)
-print(f"Cloud Bridge: {CLOUD_BRIDGE_URL}")
+print(f"Cloud Bridge: {', '.join(e.url for e in bridge_client.POOL.endpoints)}")
 print("=" * 50)
 
 # Create FastMCP app
@@ -34,8 +40,10 @@ mcp = FastMCP("Browser Automation")
 
 # Single tool - just forward the command!
 @mcp.tool
+@metrics.timed_tool('execute_browser_command', ok=lambda result: result.startswith('✅'))
 async def execute_browser_command(
-    command: Annotated[str, Field(description="Natural language command to execute in browser (e.g., 'open google', 'check my email')")]
+    command: Annotated[str, Field(description="Natural language command to execute in browser (e.g., 'open google', 'check my email')")],
+    wait: Annotated[bool, Field(description=f"Wait up to {MCP_AWAIT_TIMEOUT:g}s for the result instead of returning once queued")] = MCP_AWAIT_RESULTS
 ) -> str:
     """
     Execute a browser command via Rankify extension.
@@ -43,32 +51,86 @@ async def execute_browser_command(
     """
     logger.info(f"📨 Received command from Tuya: {command}")
     
+    payload = {
+        "userId": "tuya_ai",  # Legacy field, not used anymore
+        "apiKey": MCP_API_KEY,  # ← FIXED: Send in body, not header
+        "accessId": TUYA_ACCESS_ID,  # Send the Access ID!
+        "command": command
+    }
+    wait = wait and RESULTS.supported
+    if outbox.OUTBOX_ENABLED:
+        error = outbox.validate(payload)
+        if error:
+            logger.error(f"❌ Not sent: {error}")
+            return f"❌ Failed: {error}"
+        local_id = outbox.new_local_id()
+        command_id = command_id_for(local_id)
+        future = RESULTS.expect(command_id, TUYA_ACCESS_ID) if wait else None  # before the row exists
+        try:
+            await outbox.OUTBOX.submit(payload, local_id)
+        except Exception as e:
+            RESULTS.forget(command_id)
+            logger.error(f"❌ Error: {str(e)}")
+            return f"❌ Error: {str(e)}"
+        # a rejection by the Cloud Bridge shows up on GET /outbox/<id>
+        logger.info(f"✅ Command stored for delivery! ID: {local_id}")
+        if future is not None:
+            return await wait_for_result(command_id, future, f"{SENT} (ID: {local_id})")
+        return f"{SENT} (ID: {local_id})"
+
+    future = None
+    if wait:
+        payload["requestId"] = uuid.uuid4().hex
+        future = RESULTS.expect(command_id_for(payload["requestId"]), TUYA_ACCESS_ID)
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{CLOUD_BRIDGE_URL}/api/execute",  # ← FIXED: Correct endpoint
-                json={
-                    "userId": "tuya_ai",  # Legacy field, not used anymore
-                    "apiKey": MCP_API_KEY,  # ← FIXED: Send in body, not header
-                    "accessId": TUYA_ACCESS_ID,  # Send the Access ID!
-                    "command": command
-                },
-                timeout=15.0  # Shorter timeout since we're not waiting for execution
-            )
+        response = await bridge_client.post_execute(payload)
+        
+        if response.status_code == 200:
+            result = response.json()
+            command_id = result.get('commandId')
+            logger.info(f"✅ Command queued! ID: {command_id}")
+            if future is not None:
+                RESULTS.rename(command_id_for(payload["requestId"]), command_id)
+                return await wait_for_result(command_id, future, f"{SENT} (ID: {command_id})")
+            return f"{SENT} (ID: {command_id})"
+        else:
+            error_msg = response.text
+            logger.error(f"❌ Cloud Bridge error {response.status_code}: {error_msg}")
+            return f"❌ Failed: {error_msg}"
             
-            if response.status_code == 200:
-                result = response.json()
-                command_id = result.get('commandId')
-                logger.info(f"✅ Command queued! ID: {command_id}")
-                return f"✅ Command sent! The browser extension will execute it shortly. (ID: {command_id})"
-            else:
-                error_msg = response.text
-                logger.error(f"❌ Cloud Bridge error {response.status_code}: {error_msg}")
-                return f"❌ Failed: {error_msg}"
-                
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
         return f"❌ Error: {str(e)}"
+    finally:
+        if future is not None:
+            RESULTS.forget(command_id_for(payload["requestId"]))  # still registered only if it never got queued
+
+async def wait_for_result(command_id, future, queued_msg):
+    """The extension's answer, pushed over the result stream, or the queued reply if none comes in time"""
+    event = await RESULTS.wait(command_id, future, MCP_AWAIT_TIMEOUT)
+    if event is None:
+        logger.info(f"⏳ No result yet for {command_id}")
+        return queued_msg if not RESULTS.supported else f"{queued_msg} Still running after {MCP_AWAIT_TIMEOUT:g}s."
+    if event.get('success', True):
+        logger.info(f"✅ Result for {command_id}")
+        return f"✅ Done! {event.get('result')} (ID: {command_id})"
+    logger.error(f"❌ Command failed in the extension: {command_id}")
+    return f"❌ Failed: {event.get('result')} (ID: {command_id})"
+
+# Delivery state of a command answered with an outbox id (ID: local_...)
+@mcp.custom_route("/outbox/{local_id}", methods=["GET"])
+async def outbox_status(request):
+    state = await outbox.OUTBOX.lookup(request.path_params['local_id'])
+    if state is None:
+        return JSONResponse({"error": "Unknown id"}, status_code=404)
+    return JSONResponse(state)
+
+# Prometheus scrape target: http://localhost:8767/metrics
+# Tool calls, the bridge client and the outbox only: tuya_client.py is its own
+# process with no reconnect loop, so the tuya_* series stay empty offline
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # Main entry point
 if __name__ == "__main__":
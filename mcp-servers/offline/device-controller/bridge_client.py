@@ -0,0 +1,355 @@
+"""
+Bridge Client - One pooled, pre-warmed HTTP client per process
+Every forwarder reuses the same hot connections to the Cloud Bridge
+deployments; bridge_pool picks which deployment each request goes to
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from importlib.util import find_spec
+
+import httpcore
+import httpx
+
+import codec
+import metrics
+from admission import ADMISSION
+from bridge_pool import CLOUD_BRIDGE_URLS, BridgePool
+
+logger = logging.getLogger(__name__)
+
+# Pool / keepalive settings (all overridable from the Space secrets or .env)
+BRIDGE_TIMEOUT = float(os.getenv('BRIDGE_TIMEOUT', '15'))
+BRIDGE_MAX_CONNECTIONS = int(os.getenv('BRIDGE_MAX_CONNECTIONS', '20'))
+BRIDGE_MAX_KEEPALIVE = int(os.getenv('BRIDGE_MAX_KEEPALIVE', '10'))
+BRIDGE_KEEPALIVE_EXPIRY = float(os.getenv('BRIDGE_KEEPALIVE_EXPIRY', '60'))
+BRIDGE_HTTP2 = os.getenv('BRIDGE_HTTP2', 'true').lower() in ('1', 'true', 'yes')
+BRIDGE_DNS_TTL = float(os.getenv('BRIDGE_DNS_TTL', '300'))
+BRIDGE_WARMUP_INTERVAL = float(os.getenv('BRIDGE_WARMUP_INTERVAL', '45'))
+
+# Micro-batching: collect commands for this long (ms) or until the batch is
+# full, then send them in one POST to /api/execute/batch. 0 = off
+BRIDGE_BATCH_WINDOW_MS = float(os.getenv('BRIDGE_BATCH_WINDOW_MS', '0'))
+BRIDGE_BATCH_MAX_SIZE = int(os.getenv('BRIDGE_BATCH_MAX_SIZE', '20'))
+
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def json_response(status_code, body):
+    """Per-command httpx.Response carved out of a batch reply"""
+    return httpx.Response(status_code, content=codec.dumps(body), headers=JSON_HEADERS)
+
+
+class CachedDNSBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that resolves each host once per TTL"""
+
+    def __init__(self, backend, ttl):
+        self._backend = backend
+        self._ttl = ttl
+        self._cache = {}
+
+    async def _resolve(self, host, port):
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        cached = self._cache.get((host, port))
+        if cached and cached[1] > now:
+            return cached[0]
+
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (address, now + self._ttl)
+        return address
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        address = await self._resolve(host, port)
+        try:
+            return await self._backend.connect_tcp(
+                address, port,
+                timeout=timeout,
+                local_address=local_address,
+                socket_options=socket_options
+            )
+        except httpcore.ConnectError:
+            # Address may have moved - resolve again next time
+            self._cache.pop((host, port), None)
+            raise
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds):
+        await self._backend.sleep(seconds)
+
+
+class BridgeTransport(httpx.AsyncHTTPTransport):
+    """Default httpx transport with the DNS cache plugged into its pool"""
+
+    def __init__(self, dns_ttl=BRIDGE_DNS_TTL, **kwargs):
+        super().__init__(**kwargs)
+        if dns_ttl > 0 and isinstance(self._pool, httpcore.AsyncConnectionPool):
+            self._pool._network_backend = CachedDNSBackend(self._pool._network_backend, dns_ttl)
+
+
+class ExecuteBatcher:
+    """Coalesces /api/execute calls; each caller still awaits its own result"""
+
+    def __init__(self, window_ms=BRIDGE_BATCH_WINDOW_MS, max_size=BRIDGE_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self.enabled = True
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, payload):
+        """Queue one command; resolves to an httpx.Response for that command"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(lambda task: self._sent(batch, task))
+
+    def _sent(self, batch, task):
+        """Whatever went wrong in _send, no caller is left waiting"""
+        self._tasks.discard(task)
+        if task.cancelled():
+            error = None
+        else:
+            error = task.exception()
+            if error is None:
+                return  # every future is settled, or will be by _settle()
+            logger.error(f"BATCH SEND FAILED: {type(error).__name__}: {error}")
+        for _, future in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    async def _send(self, batch):
+        if len(batch) == 1 or not self.enabled:
+            for payload, future in batch:
+                self._settle(future, _post_single(payload))
+            return
+
+        try:
+            response = await _timed_post('/api/execute/batch', {"commands": [payload for payload, _ in batch]})
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if response.status_code in (404, 405):
+            # Bridge has no bulk endpoint - fall back to one POST per command
+            logger.warning("BRIDGE HAS NO /api/execute/batch - BATCHING DISABLED")
+            self.enabled = False
+            for payload, future in batch:
+                self._settle(future, _post_single(payload))
+            return
+
+        if response.status_code != 200:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(httpx.Response(response.status_code, content=response.content))
+            return
+
+        try:
+            results = codec.loads(response.content).get('results', [])
+            if not isinstance(results, list):
+                raise ValueError(f"results is a {type(results).__name__}")
+        except (ValueError, AttributeError) as e:
+            logger.error(f"UNREADABLE BATCH REPLY ({e}): {response.text[:200]!r}")
+            results = []
+            missing = "Unreadable batch response"
+        else:
+            missing = "Missing result in batch response"
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            item = results[index] if index < len(results) else None
+            if isinstance(item, dict) and isinstance(item.get('status', 200), int):
+                future.set_result(json_response(item.get('status', 200), item.get('body')))
+            else:
+                error = missing if item is None else "Malformed result in batch response"
+                future.set_result(json_response(502, {"error": error}))
+
+    def _settle(self, future, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+
+        def done(task):
+            self._tasks.discard(task)
+            if future.done():
+                return
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+        task.add_done_callback(done)
+
+
+# A request that timed out on one deployment still gets one more try on another
+POOL = BridgePool(CLOUD_BRIDGE_URLS, deadline=2 * BRIDGE_TIMEOUT)
+
+_clients = {}  # one pool per deployment, so a hung one cannot hold every connection
+_warmup_task = None
+_started = False
+_batcher = None
+
+
+def create_client(http2=BRIDGE_HTTP2):
+    """Build the pooled client (HTTP/2 only when the h2 package is installed)"""
+    http2 = http2 and find_spec('h2') is not None
+    limits = httpx.Limits(
+        max_connections=BRIDGE_MAX_CONNECTIONS,
+        max_keepalive_connections=BRIDGE_MAX_KEEPALIVE,
+        keepalive_expiry=BRIDGE_KEEPALIVE_EXPIRY
+    )
+    transport = BridgeTransport(http2=http2, limits=limits)
+    return httpx.AsyncClient(transport=transport, timeout=BRIDGE_TIMEOUT)
+
+
+def get_client(url=None):
+    """Return the process-wide client for one deployment (default: the first), creating it on first use"""
+    url = url or POOL.primary
+    client = _clients.get(url)
+    if client is None or client.is_closed:
+        client = _clients[url] = create_client()
+    return client
+
+
+async def _ping(endpoint):
+    started = time.perf_counter()
+    try:
+        response = await get_client(endpoint.url).get(f"{endpoint.url}/api/ping", timeout=5.0)
+        ok = response.status_code < 500
+    except Exception as e:
+        ok = False
+        logger.warning(f"BRIDGE WARM-UP FAILED: {endpoint.url} - {e}")
+    elapsed = time.perf_counter() - started
+    endpoint.ping(elapsed, ok)
+    if ok:
+        logger.info(f"BRIDGE WARM-UP: {endpoint.url} {elapsed * 1000:.0f}ms")
+
+
+async def warm_up():
+    """Open (or refresh) a pooled connection to every bridge deployment and check its health"""
+    await asyncio.gather(*(_ping(endpoint) for endpoint in POOL.endpoints))
+
+
+async def _warm_periodically():
+    while True:
+        await asyncio.sleep(BRIDGE_WARMUP_INTERVAL)
+        await warm_up()
+
+
+async def start(warm=True):
+    """Create the client, warm it and keep it warm (safe to call repeatedly)"""
+    global _warmup_task, _started
+    if _started:
+        return
+    _started = True
+    get_client()
+    if warm:
+        await warm_up()
+    if BRIDGE_WARMUP_INTERVAL > 0:
+        _warmup_task = asyncio.create_task(_warm_periodically())
+
+
+async def stop():
+    """Cancel the warm-up loop and close every pooled connection"""
+    global _warmup_task, _started, _batcher
+    _started = False
+    if _batcher is not None:
+        _batcher.flush()
+        await asyncio.gather(*_batcher._tasks, return_exceptions=True)
+        _batcher = None
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        _warmup_task = None
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """FastAPI lifespan - tie the client to the app"""
+    await start()
+    try:
+        yield
+    finally:
+        await stop()
+
+
+async def _timed_post(endpoint, body):
+    """POST to the healthiest bridge deployment, recording each round trip in bridge_request_duration_seconds"""
+    content = codec.dumps(body)
+
+    async def send(url):
+        metrics.BRIDGE_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = await get_client(url).post(f"{url}{endpoint}", content=content, headers=JSON_HEADERS)
+            status = metrics.status_class(response.status_code)
+            return response
+        finally:
+            metrics.BRIDGE_IN_FLIGHT.dec()
+            metrics.BRIDGE_DURATION.observe(time.perf_counter() - started, endpoint, status)
+
+    return await POOL.request(send)
+
+
+async def _post_single(payload):
+    return await _timed_post('/api/execute', payload)
+
+
+async def post_execute(payload):
+    """
+    POST a command to /api/execute on the healthiest bridge deployment.
+    The command gets a requestId (if it has none) so a failover or hedge
+    queues it once. Raises admission.Overloaded when it is refused (rate / queue)
+    """
+    global _batcher
+    if not _started:
+        await start(warm=False)
+    if 'requestId' not in payload:
+        payload = {**payload, 'requestId': uuid.uuid4().hex}
+    async with ADMISSION.admit(payload.get('accessId')):
+        if BRIDGE_BATCH_WINDOW_MS <= 0:
+            return await _post_single(payload)
+        if _batcher is None:
+            _batcher = ExecuteBatcher(BRIDGE_BATCH_WINDOW_MS, BRIDGE_BATCH_MAX_SIZE)
+        return await _batcher.submit(payload)
@@ -6,18 +6,25 @@ Just forwards device control commands with Access ID
 import os
 import asyncio
 import logging
-import httpx
+import uuid
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 from pydantic import Field
+from starlette.responses import JSONResponse, Response
 from typing import Annotated
 
 load_dotenv()
 
+import bridge_client  # reads CLOUD_BRIDGE_URL(S) / pool settings, so after load_dotenv()
+import intents  # reads DEVICE_INTENTS
+import metrics
+import outbox  # commands are stored locally first, then delivered by its drainer
+from result_stream import MCP_AWAIT_RESULTS, MCP_AWAIT_TIMEOUT, RESULTS, command_id_for
+
 # Configuration
-CLOUD_BRIDGE_URL = os.getenv('CLOUD_BRIDGE_URL', 'https://tuya-cloud-bridge.vercel.app')
 MCP_API_KEY = os.getenv('MCP_API_KEY')
 TUYA_ACCESS_ID = os.getenv('MCP_ACCESS_ID')  # Use the Tuya Access ID from .env
+SENT = "✅ Device command sent!"
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -25,7 +32,7 @@ logger = logging.getLogger(__name__)
 
 print("🏠 Device Controller MCP Server (Command Forwarder)")
 print("=" * 50)
-print(f"Cloud Bridge: {CLOUD_BRIDGE_URL}")
+print(f"Cloud Bridge: {', '.join(e.url for e in bridge_client.POOL.endpoints)}")
 print("=" * 50)
 
 # Create FastMCP app
@@ -33,8 +40,10 @@ mcp = FastMCP("Device Controller")
 
 # Single tool - forward device control commands
 @mcp.tool
+@metrics.timed_tool('control_device_command', ok=lambda result: result.startswith('✅'))
 async def control_device_command(
-    command: Annotated[str, Field(description="Natural language device control command (e.g., 'turn on lights', 'set AC to 22 degrees')")]
+    command: Annotated[str, Field(description="Natural language device control command (e.g., 'turn on lights', 'set AC to 22 degrees')")],
+    wait: Annotated[bool, Field(description=f"Wait up to {MCP_AWAIT_TIMEOUT:g}s for the result instead of returning once queued")] = MCP_AWAIT_RESULTS
 ) -> str:
     """
     Execute a device control command.
@@ -42,32 +51,92 @@ async def control_device_command(
     """
     logger.info(f"📨 Received device command from Tuya: {command}")
     
+    payload = {
+        "userId": "tuya_ai",  # Legacy field
+        "apiKey": MCP_API_KEY,
+        "accessId": TUYA_ACCESS_ID,  # Send the Access ID!
+        "command": command
+    }
+    if intents.DEVICE_INTENTS:
+        action = intents.parse(command)
+        metrics.DEVICE_INTENT_PARSES.inc('matched' if action is not None else 'unmatched')
+        if action is not None:
+            logger.info(f"🎯 Parsed locally: {action.describe()}")
+            payload["action"] = action.as_payload()  # runs without LLM interpretation where supported
+    wait = wait and RESULTS.supported
+    if outbox.OUTBOX_ENABLED:
+        error = outbox.validate(payload)
+        if error:
+            logger.error(f"❌ Not sent: {error}")
+            return f"❌ Failed: {error}"
+        local_id = outbox.new_local_id()
+        command_id = command_id_for(local_id)
+        future = RESULTS.expect(command_id, TUYA_ACCESS_ID) if wait else None  # before the row exists
+        try:
+            await outbox.OUTBOX.submit(payload, local_id)
+        except Exception as e:
+            RESULTS.forget(command_id)
+            logger.error(f"❌ Error: {str(e)}")
+            return f"❌ Error: {str(e)}"
+        # a rejection by the Cloud Bridge shows up on GET /outbox/<id>
+        logger.info(f"✅ Command stored for delivery! ID: {local_id}")
+        if future is not None:
+            return await wait_for_result(command_id, future, f"{SENT} (ID: {local_id})")
+        return f"{SENT} (ID: {local_id})"
+
+    future = None
+    if wait:
+        payload["requestId"] = uuid.uuid4().hex
+        future = RESULTS.expect(command_id_for(payload["requestId"]), TUYA_ACCESS_ID)
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{CLOUD_BRIDGE_URL}/api/execute",
-                json={
-                    "userId": "tuya_ai",  # Legacy field
-                    "apiKey": MCP_API_KEY,
-                    "accessId": TUYA_ACCESS_ID,  # Send the Access ID!
-                    "command": command
-                },
-                timeout=15.0
-            )
+        response = await bridge_client.post_execute(payload)
+        
+        if response.status_code == 200:
+            result = response.json()
+            command_id = result.get('commandId')
+            logger.info(f"✅ Command queued! ID: {command_id}")
+            if future is not None:
+                RESULTS.rename(command_id_for(payload["requestId"]), command_id)
+                return await wait_for_result(command_id, future, f"{SENT} (ID: {command_id})")
+            return f"{SENT} (ID: {command_id})"
+        else:
+            error_msg = response.text
+            logger.error(f"❌ Cloud Bridge error {response.status_code}: {error_msg}")
+            return f"❌ Failed: {error_msg}"
             
-            if response.status_code == 200:
-                result = response.json()
-                command_id = result.get('commandId')
-                logger.info(f"✅ Command queued! ID: {command_id}")
-                return f"✅ Device command sent! (ID: {command_id})"
-            else:
-                error_msg = response.text
-                logger.error(f"❌ Cloud Bridge error {response.status_code}: {error_msg}")
-                return f"❌ Failed: {error_msg}"
-                
     except Exception as e:
         logger.error(f"❌ Error: {str(e)}")
         return f"❌ Error: {str(e)}"
+    finally:
+        if future is not None:
+            RESULTS.forget(command_id_for(payload["requestId"]))  # still registered only if it never got queued
+
+async def wait_for_result(command_id, future, queued_msg):
+    """The extension's answer, pushed over the result stream, or the queued reply if none comes in time"""
+    event = await RESULTS.wait(command_id, future, MCP_AWAIT_TIMEOUT)
+    if event is None:
+        logger.info(f"⏳ No result yet for {command_id}")
+        return queued_msg if not RESULTS.supported else f"{queued_msg} Still running after {MCP_AWAIT_TIMEOUT:g}s."
+    if event.get('success', True):
+        logger.info(f"✅ Result for {command_id}")
+        return f"✅ Done! {event.get('result')} (ID: {command_id})"
+    logger.error(f"❌ Command failed in the extension: {command_id}")
+    return f"❌ Failed: {event.get('result')} (ID: {command_id})"
+
+# Delivery state of a command answered with an outbox id (ID: local_...)
+@mcp.custom_route("/outbox/{local_id}", methods=["GET"])
+async def outbox_status(request):
+    state = await outbox.OUTBOX.lookup(request.path_params['local_id'])
+    if state is None:
+        return JSONResponse({"error": "Unknown id"}, status_code=404)
+    return JSONResponse(state)
+
+# Prometheus scrape target: http://localhost:8768/metrics
+# Tool calls, the bridge client and the outbox only: tuya_client.py is its own
+# process with no reconnect loop, so the tuya_* series stay empty offline
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request):
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # Main entry point
 if __name__ == "__main__":